@@ -1,6 +1,9 @@
 from django.contrib import admin
 
-from .models import Author, Genre, Book, BookInstance, Language, Review
+from .models import (
+    ArchivedBookInstance, ArchivedReview, Author, BackfillProgress, Genre, Book, BookInstance, Language, Review,
+    SlowQuery, Task
+)
 
 admin.site.register(Genre)
 admin.site.register(Language)
@@ -45,3 +48,44 @@ class BookInstanceAdmin(admin.ModelAdmin):
 
 
 admin.site.register(Author, AuthorAdmin)
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'run_at', 'created', 'finished_at')
+    list_filter = ('status', 'name')
+
+
+@admin.action(description='Restore the selected rows')
+def restore_archived(modeladmin, request, queryset):
+    restored = queryset.restore()
+    modeladmin.message_user(request, f'{restored} rows restored.')
+
+
+@admin.register(ArchivedBookInstance)
+class ArchivedBookInstanceAdmin(admin.ModelAdmin):
+    list_display = ('book', 'status', 'imprint', 'archived', 'id')
+    list_select_related = ('book',)
+    actions = [restore_archived]
+
+
+@admin.register(ArchivedReview)
+class ArchivedReviewAdmin(admin.ModelAdmin):
+    list_display = ('book', 'grade', 'publish_date', 'archived')
+    list_select_related = ('book',)
+    actions = [restore_archived]
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = ('sql', 'view', 'count', 'total_time', 'max_time', 'last_seen')
+    list_filter = ('database', 'view')
+    readonly_fields = ('fingerprint', 'database', 'sql', 'view', 'plan', 'count', 'total_time', 'max_time',
+                       'first_seen', 'last_seen')
+
+
+@admin.register(BackfillProgress)
+class BackfillProgressAdmin(admin.ModelAdmin):
+    list_display = ('name', 'processed', 'changed', 'batches', 'updated', 'completed', 'finalized')
+    readonly_fields = ('name', 'position', 'processed', 'changed', 'batches', 'started', 'updated', 'completed',
+                       'finalized')
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 class CatalogConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "catalog"
+
+    def ready(self):
+        # Connect the catalog signal handlers.
+        from . import signals  # noqa: F401
@@ -0,0 +1,83 @@
+"""
+Hot/cold archival: cold rows are moved out of the live tables into archive tables with the same columns, so the
+lists, counters and admin pages only scan the working set.
+
+- Copies in maintenance, not borrowed, and not due for settings.CATALOG_ARCHIVE_COPIES_AFTER days
+  go to ArchivedBookInstance.
+- Reviews published more than settings.CATALOG_ARCHIVE_REVIEWS_AFTER days ago go to ArchivedReview.
+
+Rows move in batches, each batch in its own transaction (copy, then delete), keeping their primary keys, so they can
+be restored as they were: ArchivedReview.objects.filter(book=book).restore().
+The archive tables keep their RESTRICT foreign key to Book, so a book with archived rows cannot be deleted either.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache import invalidate_pages
+from .models import ArchivedBookInstance, ArchivedReview, BookInstance, Review
+from .outbox import record_changes
+
+
+BATCH_SIZE = 500
+
+# Live model -> archive model. Both have the same fields, the archive adds an "archived" timestamp.
+ARCHIVES = {
+    BookInstance: ArchivedBookInstance,
+    Review: ArchivedReview,
+}
+
+
+def cold_copies(now=None):
+    cutoff = (now or timezone.now()).date() - datetime.timedelta(days=settings.CATALOG_ARCHIVE_COPIES_AFTER)
+    return BookInstance.objects.filter(
+        Q(due_back__isnull=True) | Q(due_back__lt=cutoff), status__exact='m', borrower__isnull=True
+    )
+
+
+def cold_reviews(now=None):
+    cutoff = (now or timezone.now()) - datetime.timedelta(days=settings.CATALOG_ARCHIVE_REVIEWS_AFTER)
+    return Review.objects.filter(publish_date__lt=cutoff)
+
+
+def move(queryset, target, batch_size=BATCH_SIZE):
+    """
+    Move the rows of `queryset` into the `target` model (copying the fields they share), batch by batch.
+    Returns the number of moved rows.
+    """
+    target_fields = {field.attname for field in target._meta.concrete_fields}
+    fields = [field.attname for field in queryset.model._meta.concrete_fields if field.attname in target_fields]
+    moved = 0
+    while True:
+        with transaction.atomic():
+            batch = list(queryset.order_by('pk')[:batch_size])
+            if not batch:
+                break
+            target.objects.bulk_create(
+                [target(**{name: getattr(row, name) for name in fields}) for row in batch]
+            )
+            # Restored rows are back in the catalog feed (the deleted ones are recorded by catalog.signals).
+            record_changes(target, [row.pk for row in batch])
+            queryset.model.objects.filter(pk__in=[row.pk for row in batch]).delete()
+        moved += len(batch)
+    if moved:
+        # bulk_create() sends no signals.
+        invalidate_pages()
+    return moved
+
+
+def archive_cold_rows(batch_size=BATCH_SIZE):
+    """ Archive the cold copies and reviews. Returns {model name: number of archived rows}. """
+    return {
+        'copies': move(cold_copies(), ArchivedBookInstance, batch_size),
+        'reviews': move(cold_reviews(), ArchivedReview, batch_size),
+    }
+
+
+def restore(queryset, batch_size=BATCH_SIZE):
+    """ Move archived rows back to their live table. Returns the number of restored rows. """
+    live = next(model for model, archive in ARCHIVES.items() if archive is queryset.model)
+    return move(queryset, live, batch_size)
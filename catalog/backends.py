@@ -0,0 +1,64 @@
+"""
+Authentication backend keeping users and their permissions in the shared cache.
+
+Django only caches permissions on the user object, so every request loads the user, then their user and group
+permissions (two joins) the first time a template or a view checks `perms`. With this backend they come from the
+cache, for settings.CATALOG_AUTH_CACHE_TIMEOUT seconds (0 disables it).
+
+Entries are dropped when the user is saved or their groups or permissions change, and all of them when the
+permissions of a group change (see catalog.signals). Changes made with QuerySet.update() are only seen once the
+entries expire.
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+from .cache import cache_version, invalidate_version
+
+
+AUTH_CACHE_VERSION_KEY = 'catalog:auth-cache-version'
+
+
+def user_cache_keys(user_id):
+    """ Cache keys of a user and of their permissions. """
+    version = cache_version(AUTH_CACHE_VERSION_KEY)
+    return f'catalog:auth:{version}:user:{user_id}', f'catalog:auth:{version}:perms:{user_id}'
+
+
+def invalidate_user(user_id):
+    """ Drop the cached user and permissions of a user. """
+    cache.delete_many(user_cache_keys(user_id))
+
+
+def invalidate_all_users():
+    """ Drop the cached users and permissions of everyone, e.g. after the permissions of a group have changed. """
+    invalidate_version(AUTH_CACHE_VERSION_KEY)
+
+
+class CachedModelBackend(ModelBackend):
+    """ ModelBackend reading users and their permissions from the shared cache. """
+
+    def get_user(self, user_id):
+        timeout = settings.CATALOG_AUTH_CACHE_TIMEOUT
+        if not timeout:
+            return super().get_user(user_id)
+        key, _ = user_cache_keys(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, timeout=timeout)
+        return user
+
+    def get_all_permissions(self, user_obj, obj=None):
+        timeout = settings.CATALOG_AUTH_CACHE_TIMEOUT
+        if not timeout or obj is not None or not user_obj.is_active or user_obj.is_anonymous:
+            return super().get_all_permissions(user_obj, obj=obj)
+        if not hasattr(user_obj, '_perm_cache'):
+            _, key = user_cache_keys(user_obj.pk)
+            permissions = cache.get(key)
+            if permissions is None:
+                permissions = super().get_all_permissions(user_obj)
+                cache.set(key, permissions, timeout=timeout)
+            user_obj._perm_cache = permissions
+        return user_obj._perm_cache
@@ -0,0 +1,267 @@
+"""
+Resumable backfills: data migrations of big tables, run in small batches while the site stays up.
+
+On SQLite, a migration adding a NOT NULL column (or one with a default, or a constraint) rebuilds the whole table,
+and a RunPython filling a column holds the write lock until it is done. For catalog_bookinstance and the other big
+tables the work is split instead:
+
+1. the schema migration only adds the column as null=True without a default, which SQLite does in place
+   (ALTER TABLE ADD COLUMN). From then on the application writes it for the new and changed rows;
+2. python manage.py run_backfill <name> fills the existing rows, one primary-key range of batch_size rows per
+   transaction. The position reached is saved in BackfillProgress in the same transaction, so the command can be
+   stopped and run again: it resumes after the last committed batch. Between batches it sleeps at least as long as
+   the batch took (unless the sleep is 0), so the site gets the database at least half of the time;
+3. once every row is done, the indexes listed in Backfill.indexes are created, one at a time. Building an index
+   locks the table for writes, so it happens once, at the end, rather than slowing down every batch. Such indexes
+   are declared in the model Meta as usual, but the migration only adds them to the state
+   (migrations.SeparateDatabaseAndState(state_operations=[migrations.AddIndex(...)]));
+4. the migration adding the NOT NULL or CHECK constraints starts with RequireBackfill, so it fails instead of
+   rebuilding a table that is still being filled.
+
+Backfills are Backfill subclasses registered with @register. In the schema migration, RunBackfill runs the backfill
+inline when the table is small (new databases, the tests) and otherwise leaves it to run_backfill. Migration 0021
+(BookInstanceStatus) follows these steps.
+
+The progress is kept in the default database, per database backfilled: the copies of the branch databases (see
+catalog.routers) are backfilled with run_backfill --database=branch_<code>. There, a batch commits just before its
+checkpoint, so a crash in between only makes the next run process that batch again.
+"""
+import logging
+import time
+
+from django.apps import apps as global_apps
+from django.db import DEFAULT_DB_ALIAS, connections, migrations, transaction
+from django.utils import timezone
+
+from .outbox import record_changes
+from .utils import sort_key
+
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+SLEEP = 0.05
+# RunBackfill runs a backfill inside its migration for tables up to this size.
+INLINE_ROWS = 10_000
+
+registry = {}
+
+
+class BackfillError(Exception):
+    pass
+
+
+class Backfill:
+    """
+    A data migration of `model` ('app_label.Model'). process() gets the rows of one batch and returns the number of
+    rows it changed. It must only use the model of the queryset it gets (the historical model when run from a
+    migration).
+    """
+    name = None
+    model = None
+    batch_size = BATCH_SIZE
+    sleep = SLEEP
+    # Names of indexes of the model Meta, created once every row is processed.
+    indexes = ()
+
+    def queryset(self, model):
+        """ Rows to process (all by default). """
+        return model._base_manager.all()
+
+    def process(self, queryset):
+        raise NotImplementedError
+
+
+def register(cls):
+    registry[cls.name] = cls()
+    return cls
+
+
+def get_backfill(name):
+    try:
+        return registry[name]
+    except KeyError:
+        raise ValueError(f"Unknown backfill {name!r}. Backfills: {', '.join(sorted(registry)) or 'none'}.")
+
+
+def progress_name(backfill, using=DEFAULT_DB_ALIAS):
+    return backfill.name if using == DEFAULT_DB_ALIAS else f'{backfill.name}@{using}'
+
+
+def get_progress(backfill, apps=global_apps, using=DEFAULT_DB_ALIAS):
+    """ The BackfillProgress of a backfill in the database `using` (stored in the default database). """
+    BackfillProgress = apps.get_model('catalog', 'BackfillProgress')
+    return BackfillProgress.objects.using(DEFAULT_DB_ALIAS).get_or_create(name=progress_name(backfill, using))[0]
+
+
+def run(backfill, batch_size=None, sleep=None, max_batches=None, apps=global_apps, using=DEFAULT_DB_ALIAS,
+        on_batch=None):
+    """
+    Process the remaining rows of a backfill in the database `using`, then create its indexes. Stops after
+    `max_batches` batches if given. Returns its BackfillProgress.
+    """
+    batch_size = batch_size or backfill.batch_size
+    sleep = backfill.sleep if sleep is None else sleep
+    model = apps.get_model(backfill.model)
+    progress = get_progress(backfill, apps, using)
+    batches = 0
+    while progress.completed is None:
+        if max_batches is not None and batches >= max_batches:
+            return progress
+        start = time.perf_counter()
+        with transaction.atomic(using=DEFAULT_DB_ALIAS), transaction.atomic(using=using, savepoint=False):
+            rows = backfill.queryset(model).using(using).order_by('pk')
+            if progress.position:
+                rows = rows.filter(pk__gt=model._meta.pk.to_python(progress.position))
+            pks = list(rows.values_list('pk', flat=True)[:batch_size])
+            if pks:
+                progress.changed += backfill.process(rows.filter(pk__lte=pks[-1])) or 0
+                progress.processed += len(pks)
+                progress.position = str(pks[-1])
+                progress.batches += 1
+            if len(pks) < batch_size:
+                progress.completed = timezone.now()
+            progress.save()
+        batches += 1
+        if on_batch:
+            on_batch(progress)
+        if progress.completed is None and sleep:
+            time.sleep(max(sleep, time.perf_counter() - start))
+    if progress.finalized is None:
+        create_indexes(backfill, model, using)
+        progress.finalized = timezone.now()
+        progress.save(update_fields=['finalized', 'updated'])
+    return progress
+
+
+def create_indexes(backfill, model, using=DEFAULT_DB_ALIAS):
+    """ Create the missing indexes of a backfill, one statement each. """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        existing = connection.introspection.get_constraints(cursor, model._meta.db_table)
+    indexes = {index.name: index for index in model._meta.indexes}
+    for name in backfill.indexes:
+        if name in existing:
+            continue
+        if name not in indexes:
+            raise BackfillError(f'{model._meta.label} has no index named {name}.')
+        # Only the statement: an entered SQLite schema editor cannot run inside a transaction.
+        statement = indexes[name].create_sql(model, connection.schema_editor())
+        with connection.cursor() as cursor:
+            cursor.execute(str(statement))
+
+
+def restart(backfill, using=DEFAULT_DB_ALIAS):
+    """ Forget the progress of a backfill in a database, so the next run starts from the first row. """
+    get_progress(backfill, using=using).delete()
+
+
+def migration_hints(backfill_name):
+    # So that the operations also run on the branch databases, which only hold copies.
+    return {'model_name': get_backfill(backfill_name).model.rpartition('.')[2].lower()}
+
+
+class RunBackfill(migrations.RunPython):
+    """ Migration operation running a backfill inline if its table is small, and leaving it to run_backfill otherwise. """
+
+    def __init__(self, backfill_name, inline_rows=INLINE_ROWS):
+        self.backfill_name = backfill_name
+        self.inline_rows = inline_rows
+        super().__init__(self.forwards, migrations.RunPython.noop, hints=migration_hints(backfill_name))
+
+    def deconstruct(self):
+        return self.__class__.__name__, [self.backfill_name], {'inline_rows': self.inline_rows}
+
+    def describe(self):
+        return f'Backfill {self.backfill_name}'
+
+    def forwards(self, apps, schema_editor):
+        backfill = get_backfill(self.backfill_name)
+        using = schema_editor.connection.alias
+        rows = backfill.queryset(apps.get_model(backfill.model)).using(using)
+        if rows[self.inline_rows:self.inline_rows + 1].exists():
+            logger.warning('%s is too big to backfill in a migration: run python manage.py run_backfill %s%s.',
+                           backfill.model, backfill.name, '' if using == DEFAULT_DB_ALIAS else f' --database={using}')
+            return
+        run(backfill, sleep=0, apps=apps, using=using)
+
+
+class RequireBackfill(migrations.RunPython):
+    """ Migration operation failing until a backfill is finalized, e.g. before adding the constraints it prepares. """
+
+    def __init__(self, backfill_name):
+        self.backfill_name = backfill_name
+        super().__init__(self.forwards, migrations.RunPython.noop, hints=migration_hints(backfill_name))
+
+    def deconstruct(self):
+        return self.__class__.__name__, [self.backfill_name], {}
+
+    def describe(self):
+        return f'Require backfill {self.backfill_name}'
+
+    def forwards(self, apps, schema_editor):
+        backfill = get_backfill(self.backfill_name)
+        using = schema_editor.connection.alias
+        BackfillProgress = apps.get_model('catalog', 'BackfillProgress')
+        done = BackfillProgress.objects.using(DEFAULT_DB_ALIAS).filter(
+            name=progress_name(backfill, using), finalized__isnull=False
+        )
+        if not done.exists():
+            raise BackfillError(
+                f'Backfill {backfill.name} is not finished in the {using} database: '
+                f'run python manage.py run_backfill {backfill.name} --database={using}.'
+            )
+
+
+@register
+class BookSortKeys(Backfill):
+    """ Recompute Book.title_key, e.g. after a change of utils.sort_key. """
+    name = 'book-sort-keys'
+    model = 'catalog.Book'
+    indexes = ('book_title_key_idx',)
+
+    def process(self, queryset):
+        changed = []
+        for book in queryset.only('title', 'title_key'):
+            key = sort_key(book.title, max_length=200)
+            if book.title_key != key:
+                book.title_key = key
+                changed.append(book)
+        queryset.model._base_manager.bulk_update(changed, ['title_key'])
+        return len(changed)
+
+
+@register
+class AuthorSortKeys(Backfill):
+    """ Recompute Author.last_name_key and first_name_key. """
+    name = 'author-sort-keys'
+    model = 'catalog.Author'
+    indexes = ('author_name_keys_idx',)
+
+    def process(self, queryset):
+        changed = []
+        for author in queryset.only('last_name', 'first_name', 'last_name_key', 'first_name_key'):
+            keys = sort_key(author.last_name, max_length=100), sort_key(author.first_name, max_length=100)
+            if (author.last_name_key, author.first_name_key) != keys:
+                author.last_name_key, author.first_name_key = keys
+                changed.append(author)
+        queryset.model._base_manager.bulk_update(changed, ['last_name_key', 'first_name_key'])
+        return len(changed)
+
+
+@register
+class BookInstanceStatus(Backfill):
+    """
+    Copies saved with a blank status are not listed as available, on loan or in maintenance anywhere: they are in
+    maintenance (the default status) until a librarian sets it. The loan lists then get their partial index.
+    """
+    name = 'bookinstance-status'
+    model = 'catalog.BookInstance'
+    indexes = ('bookinstance_loans_idx',)
+
+    def process(self, queryset):
+        # status is in the outbox feed, and update() sends no signals.
+        pks = list(queryset.filter(status='').values_list('pk', flat=True))
+        queryset.filter(pk__in=pks).update(status='m')
+        record_changes(queryset.model, pks)
+        return len(pks)
@@ -0,0 +1,180 @@
+"""
+Online snapshots of the SQLite databases (python manage.py backup_db), taken while the site keeps running.
+
+Copying db.sqlite3 while workers write to it gives corrupt or stale files. Snapshots use SQLite's online backup
+API instead: it copies PAGES pages at a time and sleeps SLEEP seconds between steps, so the writers are never
+locked out for long (a write from another connection restarts the copy, which stays consistent).
+Each snapshot is checked with PRAGMA integrity_check before it is kept, and optionally gzipped.
+
+Snapshots go to settings.CATALOG_BACKUP_ROOT, listed in manifest.json with their checksum. A snapshot identical to
+the previous one is not kept, so frequent runs only cost disk space when the database changed. Only the `keep`
+newest snapshots of each database are kept.
+"""
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import sqlite3
+import tempfile
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+PAGES = 256
+SLEEP = 0.05
+KEEP = 7
+
+MANIFEST_NAME = 'manifest.json'
+
+
+class BackupError(Exception):
+    pass
+
+
+def database_path(alias):
+    connection = connections[alias]
+    if connection.vendor != 'sqlite':
+        raise BackupError(f'{alias} is not a SQLite database.')
+    return str(connection.settings_dict['NAME'])
+
+
+def database_uri(path, read_only=False):
+    if path.startswith('file:'):
+        # Already a URI, e.g. the in-memory databases of the tests.
+        return path
+    uri = pathlib.Path(path).resolve().as_uri()
+    return f'{uri}?mode=ro' if read_only else uri
+
+
+def copy_database(source, target, pages=PAGES, sleep=SLEEP):
+    """ Copy the SQLite database `source` into `target` with the online backup API. """
+    source_connection = sqlite3.connect(database_uri(source, read_only=True), uri=True)
+    target_connection = sqlite3.connect(database_uri(target), uri=True)
+    try:
+        source_connection.backup(target_connection, pages=pages, sleep=sleep)
+    finally:
+        target_connection.close()
+        source_connection.close()
+
+
+def check_integrity(path):
+    connection = sqlite3.connect(database_uri(path, read_only=True), uri=True)
+    try:
+        result = [row[0] for row in connection.execute('PRAGMA integrity_check')]
+    except sqlite3.DatabaseError as error:
+        result = [str(error)]
+    finally:
+        connection.close()
+    if result != ['ok']:
+        raise BackupError(f'Integrity check failed for {path}: {"; ".join(result[:5])}')
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_manifest(root):
+    try:
+        with open(os.path.join(root, MANIFEST_NAME)) as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def write_manifest(root, manifest):
+    path = os.path.join(root, MANIFEST_NAME)
+    with open(f'{path}.tmp', 'w') as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(f'{path}.tmp', path)
+
+
+def backup(alias=DEFAULT_DB_ALIAS, compress=True, keep=KEEP, force=False, pages=PAGES, sleep=SLEEP):
+    """
+    Snapshot a database into settings.CATALOG_BACKUP_ROOT. Returns the manifest entry of the new snapshot,
+    or None if the database did not change since the previous one (unless `force`).
+    """
+    root = settings.CATALOG_BACKUP_ROOT
+    os.makedirs(root, exist_ok=True)
+    manifest = read_manifest(root)
+    snapshots = manifest.setdefault(alias, [])
+
+    with tempfile.TemporaryDirectory(dir=root) as scratch:
+        copy = os.path.join(scratch, 'snapshot.sqlite3')
+        copy_database(database_path(alias), copy, pages, sleep)
+        check_integrity(copy)
+        checksum = file_checksum(copy)
+        if snapshots and snapshots[-1]['checksum'] == checksum and not force:
+            return None
+
+        now = datetime.datetime.now(datetime.timezone.utc)
+        name = f"{alias}-{now.strftime('%Y%m%d-%H%M%S-%f')}.sqlite3"
+        if compress:
+            name += '.gz'
+            with open(copy, 'rb') as source, gzip.open(os.path.join(scratch, name), 'wb') as target:
+                shutil.copyfileobj(source, target, 1 << 20)
+            os.replace(os.path.join(scratch, name), os.path.join(root, name))
+        else:
+            os.replace(copy, os.path.join(root, name))
+
+    entry = {'name': name, 'checksum': checksum, 'size': os.path.getsize(os.path.join(root, name)),
+             'created': now.isoformat()}
+    snapshots.append(entry)
+    prune(root, snapshots, keep)
+    write_manifest(root, manifest)
+    return entry
+
+
+def prune(root, snapshots, keep):
+    """ Delete the oldest snapshots of a database (a manifest list, updated in place) beyond the `keep` newest. """
+    while len(snapshots) > max(keep, 1):
+        old = snapshots.pop(0)
+        path = os.path.join(root, old['name'])
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def snapshot_path(name, alias=DEFAULT_DB_ALIAS):
+    """ Path of a snapshot: a file name from the manifest, 'latest' (for `alias`), or any path. """
+    root = settings.CATALOG_BACKUP_ROOT
+    if name == 'latest':
+        snapshots = read_manifest(root).get(alias)
+        if not snapshots:
+            raise BackupError(f'No snapshot of {alias} in {root}.')
+        name = snapshots[-1]['name']
+    path = name if os.path.isabs(name) else os.path.join(root, name)
+    if not os.path.exists(path):
+        raise BackupError(f'No such snapshot: {path}')
+    return path
+
+
+def restore(path, alias):
+    """
+    Load a snapshot into the database `alias` (e.g. a read replica). It stays readable meanwhile: its readers see
+    the old data, then the new one. The default database is not a valid target: restore it with the site stopped,
+    by replacing its file.
+    """
+    if alias == DEFAULT_DB_ALIAS:
+        raise BackupError('Refusing to restore into the default database while it is in use.')
+    target = database_path(alias)
+    connections[alias].close()
+    restore_file(path, target)
+
+
+def restore_file(path, target, pages=PAGES, sleep=SLEEP):
+    """ Check a snapshot (gzipped or not) and copy it into the SQLite database `target`. """
+    with tempfile.TemporaryDirectory() as scratch:
+        source = path
+        if path.endswith('.gz'):
+            source = os.path.join(scratch, 'snapshot.sqlite3')
+            with gzip.open(path, 'rb') as compressed, open(source, 'wb') as file:
+                shutil.copyfileobj(compressed, file, 1 << 20)
+        check_integrity(source)
+        copy_database(source, target, pages, sleep)
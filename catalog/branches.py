@@ -0,0 +1,222 @@
+"""
+Library branches and their copies.
+
+Every copy (BookInstance) can belong to a branch. By default all of them are in the default database. With
+settings.CATALOG_BRANCH_DATABASES, the copies of the listed branches live in a database of their own
+(see catalog.routers.BranchRouter), while the catalog, the users and the branches stay in the default one.
+Queries about the copies of every branch then run on each database in parallel (fan_out) and are merged here, so
+views go through these helpers rather than BookInstance.objects.
+
+In that mode, the queries joining copies with the catalog in SQL (the "available" facet, the recommendations build,
+the archive and the admin site) only see the copies kept in the default database.
+"""
+import datetime
+import heapq
+
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Count, prefetch_related_objects
+
+from .models import BookInstance, Branch
+
+
+_branch_databases = {}
+
+
+def branch_database(branch_id):
+    """ Database alias holding the copies of a branch. """
+    if not settings.CATALOG_BRANCH_DATABASES:
+        return DEFAULT_DB_ALIAS
+    if branch_id not in _branch_databases:
+        code = Branch.objects.using(DEFAULT_DB_ALIAS).filter(pk=branch_id).values_list('code', flat=True).first()
+        _branch_databases[branch_id] = settings.CATALOG_BRANCH_DATABASES.get(code, DEFAULT_DB_ALIAS)
+    return _branch_databases[branch_id]
+
+
+def forget_branch_databases():
+    """ Called when branches change (see catalog.signals). """
+    _branch_databases.clear()
+
+
+def copy_databases():
+    """ Aliases of every database holding copies. """
+    return [DEFAULT_DB_ALIAS, *sorted(set(settings.CATALOG_BRANCH_DATABASES.values()) - {DEFAULT_DB_ALIAS})]
+
+
+def fan_out(func, databases=None):
+    """
+    Results of func(alias) for every database holding copies. The first one (the default database, where the
+    caller may be inside a transaction) is queried in this thread, the other ones in parallel threads.
+    """
+    databases = databases or copy_databases()
+    if len(databases) == 1:
+        return [func(databases[0])]
+
+    def run(alias):
+        try:
+            return func(alias)
+        finally:
+            # Connections belong to the worker thread: do not leave them open.
+            connections[alias].close()
+
+    with ThreadPoolExecutor(max_workers=len(databases) - 1) as executor:
+        others = executor.map(run, databases[1:])
+        first = func(databases[0])
+        return [first, *others]
+
+
+def due_back_key(book_instance):
+    # Same order as ORDER BY due_back, id on SQLite: copies without a due date first.
+    return book_instance.due_back is not None, book_instance.due_back or datetime.date.min, book_instance.pk
+
+
+class MergedCopies:
+    """
+    Copies of several databases, ordered by due date, for views and paginators. Nothing is read up front: a slice
+    reads the first `stop` copies of each database and merges them, and count() counts in each database, so a page
+    of a list costs the same as in a single database.
+    """
+    model = BookInstance
+
+    def __init__(self, databases, filters):
+        self.databases = databases
+        self.filters = filters
+        self._count = None
+
+    def queryset(self, alias):
+        return BookInstance.objects.using(alias).filter(**self.filters).order_by('due_back', 'pk')
+
+    def count(self):
+        if self._count is None:
+            self._count = sum(fan_out(lambda alias: self.queryset(alias).count(), self.databases))
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __bool__(self):
+        return bool(self[:1])
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            found = self[index:index + 1]
+            if not found:
+                raise IndexError(index)
+            return found[0]
+        if (index.start or 0) < 0 or (index.stop or 0) < 0:
+            raise ValueError('Negative indexing is not supported.')
+
+        def read(alias):
+            queryset = self.queryset(alias)
+            return list(queryset[:index.stop] if index.stop is not None else queryset)
+
+        merged = list(islice(heapq.merge(*fan_out(read, self.databases), key=due_back_key),
+                             index.start, index.stop, index.step))
+        # The books and branches are in the default database, prefetching reads them there.
+        prefetch_related_objects(merged, 'book', 'branch')
+        return merged
+
+
+def copies(branch=None, **filters):
+    """
+    Copies matching `filters`, ordered by due date, from every branch or from a single one.
+    A queryset when they all come from one database, else a MergedCopies.
+    """
+    if branch is not None:
+        filters['branch'] = branch
+        databases = [branch_database(branch.pk)]
+    else:
+        databases = copy_databases()
+    if databases == [DEFAULT_DB_ALIAS]:
+        return BookInstance.objects.filter(**filters).select_related('book', 'branch').order_by('due_back', 'pk')
+    if len(databases) == 1:
+        # No join across databases: the books and branches are prefetched from the default one.
+        return (
+            BookInstance.objects.using(databases[0]).filter(**filters)
+            .prefetch_related('book', 'branch').order_by('due_back', 'pk')
+        )
+    return MergedCopies(databases, filters)
+
+
+def iter_copies(branch=None, chunk_size=2000, **filters):
+    """
+    Like copies(), but streamed in chunks with their book, borrower and branch, for lists too long to hold in memory.
+    The copies of several databases are merged on the fly.
+    """
+    if branch is not None:
+        filters['branch'] = branch
+        databases = [branch_database(branch.pk)]
+    else:
+        databases = copy_databases()
+
+    def stream(alias):
+        queryset = BookInstance.objects.using(alias).filter(**filters).order_by('due_back', 'pk')
+        if alias == DEFAULT_DB_ALIAS:
+            queryset = queryset.select_related('book', 'borrower', 'branch')
+        else:
+            queryset = queryset.prefetch_related('book', 'borrower', 'branch')
+        return queryset.iterator(chunk_size=chunk_size)
+
+    if len(databases) == 1:
+        return stream(databases[0])
+    return heapq.merge(*(stream(alias) for alias in databases), key=due_back_key)
+
+
+def get_copy(pk):
+    """ The copy with this primary key, wherever it is kept, or None. """
+    found = fan_out(lambda alias: BookInstance.objects.using(alias).filter(pk=pk).first())
+    return next((book_instance for book_instance in found if book_instance is not None), None)
+
+
+def count_copies(**filters):
+    """ Number of copies matching `filters` in every branch. """
+    return sum(fan_out(lambda alias: BookInstance.objects.using(alias).filter(**filters).count()))
+
+
+def branch_counters():
+    """
+    Copies, available copies and copies on loan per branch: [(branch, {'copies': ..., 'available': ...,
+    'on_loan': ...}), ...]. One GROUP BY per database.
+    """
+    def count(alias):
+        return list(
+            BookInstance.objects.using(alias).filter(branch__isnull=False).order_by()
+            .values_list('branch', 'status').annotate(count=Count('pk'))
+        )
+
+    counters = {}
+    for branch_id, status, number in chain.from_iterable(fan_out(count)):
+        branch_counts = counters.setdefault(branch_id, {'copies': 0, 'available': 0, 'on_loan': 0})
+        branch_counts['copies'] += number
+        if status == 'a':
+            branch_counts['available'] += number
+        elif status == 'o':
+            branch_counts['on_loan'] += number
+    return [
+        (branch, counters.get(branch.pk, {'copies': 0, 'available': 0, 'on_loan': 0}))
+        for branch in Branch.objects.using(DEFAULT_DB_ALIAS)
+    ]
+
+
+def availability(book):
+    """ Number of available copies of a book per branch: [(branch or None, count), ...], most first. """
+    def count(alias):
+        return list(
+            BookInstance.objects.using(alias).filter(book=book, status__exact='a').order_by()
+            .values_list('branch').annotate(count=Count('pk'))
+        )
+
+    totals = {}
+    for branch_id, number in chain.from_iterable(fan_out(count)):
+        totals[branch_id] = totals.get(branch_id, 0) + number
+    branches = Branch.objects.using(DEFAULT_DB_ALIAS).in_bulk([pk for pk in totals if pk is not None])
+    return sorted(
+        ((branches.get(branch_id), number) for branch_id, number in totals.items()),
+        key=lambda item: -item[1],
+    )
@@ -0,0 +1,115 @@
+"""
+Helpers shared by the catalog caches.
+
+Cached data records the versions of what it shows: a global catalog version (books, authors, genres...), the
+version of the copies (their availability is counted on the book lists and the home page), and a version per book
+for its copies and reviews. Invalidating after a change is a single increment, and old entries just expire.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+
+PAGE_CACHE_VERSION_KEY = 'catalog:page-cache-version'
+COPIES_VERSION_KEY = 'catalog:copies-version'
+
+
+def cache_version(key):
+    """ Current value of a version counter stored in the cache (see invalidate_version). """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, timeout=None)
+        version = cache.get(key, 1)
+    return version
+
+
+def invalidate_version(key):
+    """ Increment a version counter, so every cache entry keyed by its previous value is ignored. """
+    try:
+        cache.incr(key)
+    except ValueError:
+        # The key is missing (first use, or the cache has been flushed).
+        cache.add(key, 1, timeout=None)
+
+
+def page_cache_version():
+    """ Return the current version of the cached catalog pages. """
+    return cache_version(PAGE_CACHE_VERSION_KEY)
+
+
+def invalidate_pages():
+    """ Make every cached catalog page stale, e.g. after a book or an author has changed. """
+    invalidate_version(PAGE_CACHE_VERSION_KEY)
+
+
+def book_version_key(pk):
+    return f'catalog:book-version:{pk}'
+
+
+def invalidate_book(pk, copies=False):
+    """
+    Make the cached detail page of a book stale after a change to its copies or reviews, and the counts of
+    available copies too if `copies`.
+    """
+    invalidate_version(book_version_key(pk))
+    if copies:
+        invalidate_version(COPIES_VERSION_KEY)
+
+
+def page_version(url_name, kwargs):
+    """ Versions of the data shown by a cached page: its cache entry is stale once one of them changes. """
+    keys = [PAGE_CACHE_VERSION_KEY]
+    if url_name == 'books':
+        # The availability facet.
+        keys.append(COPIES_VERSION_KEY)
+    elif url_name == 'book-detail':
+        keys.append(book_version_key(kwargs.get('pk')))
+    return tuple(cache_version(key) for key in keys)
+
+
+def home_counters():
+    """
+    Record counts shown on the home page. They are cached with the pages (when the page cache is enabled),
+    since they only change with the catalog.
+    """
+    from .branches import branch_counters, count_copies
+    from .models import Author, Book, Genre
+
+    timeout = settings.CATALOG_PAGE_CACHE_TIMEOUT
+    key = f'catalog:home-counters:{page_cache_version()}:{cache_version(COPIES_VERSION_KEY)}'
+    counters = cache.get(key) if timeout else None
+    if counters is None:
+        counters = {
+            'num_books': Book.objects.count(),
+            'num_instances': count_copies(),
+            # Available books (status = 'a')
+            'num_instances_available': count_copies(status__exact='a'),
+            'branches': branch_counters(),
+            'num_authors': Author.objects.count(),
+            'num_genres': Genre.objects.count(),
+            'num_books_containing_The': Book.objects.filter(title__icontains='The').count(),
+        }
+        if timeout:
+            cache.set(key, counters, timeout=timeout + settings.CATALOG_PAGE_CACHE_STALE)
+    return counters
+
+
+def initial_counts(model, field):
+    """
+    Number of records of `model` per first character of their sort key `field`, e.g. {'a': 120, 'b': 85, ...}.
+    A single GROUP BY over the sort key index, cached with the pages (when the page cache is enabled).
+    """
+    from django.db.models import Count
+    from django.db.models.functions import Substr
+
+    timeout = settings.CATALOG_PAGE_CACHE_TIMEOUT
+    key = f'catalog:initials:{model._meta.label_lower}:{field}:{page_cache_version()}'
+    counts = cache.get(key) if timeout else None
+    if counts is None:
+        rows = (
+            model.objects.order_by().annotate(initial=Substr(field, 1, 1))
+            .values_list('initial').annotate(count=Count('pk'))
+        )
+        counts = dict(rows)
+        if timeout:
+            cache.set(key, counts, timeout=timeout + settings.CATALOG_PAGE_CACHE_STALE)
+    return counts
@@ -0,0 +1,110 @@
+"""
+Faceted browsing of the book list: filters by genre, language, author and available copies, with the number of
+books behind every option.
+
+Each facet is counted by a single aggregate query (a GROUP BY over the indexed many-to-many or foreign key column,
+restricted to the filtered books), and the counts are cached with the pages when the page cache is enabled.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Exists, OuterRef
+
+from .cache import COPIES_VERSION_KEY, cache_version, page_cache_version
+from .models import Author, Book, BookInstance, Genre, Language
+
+
+FACETS = (
+    # (query parameter, title, model)
+    ('genre', 'Genre', Genre),
+    ('language', 'Language', Language),
+    ('author', 'Author', Author),
+)
+
+# Only the authors with the most books are offered, there can be thousands of them.
+AUTHOR_FACET_SIZE = 20
+
+
+def parse_filters(query):
+    """ Valid filters of a query dict, e.g. {'genre': 3, 'available': True}. Invalid values are ignored. """
+    filters = {}
+    for name, _, _ in FACETS:
+        value = query.get(name, '')
+        if value.isdigit():
+            filters[name] = int(value)
+    if query.get('available') == '1':
+        filters['available'] = True
+    return filters
+
+
+def filter_books(queryset, filters):
+    """ Restrict a Book queryset to the given filters. """
+    for name, _, _ in FACETS:
+        if name in filters:
+            queryset = queryset.filter(**{name: filters[name]})
+    if filters.get('available'):
+        queryset = queryset.filter(Exists(BookInstance.objects.filter(book=OuterRef('pk'), status__exact='a')))
+    return queryset
+
+
+def facet_counts(filters):
+    """
+    Number of filtered books per option of every facet:
+    {'genre': [(pk, label, count), ...], 'language': [...], 'author': [...], 'available': count}
+    """
+    timeout = settings.CATALOG_PAGE_CACHE_TIMEOUT
+    fingerprint = hashlib.md5(repr(sorted(filters.items())).encode()).hexdigest()
+    key = f'catalog:facets:{page_cache_version()}:{cache_version(COPIES_VERSION_KEY)}:{fingerprint}'
+    counts = cache.get(key) if timeout else None
+    if counts is None:
+        books = filter_books(Book.objects.order_by(), filters)
+        counts = {}
+        for name, _, model in FACETS:
+            options = model.objects.all()
+            if filters:
+                options = options.filter(book__in=books.values('pk'))
+            options = options.annotate(count=Count('book')).filter(count__gt=0)
+            if model is Author:
+                options = options.only('first_name', 'last_name').order_by('-count', 'last_name_key', 'first_name_key')[:AUTHOR_FACET_SIZE]
+            else:
+                options = options.order_by('name')
+            counts[name] = [(option.pk, str(option), option.count) for option in options]
+        counts['available'] = filter_books(books, {'available': True}).count()
+        if timeout:
+            cache.set(key, counts, timeout=timeout + settings.CATALOG_PAGE_CACHE_STALE)
+    return counts
+
+
+def facet_links(query, filters):
+    """
+    Facets to show next to the book list: each option with its count and a link that toggles it,
+    keeping the other filters.
+    """
+    counts = facet_counts(filters)
+
+    def toggle(name, value, selected):
+        toggled = query.copy()
+        for parameter in ('page', 'letter', name):
+            toggled.pop(parameter, None)
+        if not selected:
+            toggled[name] = value
+        return f'?{toggled.urlencode()}'
+
+    facets = []
+    for name, title, _ in FACETS:
+        options = []
+        for pk, label, count in counts[name]:
+            selected = filters.get(name) == pk
+            options.append({'label': label, 'count': count, 'url': toggle(name, pk, selected), 'selected': selected})
+        facets.append({'name': name, 'title': title, 'options': options})
+    selected = 'available' in filters
+    facets.append({
+        'name': 'available',
+        'title': 'Availability',
+        'options': [{
+            'label': 'Available now', 'count': counts['available'], 'url': toggle('available', 1, selected),
+            'selected': selected,
+        }],
+    })
+    return facets
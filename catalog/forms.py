@@ -5,8 +5,6 @@ from django import forms
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 
-from catalog.models import BookInstance
-
 
 class RenewBookForm(forms.Form):
     renewal_date = forms.DateField(help_text="Enter a date between now and 4 weeks (default 3).")
@@ -30,7 +28,7 @@ class RenewBookForm(forms.Form):
 
    
 """
-# Equivalent using ModelForm instead of Form
+# Equivalent using ModelForm instead of Form (requires: from catalog.models import BookInstance)
 
 class RenewBookModelForm(forms.ModelForm):
     def clean_due_back(self):
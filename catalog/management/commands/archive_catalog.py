@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from catalog.archive import BATCH_SIZE, archive_cold_rows, cold_copies, cold_reviews
+
+
+class Command(BaseCommand):
+    help = (
+        'Move retired copies and old reviews to the archive tables (see catalog.archive). '
+        'Archived rows can be restored from the admin site.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Rows moved per transaction.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count the rows that would be archived.')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            counts = {'copies': cold_copies().count(), 'reviews': cold_reviews().count()}
+            self.stdout.write(f"Would archive {counts['copies']} copies and {counts['reviews']} reviews.")
+            return
+        counts = archive_cold_rows(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {counts['copies']} copies and {counts['reviews']} reviews."
+        ))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from catalog.backups import KEEP, PAGES, SLEEP, BackupError, backup, restore, snapshot_path
+
+
+class Command(BaseCommand):
+    help = (
+        'Snapshot a SQLite database while the site is running, into settings.CATALOG_BACKUP_ROOT '
+        '(see catalog.backups), or restore a snapshot into another database, e.g. a read replica.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database to snapshot.')
+        parser.add_argument('--no-compress', action='store_false', dest='compress',
+                            help='Keep the snapshot as a plain SQLite file instead of gzipping it.')
+        parser.add_argument('--keep', type=int, default=KEEP, help='Number of snapshots kept per database.')
+        parser.add_argument('--force', action='store_true',
+                            help='Keep the snapshot even if the database did not change since the previous one.')
+        parser.add_argument('--pages', type=int, default=PAGES, help='Pages copied per step.')
+        parser.add_argument('--sleep', type=float, default=SLEEP, help='Seconds to wait between steps.')
+        parser.add_argument('--restore', metavar='SNAPSHOT',
+                            help='Snapshot to restore ("latest" for the newest snapshot of --database).')
+        parser.add_argument('--into', metavar='DATABASE', help='Database to restore the snapshot into.')
+
+    def handle(self, *args, **options):
+        try:
+            if options['restore']:
+                if not options['into']:
+                    raise CommandError('--restore needs --into.')
+                path = snapshot_path(options['restore'], options['database'])
+                restore(path, options['into'])
+                self.stdout.write(self.style.SUCCESS(f"Restored {path} into {options['into']}."))
+                return
+            entry = backup(
+                options['database'], compress=options['compress'], keep=options['keep'], force=options['force'],
+                pages=options['pages'], sleep=options['sleep'],
+            )
+        except BackupError as error:
+            raise CommandError(error)
+        if entry is None:
+            self.stdout.write(f"{options['database']} did not change since the last snapshot.")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Wrote {entry['name']} ({entry['size']} bytes)."))
@@ -0,0 +1,31 @@
+import statistics
+import subprocess
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from .startup_report import boot_command
+
+
+class Command(BaseCommand):
+    help = 'Measure how long a fresh web worker process takes to boot the project.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=10, help='Number of worker boots measured.')
+        parser.add_argument('--no-urls', action='store_true', help='Do not load the URLconf as part of the boot.')
+
+    def handle(self, *args, **options):
+        command = boot_command(load_urls=not options['no_urls'])
+        timings = []
+        for _ in range(options['repeat']):
+            start = time.perf_counter()
+            result = subprocess.run(command, capture_output=True, text=True, cwd=settings.BASE_DIR)
+            timings.append((time.perf_counter() - start) * 1000)
+            if result.returncode:
+                raise CommandError(f'The boot failed:\n{result.stderr}')
+
+        self.stdout.write(
+            f'{len(timings)} boots: min {min(timings):.0f} ms, median {statistics.median(timings):.0f} ms, '
+            f'max {max(timings):.0f} ms'
+        )
@@ -0,0 +1,100 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.template import engines
+from django.test import RequestFactory
+
+from catalog.models import Author, Book, BookInstance
+
+
+class Command(BaseCommand):
+    help = 'Compare the render time of the hot catalog templates with the Django and the Jinja2 engines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=500, help='Renders per template and engine.')
+        parser.add_argument('--username', help='Render as this user (e.g. a librarian), instead of anonymously.')
+
+    def handle(self, *args, **options):
+        request = RequestFactory().get('/catalog/')
+        request.user = AnonymousUser()
+        if options['username']:
+            try:
+                request.user = get_user_model().objects.get(username=options['username'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"User {options['username']} does not exist")
+
+        # Sample data is created if the catalog is empty, and always rolled back.
+        with transaction.atomic():
+            cases = self.cases()
+            self.stdout.write(f"{'template':<28}{'django (ms)':>14}{'jinja2 (ms)':>14}{'speed-up':>10}")
+            for template_name, context in cases:
+                timings = [
+                    self.time_render(engines[engine].get_template(template_name), context, request, options['iterations'])
+                    for engine in ('django', 'jinja2')
+                ]
+                self.stdout.write(
+                    f'{template_name:<28}{timings[0] * 1000:>14.3f}{timings[1] * 1000:>14.3f}'
+                    f'{timings[0] / timings[1]:>9.2f}x'
+                )
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def time_render(template, context, request, iterations):
+        """ Return the average time of a render, after a first one that warms up the caches. """
+        template.render(context, request)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            template.render(context, request)
+        return (time.perf_counter() - start) / iterations
+
+    def cases(self):
+        """
+        Return (template name, context) pairs close to what the views pass. Related objects are prefetched,
+        so the timings are about the templates and not the database.
+        """
+        if not Book.objects.exists():
+            self.create_sample_catalog()
+
+        books = Paginator(Book.objects.select_related('author').order_by('pk'), 10)
+        authors = Paginator(Author.objects.all(), 5)
+        book = (
+            Book.objects.select_related('author')
+            .prefetch_related('genre', 'language', 'bookinstance_set')
+            .order_by('pk').first()
+        )
+        author = Author.objects.prefetch_related('book_set').get(pk=book.author_id) if book.author_id else None
+
+        book_page, author_page = books.page(1), authors.page(1)
+        cases = [
+            ('catalog/book_list.html', {
+                'book_list': list(book_page), 'page_obj': book_page, 'paginator': books,
+                'is_paginated': book_page.has_other_pages(),
+            }),
+            ('catalog/author_list.html', {
+                'author_list': list(author_page), 'page_obj': author_page, 'paginator': authors,
+                'is_paginated': author_page.has_other_pages(),
+            }),
+            ('catalog/book_detail.html', {
+                'book': book, 'object': book,
+                'recommendations': list(book.recommendations.select_related('recommended')),
+                'similar_books': list(book.similar_books.select_related('similar')),
+            }),
+        ]
+        if author:
+            cases.append(('catalog/author_detail.html', {'author': author, 'object': author}))
+        return cases
+
+    @staticmethod
+    def create_sample_catalog():
+        author = Author.objects.create(first_name='Sample', last_name='Author')
+        for index in range(30):
+            book = Book.objects.create(
+                title=f'Sample book {index}', summary='A sample summary. ' * 20,
+                isbn=f'{index:013d}', author=author,
+            )
+            for _ in range(3):
+                BookInstance.objects.create(book=book, imprint='Sample imprint', status='a')
@@ -0,0 +1,52 @@
+import random
+import string
+import sys
+import time
+
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+
+from catalog.typeahead import PrefixIndex, book_key
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the memory and the lookup time of the typeahead prefix index (see catalog.typeahead) on synthetic '
+        'titles, next to a plain sorted list of (key, id, title) tuples.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--titles', type=int, default=1_000_000, help='Number of titles indexed.')
+        parser.add_argument('--lookups', type=int, default=100_000, help='Random prefix lookups.')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        words = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))).capitalize() for _ in range(5000)]
+        titles = [' '.join(rng.choices(words, k=rng.randint(1, 5))) for _ in range(options['titles'])]
+        entries = [(book_key(title), pk, title) for pk, title in enumerate(titles, start=1)]
+        prefixes = [book_key(rng.choice(titles))[:rng.randint(1, 6)].encode() for _ in range(options['lookups'])]
+
+        start = time.perf_counter()
+        index = PrefixIndex(entries)
+        build_time = time.perf_counter() - start
+        packed_memory = index.memory_usage()
+        # The same entries as Python objects: the list, its tuples, and their strings and ints.
+        plain_memory = sys.getsizeof(entries) + sum(
+            sys.getsizeof(entry) + sum(sys.getsizeof(value) for value in entry) for entry in entries
+        )
+
+        start = time.perf_counter()
+        for prefix in prefixes:
+            list(islice(index.search(prefix), 8))
+        lookup_time = (time.perf_counter() - start) / len(prefixes)
+
+        count = len(entries)
+        self.stdout.write(f"{'':<22}{'MiB':>10}{'bytes/title':>14}")
+        self.stdout.write(f"{'prefix index':<22}{packed_memory / 2 ** 20:>10.1f}{packed_memory / count:>14.1f}")
+        self.stdout.write(f"{'list of tuples':<22}{plain_memory / 2 ** 20:>10.1f}{plain_memory / count:>14.1f}")
+        self.stdout.write(
+            f'{count:,} titles indexed in {build_time:.1f}s, '
+            f'{lookup_time * 1e6:.1f} µs per lookup (8 suggestions).'
+        )
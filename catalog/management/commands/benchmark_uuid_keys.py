@@ -0,0 +1,91 @@
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from catalog.utils import uuid7
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare random (v4) and time-ordered (v7) UUID primary keys on a table shaped like catalog_bookinstance: '
+        'insert throughput, lookup time and index size.'
+    )
+
+    # Same layout Django creates for BookInstance on SQLite: the UUID is stored as 32 hex characters.
+    create_table = (
+        'CREATE TABLE bookinstance (id char(32) NOT NULL PRIMARY KEY, imprint varchar(200) NOT NULL, '
+        'due_back date NULL, status varchar(1) NOT NULL, book_id bigint NULL, borrower_id integer NULL)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000,
+                            help='Rows inserted per key type (use tens of millions for the full picture).')
+        parser.add_argument('--batch-size', type=int, default=10_000, help='Rows inserted per transaction.')
+        parser.add_argument('--lookups', type=int, default=100_000, help='Random primary key lookups.')
+        parser.add_argument('--directory', help='Where to create the temporary databases (default: system tmp).')
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'keys':<6}{'rows/s':>12}{'lookups/s':>12}{'file (MiB)':>12}{'pk index (MiB)':>16}"
+        )
+        for label, generate in (('uuid4', uuid.uuid4), ('uuid7', uuid7)):
+            with tempfile.TemporaryDirectory(dir=options['directory']) as directory:
+                result = self.run(os.path.join(directory, 'bench.sqlite3'), generate, options)
+            self.stdout.write(
+                f"{label:<6}{result['insert_rate']:>12,.0f}{result['lookup_rate']:>12,.0f}"
+                f"{result['file_size'] / 2 ** 20:>12.1f}"
+                f"{result['index_size'] / 2 ** 20 if result['index_size'] else float('nan'):>16.1f}"
+            )
+
+    def run(self, path, generate, options):
+        connection = sqlite3.connect(path, isolation_level=None)
+        connection.execute(self.create_table)
+
+        rows, batch_size = options['rows'], options['batch_size']
+        sample_every = max(1, rows // options['lookups'])
+        sample = []
+
+        start = time.perf_counter()
+        for batch_start in range(0, rows, batch_size):
+            batch = []
+            for position in range(batch_start, min(batch_start + batch_size, rows)):
+                key = generate().hex
+                if position % sample_every == 0:
+                    sample.append(key)
+                batch.append((key, 'Imprint', None, 'a', position % 1000, None))
+            connection.execute('BEGIN')
+            connection.executemany('INSERT INTO bookinstance VALUES (?, ?, ?, ?, ?, ?)', batch)
+            connection.execute('COMMIT')
+        insert_time = time.perf_counter() - start
+
+        random.shuffle(sample)
+        start = time.perf_counter()
+        for key in sample:
+            connection.execute('SELECT status FROM bookinstance WHERE id = ?', (key,)).fetchone()
+        lookup_time = time.perf_counter() - start
+
+        connection.close()
+        return {
+            'insert_rate': rows / insert_time,
+            'lookup_rate': len(sample) / lookup_time,
+            'file_size': os.path.getsize(path),
+            'index_size': self.index_size(path),
+        }
+
+    @staticmethod
+    def index_size(path):
+        """ Size of the primary key index, if SQLite was compiled with the dbstat virtual table. """
+        connection = sqlite3.connect(path)
+        try:
+            return connection.execute(
+                "SELECT SUM(pgsize) FROM dbstat WHERE name = 'sqlite_autoindex_bookinstance_1'"
+            ).fetchone()[0]
+        except sqlite3.OperationalError:
+            return None
+        finally:
+            connection.close()
@@ -0,0 +1,107 @@
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from catalog.models import Author, Book
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the sync and gthread gunicorn worker types (gunicorn.conf.py) on the catalog pages. '
+        'The page cache and the rate limits are disabled, so the views themselves are measured.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Gunicorn worker processes.')
+        parser.add_argument('--threads', type=int, default=4, help='Threads per gthread worker.')
+        parser.add_argument('--concurrency', type=int, default=16, help='Concurrent clients.')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds of load per worker type.')
+
+    def handle(self, *args, **options):
+        paths = [reverse('index'), reverse('books'), reverse('authors')]
+        paths += [book.get_absolute_url() for book in Book.objects.order_by('pk')[:5]]
+        paths += [author.get_absolute_url() for author in Author.objects.order_by('pk')[:5]]
+
+        self.stdout.write(f"{'worker':<10}{'req/s':>10}{'p50 (ms)':>10}{'p95 (ms)':>10}{'errors':>8}")
+        for worker_class in ('sync', 'gthread'):
+            threads = options['threads'] if worker_class == 'gthread' else 1
+            with self.server(worker_class, options['workers'], threads) as base_url:
+                latencies, errors, elapsed = self.load(base_url, paths, options['concurrency'], options['duration'])
+            latencies.sort()
+            self.stdout.write(
+                f'{worker_class:<10}{len(latencies) / elapsed:>10.1f}'
+                f'{statistics.median(latencies) if latencies else 0:>10.1f}'
+                f'{latencies[int(len(latencies) * 0.95)] if latencies else 0:>10.1f}{errors:>8}'
+            )
+
+    @contextmanager
+    def server(self, worker_class, workers, threads):
+        """ Run gunicorn with gunicorn.conf.py on a free port and yield its base URL. """
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        env = dict(
+            os.environ, GUNICORN_BIND=f'127.0.0.1:{port}', GUNICORN_WORKER_CLASS=worker_class,
+            GUNICORN_WORKERS=str(workers), GUNICORN_THREADS=str(threads), GUNICORN_ACCESSLOG='',
+            GUNICORN_LOGLEVEL='warning', CATALOG_PAGE_CACHE_TIMEOUT='0', CATALOG_RATE_LIMITS='off',
+            CATALOG_SHED_QUEUE_LATENCY_MS='0', DJANGO_ALLOWED_HOSTS='127.0.0.1',
+        )
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'locallibrary.wsgi'],
+            cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL,
+        )
+        try:
+            base_url = f'http://127.0.0.1:{port}'
+            self.wait_until_ready(base_url, process)
+            yield base_url
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+    @staticmethod
+    def wait_until_ready(base_url, process, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError('Gunicorn exited before serving any request')
+            try:
+                urllib.request.urlopen(base_url + reverse('index'), timeout=1).read()
+                return
+            except (urllib.error.URLError, ConnectionError, TimeoutError):
+                time.sleep(0.2)
+        raise CommandError('Gunicorn did not start in time')
+
+    @staticmethod
+    def load(base_url, paths, concurrency, duration):
+        """ Request the paths in a loop from `concurrency` clients. Returns (latencies in ms, errors, seconds). """
+        deadline = time.monotonic() + duration
+
+        def client(offset):
+            latencies, errors, position = [], 0, offset
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    urllib.request.urlopen(base_url + paths[position % len(paths)], timeout=30).read()
+                    latencies.append((time.perf_counter() - start) * 1000)
+                except (urllib.error.URLError, ConnectionError, TimeoutError):
+                    errors += 1
+                position += 1
+            return latencies, errors
+
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(client, range(concurrency)))
+        elapsed = time.monotonic() - start
+        return [latency for result, _ in results for latency in result], sum(e for _, e in results), elapsed
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from catalog.recommendations import DEFAULT_CHUNK_SIZE, DEFAULT_TOP_K, build_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the "readers also borrowed" recommendations from the borrowing data.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K,
+                            help='Number of neighbours kept per book.')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Number of borrow events loaded in memory at once.')
+
+    def handle(self, *args, **options):
+        stored = build_recommendations(top_k=options['top_k'], chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Stored {stored} recommendations.'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from catalog.similarity import DEFAULT_BLOCK_SIZE, DEFAULT_TOP_N, build_similar_books
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the content-based "similar books" index from titles, summaries and genres.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-n', type=int, default=DEFAULT_TOP_N,
+                            help='Number of similar books kept per book.')
+        parser.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE,
+                            help='Number of books scored at once.')
+
+    def handle(self, *args, **options):
+        stored = build_similar_books(top_n=options['top_n'], block_size=options['block_size'])
+        self.stdout.write(self.style.SUCCESS(f'Stored {stored} similar books.'))
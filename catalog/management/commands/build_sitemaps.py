@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.sitemaps import SHARD_SIZE, build_sitemaps
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate the sitemaps of books and authors and the "new books" Atom feed. '
+        'Only the shards whose rows changed since the last run are rewritten.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', help='Public address of the site (default: settings.CATALOG_SITE_URL).')
+        parser.add_argument('--shard-size', type=int, default=SHARD_SIZE,
+                            help='Primary keys per sitemap file (at most 50000).')
+        parser.add_argument('--force', action='store_true', help='Rewrite every file.')
+
+    def handle(self, *args, **options):
+        if not 0 < options['shard_size'] <= 50_000:
+            raise CommandError('A sitemap holds between 1 and 50000 URLs.')
+        written = build_sitemaps(
+            base_url=options['base_url'], shard_size=options['shard_size'], force=options['force']
+        )
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} files.'))
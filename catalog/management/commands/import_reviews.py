@@ -0,0 +1,28 @@
+import csv
+import sys
+
+from django.core.management.base import BaseCommand
+
+from catalog.reviews import IMPORT_BATCH_SIZE, import_reviews
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk import reviews from a CSV file with "isbn", "publish_date", "grade" and "content" columns '
+        '(an empty publish date means now).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file to import ("-" for the standard input).')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+                            help='Reviews inserted per query and transaction.')
+
+    def handle(self, *args, **options):
+        if options['path'] == '-':
+            imported, errors = import_reviews(csv.DictReader(sys.stdin), batch_size=options['batch_size'])
+        else:
+            with open(options['path'], newline='', encoding='utf-8') as file:
+                imported, errors = import_reviews(csv.DictReader(file), batch_size=options['batch_size'])
+        for number, error in errors:
+            self.stderr.write(f'Row {number} skipped: {error}')
+        self.stdout.write(self.style.SUCCESS(f'Imported {imported} reviews, skipped {len(errors)} rows.'))
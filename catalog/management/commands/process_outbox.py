@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.outbox import process_outbox, purge_events
+
+
+class Command(BaseCommand):
+    help = 'Give the new catalog change events to the outbox consumers (see catalog.outbox).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process the pending events and exit, instead of polling.')
+        parser.add_argument('--consumer', action='append', dest='consumers',
+                            help='Only run this consumer (can be repeated).')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait when there is nothing to process.')
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                counts, failures = process_outbox(options['consumers'])
+            except ValueError as error:
+                raise CommandError(error)
+            for name, count in counts.items():
+                if count:
+                    self.stdout.write(f'{name}: processed {count} event(s).')
+            if options['once']:
+                if failures:
+                    raise CommandError('Failed consumer(s): ' + ', '.join(
+                        f'{name} ({error!r})' for name, error in failures.items()
+                    ))
+                return
+            if not any(counts.values()):
+                purge_events()
+                time.sleep(options['poll_interval'])
@@ -0,0 +1,58 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, router
+
+from catalog.backfills import get_backfill, get_progress, registry, restart, run
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill big tables in small batches while the site is running, then create their indexes '
+        '(see catalog.backfills). Interrupted backfills resume where they stopped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='Backfills to run (default: every unfinished one).')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help='Database to backfill, e.g. a branch database holding copies.')
+        parser.add_argument('--list', action='store_true', help='Show the progress of the backfills instead.')
+        parser.add_argument('--batch-size', type=int, help='Rows per transaction.')
+        parser.add_argument('--sleep', type=float,
+                            help='Minimum seconds to wait between batches (at least the duration of the batch, 0 to not wait).')
+        parser.add_argument('--max-batches', type=int, help='Stop after this many batches, to resume later.')
+        parser.add_argument('--restart', action='store_true', help='Start again from the first row.')
+
+    def handle(self, *args, **options):
+        try:
+            backfills = [get_backfill(name) for name in options['names']]
+        except ValueError as error:
+            raise CommandError(error)
+        if not backfills:
+            # The backfills of the tables of this database (branch databases only hold copies).
+            backfills = [backfill for backfill in registry.values()
+                         if router.allow_migrate_model(options['database'], apps.get_model(backfill.model))]
+        if options['list']:
+            self.stdout.write(f"{'backfill':<24}{'rows':>10}{'changed':>10}{'batches':>9}  state")
+            for backfill in backfills:
+                progress = get_progress(backfill, using=options['database'])
+                state = ('done' if progress.finalized else 'indexing' if progress.completed
+                         else f'at {progress.position}' if progress.position else 'pending')
+                self.stdout.write(f'{backfill.name:<24}{progress.processed:>10}{progress.changed:>10}'
+                                  f'{progress.batches:>9}  {state}')
+            return
+
+        on_batch = None
+        if options['verbosity'] > 1:
+            def on_batch(progress):
+                self.stdout.write(f'{progress.name}: {progress.processed} rows, up to {progress.position}')
+
+        for backfill in backfills:
+            if options['restart']:
+                restart(backfill, options['database'])
+            progress = run(backfill, options['batch_size'], options['sleep'], options['max_batches'],
+                           using=options['database'], on_batch=on_batch)
+            message = f'{backfill.name}: {progress.processed} rows read, {progress.changed} updated'
+            if progress.finalized:
+                self.stdout.write(self.style.SUCCESS(f'{message}, done.'))
+            else:
+                self.stdout.write(f'{message}, stopped at {progress.position}.')
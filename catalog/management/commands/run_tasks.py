@@ -0,0 +1,29 @@
+import time
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from catalog.taskqueue import purge_finished_tasks, run_due_tasks
+
+
+class Command(BaseCommand):
+    help = 'Run the queued background tasks (see catalog.taskqueue).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run the due tasks and exit, instead of polling.')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait when there is nothing to run.')
+        parser.add_argument('--keep-days', type=int, default=7,
+                            help='Finished tasks older than this are deleted when the worker is idle.')
+
+    def handle(self, *args, **options):
+        while True:
+            count = run_due_tasks()
+            if count:
+                self.stdout.write(f'Ran {count} task(s).')
+            if options['once']:
+                return
+            if not count:
+                purge_finished_tasks(timedelta(days=options['keep_days']))
+                time.sleep(options['poll_interval'])
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from catalog.models import SlowQuery
+
+
+class Command(BaseCommand):
+    help = 'Rank the queries of the slow-query log (see catalog.slowqueries).'
+
+    orderings = {
+        'total': F('total_time').desc(),
+        'count': F('count').desc(),
+        'max': F('max_time').desc(),
+        'mean': (F('total_time') / F('count')).desc(),
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('--order', choices=sorted(self.orderings), default='total',
+                            help='Rank by total time (default), occurrences, maximum or mean time.')
+        parser.add_argument('--limit', type=int, default=20, help='Number of queries listed.')
+        parser.add_argument('--view', help='Only list the queries last run by this view.')
+        parser.add_argument('--plans', action='store_true', help='Show the query plans.')
+        parser.add_argument('--reset', action='store_true', help='Empty the log instead.')
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            deleted, _ = SlowQuery.objects.all().delete()
+            self.stdout.write(f'Deleted {deleted} slow queries.')
+            return
+        queries = SlowQuery.objects.order_by(self.orderings[options['order']])
+        if options['view']:
+            queries = queries.filter(view=options['view'])
+        self.stdout.write(f"{'#':>3}{'count':>8}{'total ms':>11}{'mean ms':>9}{'max ms':>9}  view / query")
+        for rank, query in enumerate(queries[:options['limit']], start=1):
+            self.stdout.write(
+                f'{rank:>3}{query.count:>8}{query.total_time:>11.0f}{query.mean_time:>9.1f}{query.max_time:>9.1f}'
+                f'  {query.view or "-"} ({query.database})'
+            )
+            self.stdout.write(f'{"":>42}{query.sql[:200]}')
+            if options['plans'] and query.plan:
+                for line in query.plan.splitlines():
+                    self.stdout.write(f'{"":>44}{line}')
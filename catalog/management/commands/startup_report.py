@@ -0,0 +1,74 @@
+import os
+import subprocess
+import sys
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+# What a web worker runs when it boots (see locallibrary/wsgi.py), optionally followed by the URLconf,
+# which Django otherwise only loads on the first request.
+BOOT_SCRIPT = '''
+import os
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", {settings_module!r})
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+if {load_urls!r}:
+    from django.urls import get_resolver
+    get_resolver().url_patterns
+'''
+
+
+def boot_command(load_urls=True):
+    """ Command line of a Python process that boots the project like a web worker does. """
+    script = BOOT_SCRIPT.format(settings_module=os.environ['DJANGO_SETTINGS_MODULE'], load_urls=load_urls)
+    return [sys.executable, '-c', script]
+
+
+class Command(BaseCommand):
+    help = 'Report the import time of every module loaded while a web worker boots (python -X importtime).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=25, help='Number of modules listed.')
+        parser.add_argument('--sort', choices=('self', 'cumulative'), default='cumulative',
+                            help='Sort modules by their own import time or including their dependencies.')
+        parser.add_argument('--no-urls', action='store_true',
+                            help='Do not load the URLconf (and therefore the views) as part of the boot.')
+
+    def handle(self, *args, **options):
+        command = boot_command(load_urls=not options['no_urls'])
+        command.insert(1, '-X')
+        command.insert(2, 'importtime')
+        result = subprocess.run(command, capture_output=True, text=True, cwd=settings.BASE_DIR)
+        if result.returncode:
+            raise CommandError(f'The boot failed:\n{result.stderr}')
+
+        modules = self.parse(result.stderr)
+        total = sum(own for own, _ in modules.values())
+        packages = defaultdict(int)
+        for name, (own, _) in modules.items():
+            packages[name.split('.')[0]] += own
+
+        self.stdout.write(f'{len(modules)} modules imported in {total / 1000:.1f} ms\n')
+        self.stdout.write(f"{'package':<40}{'self (ms)':>12}")
+        for name, own in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:10]:
+            self.stdout.write(f'{name:<40}{own / 1000:>12.1f}')
+
+        column = 0 if options['sort'] == 'self' else 1
+        self.stdout.write(f"\n{'module':<60}{'self (ms)':>12}{'cumulative (ms)':>18}")
+        ranked = sorted(modules.items(), key=lambda item: item[1][column], reverse=True)
+        for name, (own, cumulative) in ranked[:options['top']]:
+            self.stdout.write(f'{name:<60}{own / 1000:>12.1f}{cumulative / 1000:>18.1f}')
+
+    @staticmethod
+    def parse(output):
+        """ Parse the "import time: self [us] | cumulative | imported package" lines. """
+        modules = {}
+        for line in output.splitlines():
+            if not line.startswith('import time:') or 'imported package' in line:
+                continue
+            own, cumulative, name = line[len('import time:'):].split('|')
+            modules[name.strip()] = (int(own), int(cumulative))
+        return modules
@@ -0,0 +1,100 @@
+import math
+import time
+
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from catalog.cache import home_counters
+from catalog.models import Author, Book
+from catalog.views import AuthorListView, BookListView
+from catalog.warmup import warm_worker
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill the caches after a deploy: home page counters, then the first list pages and the most popular '
+        'detail pages, rendered in parallel through the full middleware stack.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--list-pages', type=int, default=5, help='First pages of the book and author lists.')
+        parser.add_argument('--detail-pages', type=int, default=100, help='Most popular book and author pages.')
+        parser.add_argument('--threads', type=int, default=4, help='Pages rendered in parallel.')
+        parser.add_argument('--time-budget', type=float, default=60, help='Stop warming after these seconds.')
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        deadline = start + options['time_budget']
+
+        if 'LocMemCache' in settings.CACHES['default']['BACKEND']:
+            self.stderr.write(self.style.WARNING(
+                'The default cache is local to this process: the web workers will not see what is warmed here.'
+            ))
+        if not settings.CATALOG_PAGE_CACHE_TIMEOUT:
+            self.stderr.write(self.style.WARNING('The page cache is disabled (CATALOG_PAGE_CACHE_TIMEOUT).'))
+
+        warm_worker()
+        home_counters()
+        paths = self.paths(options['list_pages'], options['detail_pages'])
+
+        results = Counter()
+        # Warming is trusted traffic: it is not rate limited nor shed.
+        with override_settings(CATALOG_RATE_LIMITS={}, CATALOG_SHED_QUEUE_LATENCY_MS=0):
+            with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+                futures = [executor.submit(self.warm, path, deadline) for path in paths]
+                wait(futures)
+                for future in futures:
+                    results[future.result()] += 1
+
+        warmed = results['HIT'] + results['STALE'] + results['MISS']
+        hit_rate = (results['HIT'] / warmed * 100) if warmed else 0
+        self.stdout.write(
+            f"{len(paths)} pages in {time.monotonic() - start:.1f} s: {results['MISS']} rendered, "
+            f"{results['HIT']} already cached ({hit_rate:.0f}% hit rate), {results['STALE']} stale, "
+            f"{results['skipped']} skipped (time budget), {results['error']} errors, "
+            f"{results['uncached']} not cacheable."
+        )
+
+    @staticmethod
+    def paths(list_pages, detail_pages):
+        """ Paths to warm, the most valuable first. """
+        paths = []
+        for name, view, model in (('books', BookListView, Book), ('authors', AuthorListView, Author)):
+            pages = min(list_pages, math.ceil(model.objects.count() / view.paginate_by))
+            paths += [reverse(name)] + [f'{reverse(name)}?page={page}' for page in range(2, pages + 1)]
+
+        # The books with the most copies on loan are the most visited ones.
+        popular = (
+            Book.objects.annotate(loans=Count('bookinstance__borrower'))
+            .order_by('-loans', 'pk').values_list('pk', 'author_id')[:detail_pages]
+        )
+        authors = []
+        for book_id, author_id in popular:
+            paths.append(reverse('book-detail', args=[book_id]))
+            if author_id is not None and author_id not in authors:
+                authors.append(author_id)
+        paths += [reverse('author-detail', args=[author_id]) for author_id in authors]
+        return paths
+
+    @staticmethod
+    def warm(path, deadline):
+        """ Request a page anonymously and return its page cache state. """
+        if time.monotonic() > deadline:
+            return 'skipped'
+        host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+        try:
+            # A failing view gives a 500 (logged by django.request) rather than stopping the whole warm-up.
+            response = Client(raise_request_exception=False, SERVER_NAME=host).get(path)
+        finally:
+            connections.close_all()
+        if response.status_code != 200:
+            return 'error'
+        return response.get('X-Page-Cache', 'uncached')
@@ -0,0 +1,385 @@
+import hashlib
+import logging
+import mimetypes
+import os
+import random
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed, SuspiciousFileOperation
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+
+from . import profiling, slowqueries
+from .cache import page_version
+
+
+logger = logging.getLogger(__name__)
+
+
+class StaticFilesMiddleware:
+    """
+    Serve the collected static files (STATIC_ROOT) from the application itself, so production does not
+    depend on DEBUG and django.conf.urls.static.
+
+    Files with a content hash in their name (see catalog.storage) never change, so they are sent with
+    far-future immutable cache headers and browsers do not even revalidate them on repeat page loads.
+    Precompressed .gz variants are sent to clients accepting gzip.
+    """
+    hashed_name_re = re.compile(r'\.[0-9a-f]{12}\.[^/.]+$')
+    immutable_cache_control = 'public, max-age=31536000, immutable'
+    default_cache_control = 'public, max-age=60'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.static_url = '/' + settings.STATIC_URL.lstrip('/')
+        self.static_root = settings.STATIC_ROOT
+
+    def __call__(self, request):
+        if self.static_root and request.method in ('GET', 'HEAD') and request.path.startswith(self.static_url):
+            response = self.serve(request, request.path[len(self.static_url):])
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    def serve(self, request, name):
+        cache_control = (
+            self.immutable_cache_control if self.hashed_name_re.search(name) else self.default_cache_control
+        )
+        return serve_file(request, self.static_root, name, cache_control)
+
+
+def serve_file(request, root, name, cache_control):
+    """
+    Response for the file `name` under the directory `root`, or None if there is no such file.
+    Conditional requests get a 304, and a precompressed .gz variant is sent to clients accepting gzip.
+    """
+    try:
+        path = safe_join(root, name)
+    except SuspiciousFileOperation:
+        return None
+    if not os.path.isfile(path):
+        return None
+
+    content_type, _ = mimetypes.guess_type(path)
+    encoding = None
+    if 'gzip' in request.headers.get('Accept-Encoding', '') and os.path.isfile(f'{path}.gz'):
+        path, encoding = f'{path}.gz', 'gzip'
+
+    stat = os.stat(path)
+    last_modified = http_date(stat.st_mtime)
+    etag = f'"{int(stat.st_mtime)}-{stat.st_size}"'
+    if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    if request.headers.get('If-None-Match') == etag or (
+        if_modified_since is not None and int(stat.st_mtime) <= if_modified_since
+    ):
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(
+            open(path, 'rb'), filename=os.path.basename(name),
+            content_type=content_type or 'application/octet-stream',
+        )
+        response['Content-Length'] = stat.st_size
+        if encoding:
+            response['Content-Encoding'] = encoding
+
+    response['Last-Modified'] = last_modified
+    response['ETag'] = etag
+    response['Vary'] = 'Accept-Encoding'
+    response['Cache-Control'] = cache_control
+    return response
+
+
+class AnonymousPageCacheMiddleware:
+    """
+    Full-page cache for the GET requests of anonymous users on the views listed in
+    settings.CATALOG_PAGE_CACHE_VIEWS (they all see the same HTML).
+
+    Each path keeps its last rendered copy, with the versions of the data it shows (see catalog.cache.page_version).
+    A copy is fresh for CATALOG_PAGE_CACHE_TIMEOUT seconds, as long as those versions did not change (see
+    catalog.signals), and kept CATALOG_PAGE_CACHE_STALE seconds longer. Regeneration is single-flight: the first
+    worker finding a stale copy takes a lock and renders the page, while the other ones serve the stale copy (or,
+    if there is none yet, wait a little for the new one) instead of all hitting the database at once.
+    """
+    lock_timeout = 30
+    cold_wait_seconds = 2.0
+    cold_poll_interval = 0.05
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        return self.store(request, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timeout = settings.CATALOG_PAGE_CACHE_TIMEOUT
+        match = request.resolver_match
+        if (
+            not timeout
+            or request.method not in ('GET', 'HEAD')
+            or match.url_name not in settings.CATALOG_PAGE_CACHE_VIEWS
+            or request.user.is_authenticated
+        ):
+            return None
+
+        key = f'catalog:page:{hashlib.md5(request.get_full_path().encode()).hexdigest()}'
+        version = page_version(match.url_name, match.kwargs)
+        entry = cache.get(key)
+        if entry is not None and entry['version'] == version and entry['fresh_until'] > time.time():
+            return self.build_response(entry, 'HIT')
+
+        # Only one worker regenerates the page, the other ones serve the stale copy.
+        if cache.add(f'{key}:lock', 1, timeout=self.lock_timeout):
+            request._page_cache = (key, version)
+            return None
+        if entry is not None:
+            return self.build_response(entry, 'STALE')
+
+        # Cold cache: wait for the worker holding the lock, rather than rendering the page again.
+        deadline = time.monotonic() + self.cold_wait_seconds
+        while time.monotonic() < deadline:
+            time.sleep(self.cold_poll_interval)
+            entry = cache.get(key)
+            if entry is not None:
+                return self.build_response(entry, 'HIT')
+        return None
+
+    def store(self, request, response):
+        if not hasattr(request, '_page_cache'):
+            return response
+        key, version = request._page_cache
+
+        try:
+            if response.status_code == 200 and not response.streaming and not response.cookies:
+                if hasattr(response, 'render') and callable(response.render):
+                    response.render()
+                timeout = settings.CATALOG_PAGE_CACHE_TIMEOUT
+                entry = {
+                    'version': version,
+                    'fresh_until': time.time() + timeout,
+                    'content': response.content,
+                    'content_type': response['Content-Type'],
+                }
+                cache.set(key, entry, timeout=timeout + settings.CATALOG_PAGE_CACHE_STALE)
+            response['X-Page-Cache'] = 'MISS'
+        finally:
+            cache.delete(f'{key}:lock')
+        return response
+
+    @staticmethod
+    def build_response(entry, state):
+        response = HttpResponse(entry['content'], content_type=entry['content_type'])
+        response['X-Page-Cache'] = state
+        return response
+
+
+class RateLimitMiddleware:
+    """
+    Rate limits per client for the views listed in settings.CATALOG_RATE_LIMITS ({url name: (requests per second,
+    burst size)}): at most `burst` requests over a sliding window of burst / rate seconds. Anonymous clients are
+    limited by IP address (from X-Forwarded-For behind the CATALOG_TRUSTED_PROXIES proxies) and authenticated ones
+    by user, staff is never limited. The counters live in the shared cache and are only changed with cache.add and
+    cache.incr, so concurrent workers never lose each other's requests. There is a per-process fallback if the
+    cache is unavailable.
+
+    It also sheds load: when requests have waited more than CATALOG_SHED_QUEUE_LATENCY_MS in the server queue
+    (X-Request-Start header, set by the proxy), anonymous requests to CATALOG_SHED_VIEWS get a cheap 503 first,
+    then, above twice that latency, every rate-limited anonymous request does. Staff views are never shed.
+    """
+    retry_after = 5
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.local_counters = {}
+        self.local_lock = threading.Lock()
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        url_name = request.resolver_match.url_name
+        limit = settings.CATALOG_RATE_LIMITS.get(url_name)
+        threshold = settings.CATALOG_SHED_QUEUE_LATENCY_MS
+        if (limit is None and not threshold) or request.user.is_staff:
+            return None
+
+        if not request.user.is_authenticated:
+            latency = self.queue_latency(request)
+            if threshold and latency is not None and (
+                (latency > threshold and url_name in settings.CATALOG_SHED_VIEWS)
+                or (latency > 2 * threshold and limit is not None)
+            ):
+                return self.reject(503, 'Service busy, please retry later.')
+
+        if limit is None:
+            return None
+        if request.user.is_authenticated:
+            client = f'user:{request.user.pk}'
+        else:
+            client = f'ip:{self.client_ip(request)}'
+        if not self.consume(f'catalog:ratelimit:{url_name}:{client}', *limit):
+            return self.reject(429, 'Too many requests, please slow down.')
+        return None
+
+    @staticmethod
+    def client_ip(request):
+        """
+        Address of the client. Each of the settings.CATALOG_TRUSTED_PROXIES proxies in front of the site appends the
+        address it got the request from to X-Forwarded-For, so the client is the entry added by the farthest one;
+        the entries before it can be forged by the client.
+        """
+        proxies = settings.CATALOG_TRUSTED_PROXIES
+        forwarded = [address.strip() for address in request.headers.get('X-Forwarded-For', '').split(',')]
+        if proxies and len(forwarded) >= proxies and forwarded[-proxies]:
+            return forwarded[-proxies]
+        return request.META.get('REMOTE_ADDR', '')
+
+    @staticmethod
+    def queue_latency(request):
+        """
+        Milliseconds the request waited before reaching Django, from the X-Request-Start header
+        ("t=<seconds>" as set by nginx, or milliseconds / microseconds since the epoch).
+        """
+        header = request.headers.get('X-Request-Start', '').removeprefix('t=')
+        try:
+            start = float(header)
+        except ValueError:
+            return None
+        if start > 1e14:
+            start /= 1e6
+        elif start > 1e11:
+            start /= 1e3
+        return (time.time() - start) * 1000
+
+    def consume(self, key, rate, capacity):
+        """
+        Count a request of the client `key`. Returns False when it made more than `capacity` requests over the last
+        capacity / rate seconds: the count of the current window, plus the count of the previous one weighted by
+        its share of the sliding window.
+        """
+        window = capacity / rate
+        now = time.time()
+        index = int(now // window)
+        current, previous = f'{key}:{index}', f'{key}:{index - 1}'
+        weight = 1 - (now / window - index)
+        try:
+            cache.add(current, 0, timeout=int(2 * window) + 1)
+            count = cache.incr(current)
+            if cache.get(previous, 0) * weight + count <= capacity:
+                return True
+            # Rejected requests do not count.
+            cache.decr(current)
+            return False
+        except Exception:
+            logger.warning('Rate limit cache unavailable, using the per-process counters', exc_info=True)
+
+        with self.local_lock:
+            if len(self.local_counters) > 10000:
+                self.local_counters.clear()
+            count = self.local_counters.get(current, 0) + 1
+            allowed = self.local_counters.get(previous, 0) * weight + count <= capacity
+            if allowed:
+                self.local_counters[current] = count
+        return allowed
+
+    def reject(self, status, message):
+        response = HttpResponse(message, status=status, content_type='text/plain')
+        response['Retry-After'] = self.retry_after
+        return response
+
+
+class SessionBackendMiddleware:
+    """
+    Move the sessions opened with a backend of settings.CATALOG_LEGACY_AUTH_BACKENDS to the first backend of
+    settings.AUTHENTICATION_BACKENDS, so that they stay logged in without listing the old backend again (listing it
+    would check the password of every failed login twice). Must come before AuthenticationMiddleware.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.legacy = set(settings.CATALOG_LEGACY_AUTH_BACKENDS) - set(settings.AUTHENTICATION_BACKENDS)
+        if not self.legacy:
+            raise MiddlewareNotUsed
+        self.backend = settings.AUTHENTICATION_BACKENDS[0]
+
+    def __call__(self, request):
+        if settings.SESSION_COOKIE_NAME in request.COOKIES:
+            if request.session.get(BACKEND_SESSION_KEY) in self.legacy:
+                request.session[BACKEND_SESSION_KEY] = self.backend
+        return self.get_response(request)
+
+
+class ProfilingMiddleware:
+    """
+    Profile a sample of the requests, or the requests of staff users sending "X-Profile: 1", with the stack sampler
+    of catalog.profiling. Removed from the middleware chain entirely unless settings.CATALOG_PROFILING is on.
+    """
+    header = 'X-Profile'
+
+    def __init__(self, get_response):
+        if not settings.CATALOG_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = settings.CATALOG_PROFILE_SAMPLE_RATE
+
+    def __call__(self, request):
+        if not self.profiled(request):
+            return self.get_response(request)
+        sampler = profiling.StackSampler().start()
+        try:
+            response = self.get_response(request)
+        finally:
+            stacks = sampler.stop()
+        url_name = request.resolver_match.url_name if request.resolver_match else None
+        try:
+            name = profiling.write_capture(url_name, stacks, sampler.duration)
+        except OSError:
+            logger.exception('Could not write the profile of %s', request.path)
+        else:
+            response['X-Profile-Capture'] = name
+        return response
+
+    def profiled(self, request):
+        if self.sample_rate and random.random() < self.sample_rate:
+            return True
+        return request.headers.get(self.header) == '1' and request.user.is_staff
+
+
+class SlowQueryMiddleware:
+    """
+    Log the queries slower than settings.CATALOG_SLOW_QUERY_MS, with their plan (see catalog.slowqueries).
+    Removed from the middleware chain entirely when the threshold is 0.
+    """
+
+    def __init__(self, get_response):
+        if not settings.CATALOG_SLOW_QUERY_MS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = settings.CATALOG_SLOW_QUERY_MS
+
+    def __call__(self, request):
+        recorder = slowqueries.SlowQueryRecorder(self.threshold)
+        with recorder.installed():
+            response = self.get_response(request)
+        match = request.resolver_match
+        view = match.view_name if match else request.path
+        if response.streaming and not isinstance(response, FileResponse):
+            # The queries of a streaming response (e.g. the loan reports) run while its content is sent.
+            response.streaming_content = self.stream(recorder, response.streaming_content, view)
+        elif recorder.queries:
+            recorder.save(view)
+        return response
+
+    @staticmethod
+    def stream(recorder, content, view):
+        try:
+            with recorder.installed():
+                yield from content
+        finally:
+            if recorder.queries:
+                recorder.save(view)
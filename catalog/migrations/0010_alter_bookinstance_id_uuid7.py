@@ -0,0 +1,27 @@
+# Generated by Django 4.2.15 on 2026-10-19 08:02
+
+import catalog.utils
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    The default of a primary key only lives in Python, but SQLite would still rebuild the whole table for it:
+    only the migration state is changed. Existing copies keep their (v4) ids, so their URLs stay valid.
+    """
+
+    dependencies = [
+        ('catalog', '0009_similarbook'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='bookinstance',
+                    name='id',
+                    field=models.UUIDField(default=catalog.utils.uuid7, help_text='Unique ID for this particular book across the whole library.', primary_key=True, serialize=False),
+                ),
+            ],
+        ),
+    ]
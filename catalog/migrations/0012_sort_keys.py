@@ -0,0 +1,69 @@
+# Generated by Django 4.2.15 on 2026-10-19 08:09
+
+from django.db import migrations, models
+
+from catalog.utils import sort_key
+
+
+def fill_sort_keys(apps, schema_editor):
+    Author = apps.get_model('catalog', 'Author')
+    Book = apps.get_model('catalog', 'Book')
+    batch = []
+    for author in Author.objects.only('first_name', 'last_name').iterator(chunk_size=1000):
+        author.last_name_key = sort_key(author.last_name, max_length=100)
+        author.first_name_key = sort_key(author.first_name, max_length=100)
+        batch.append(author)
+        if len(batch) == 1000:
+            Author.objects.bulk_update(batch, ['last_name_key', 'first_name_key'])
+            batch = []
+    Author.objects.bulk_update(batch, ['last_name_key', 'first_name_key'])
+    batch = []
+    for book in Book.objects.only('title').iterator(chunk_size=1000):
+        book.title_key = sort_key(book.title, max_length=200)
+        batch.append(book)
+        if len(batch) == 1000:
+            Book.objects.bulk_update(batch, ['title_key'])
+            batch = []
+    Book.objects.bulk_update(batch, ['title_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0011_task'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='author',
+            options={'ordering': ['last_name_key', 'first_name_key']},
+        ),
+        migrations.AlterModelOptions(
+            name='book',
+            options={'ordering': ['title_key']},
+        ),
+        migrations.AddField(
+            model_name='author',
+            name='first_name_key',
+            field=models.CharField(default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='author',
+            name='last_name_key',
+            field=models.CharField(default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='title_key',
+            field=models.CharField(default='', editable=False, max_length=200),
+        ),
+        migrations.RunPython(fill_sort_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(fields=['last_name_key', 'first_name_key'], name='author_name_keys_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['title_key'], name='book_title_key_idx'),
+        ),
+    ]
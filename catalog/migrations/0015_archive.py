@@ -0,0 +1,45 @@
+# Generated by Django 4.2.15 on 2026-10-19 08:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('catalog', '0014_review_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedReview',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('publish_date', models.DateTimeField(blank=True, null=True)),
+                ('content', models.TextField(max_length=1000)),
+                ('grade', models.FloatField()),
+                ('archived', models.DateTimeField(auto_now_add=True)),
+                ('book', models.ForeignKey(null=True, on_delete=django.db.models.deletion.RESTRICT, related_name='archived_reviews', to='catalog.book')),
+            ],
+            options={
+                'ordering': ['archived'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedBookInstance',
+            fields=[
+                ('id', models.UUIDField(primary_key=True, serialize=False)),
+                ('imprint', models.CharField(max_length=200)),
+                ('due_back', models.DateField(blank=True, null=True)),
+                ('status', models.CharField(blank=True, choices=[('m', 'Maintenance'), ('o', 'On loan'), ('a', 'Available'), ('r', 'Reserved')], max_length=1)),
+                ('archived', models.DateTimeField(auto_now_add=True)),
+                ('book', models.ForeignKey(null=True, on_delete=django.db.models.deletion.RESTRICT, related_name='archived_copies', to='catalog.book')),
+                ('borrower', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['archived'],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.15 on 2026-10-19 08:38
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0017_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(help_text='Hash of the database and normalized SQL', max_length=40, unique=True)),
+                ('database', models.CharField(max_length=100)),
+                ('sql', models.TextField(help_text='Normalized SQL, without the parameters')),
+                ('view', models.CharField(blank=True, help_text='URL name of the last view that ran it', max_length=200)),
+                ('plan', models.TextField(blank=True, help_text='Last query plan')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total_time', models.FloatField(default=0, help_text='Milliseconds')),
+                ('max_time', models.FloatField(default=0, help_text='Milliseconds')),
+                ('first_seen', models.DateTimeField(auto_now_add=True)),
+                ('last_seen', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name_plural': 'slow queries',
+                'ordering': ['-total_time'],
+            },
+        ),
+    ]
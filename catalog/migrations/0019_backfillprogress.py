@@ -0,0 +1,32 @@
+# Generated by Django 4.2.15 on 2026-10-19 08:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0018_slowquery'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackfillProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('position', models.CharField(blank=True, help_text='Primary key of the last row processed', max_length=64)),
+                ('processed', models.PositiveBigIntegerField(default=0, help_text='Rows read')),
+                ('changed', models.PositiveBigIntegerField(default=0, help_text='Rows updated')),
+                ('batches', models.PositiveIntegerField(default=0)),
+                ('started', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('completed', models.DateTimeField(blank=True, help_text='When every row was processed', null=True)),
+                ('finalized', models.DateTimeField(blank=True, help_text='When the indexes were created', null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'backfill progress',
+                'ordering': ['name'],
+            },
+        ),
+    ]
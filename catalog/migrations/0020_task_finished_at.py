@@ -0,0 +1,26 @@
+# Generated by Django 4.2.15 on 2026-10-19 08:58
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_finished_at(apps, schema_editor):
+    # The closest known time for the tasks finished before: when their last attempt was due.
+    Task = apps.get_model('catalog', 'Task')
+    Task.objects.filter(status__in=['d', 'f']).update(finished_at=F('run_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0019_backfillprogress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, help_text='When the task succeeded or finally failed', null=True),
+        ),
+        migrations.RunPython(fill_finished_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations, models
+
+from catalog.backfills import RunBackfill
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0020_task_finished_at'),
+    ]
+
+    operations = [
+        # Created by the backfill once the copies are updated, instead of locking the table here.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='bookinstance',
+                    index=models.Index(condition=models.Q(('status', 'o')), fields=['due_back'],
+                                       name='bookinstance_loans_idx'),
+                ),
+            ],
+        ),
+        RunBackfill('bookinstance-status'),
+    ]
@@ -1,17 +1,37 @@
-import uuid
-
 from datetime import date 
 
 from django.conf import settings
 from django.urls import reverse
 
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import DEFAULT_DB_ALIAS, models, router, transaction
 from django.db.models import UniqueConstraint, CheckConstraint, Q, F
 from django.db.models.functions import Lower
+from django.utils import timezone
+
+from .utils import sort_key, uuid7
+
+
+class OutboxModel(models.Model):
+    """
+    Model whose changes are written to the outbox (see catalog.outbox). Saves and deletes run in a transaction of
+    the default database, so the ChangeEvent written by their signal handler commits or rolls back with the change.
+    (Copies of a partitioned branch are written to another database, committed just before the event.)
+    """
+    class Meta:
+        abstract = True
 
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=DEFAULT_DB_ALIAS), transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
 
-class Genre(models.Model):
+    def delete(self, using=None, keep_parents=False):
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            return super().delete(using, keep_parents)
+
+
+class Genre(OutboxModel):
     """ Genres model """
     name = models.CharField(
         max_length=200,
@@ -41,7 +61,7 @@ class Genre(models.Model):
         ]
         
 
-class Language(models.Model):
+class Language(OutboxModel):
     name = models.CharField(max_length=50, unique=True)
     
     def __str__(self):
@@ -57,7 +77,7 @@ class Language(models.Model):
         ]
 
 
-class Book(models.Model):
+class Book(OutboxModel):
     """ Book model. It is like the template of the book, not a physical copy or instance. """
     
     """
@@ -74,6 +94,14 @@ class Book(models.Model):
                             help_text='13 character <a href="https://www.isbn-international.org/content/what-isbn">ISBN number</a>')
     genre = models.ManyToManyField(Genre, help_text='Select a genre for this book')
     language = models.ManyToManyField(Language, help_text='Select a language for this book')
+    # Case- and accent-folded title, maintained on save, used to sort books alphabetically.
+    title_key = models.CharField(max_length=200, editable=False, default='')
+    
+    class Meta:
+        ordering = ['title_key']
+        indexes = [
+            models.Index(fields=['title_key'], name='book_title_key_idx')
+        ]
     
     def __str__(self) -> str:
         """ String for representing the Model object. """
@@ -83,6 +111,13 @@ class Book(models.Model):
         """Returns the URL to access a detail record for this book."""
         return reverse('book-detail', args=[str(self.id)])
     
+    def save(self, *args, **kwargs):
+        self.title_key = sort_key(self.title, max_length=200)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'title' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'title_key'}
+        super().save(*args, **kwargs)
+    
     def display_genre(self):
         """
         Create a string for the Genre. This is required to display genre in Admin.
@@ -92,14 +127,42 @@ class Book(models.Model):
     display_genre.short_description = 'Genre'
     
     
-class BookInstance(models.Model):
+class Branch(models.Model):
+    """ A library branch, holding its own copies of the books. """
+    name = models.CharField(max_length=100, unique=True)
+    code = models.SlugField(max_length=20, unique=True, help_text="Short identifier, e.g. used in URLs (?branch=north)")
+    
+    class Meta:
+        ordering = ['name']
+        verbose_name_plural = 'branches'
+        
+    def __str__(self):
+        return self.name
+
+
+class BookInstanceQuerySet(models.QuerySet):
+    def create(self, **kwargs):
+        # Unlike QuerySet.create(), let the router pick the database from the new copy itself
+        # (its branch, see catalog.routers), unless one was chosen with using().
+        if self._db is not None:
+            return super().create(**kwargs)
+        book_instance = self.model(**kwargs)
+        book_instance.save(force_insert=True)
+        return book_instance
+
+
+class BookInstance(OutboxModel):
     """Model representing a specific copy of a book."""
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, 
+    # Time-ordered (v7) UUIDs keep inserts at the end of the primary key index. Copies created before use v4 ones.
+    id = models.UUIDField(primary_key=True, default=uuid7, 
                           help_text="Unique ID for this particular book across the whole library.")
     book = models.ForeignKey(Book, on_delete=models.RESTRICT, null=True)
     imprint = models.CharField(max_length=200, help_text='Specific release of the book')
     due_back = models.DateField(null=True, blank=True)
     borrower = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    branch = models.ForeignKey(Branch, on_delete=models.RESTRICT, null=True, blank=True)
+    
+    objects = BookInstanceQuerySet.as_manager()
     
     LOAN_STATUS = (
         ('m', 'Maintenance'),
@@ -118,26 +181,50 @@ class BookInstance(models.Model):
     
     class Meta:
         ordering = ['due_back']
+        indexes = [
+            # "Has an available copy" checks (see catalog.facets).
+            models.Index(fields=['book', 'status'], name='bookinstance_book_status_idx'),
+            # Loan lists and counters of a branch.
+            models.Index(fields=['branch', 'status', 'due_back'], name='bookinstance_branch_idx'),
+            # Loans of every branch by due date: the loan and overdue reports, the loans of a user.
+            # Created by a backfill, after the copies are updated (see catalog.backfills.BookInstanceStatus).
+            models.Index(fields=['due_back'], condition=Q(status='o'), name='bookinstance_loans_idx'),
+        ]
         permissions = (("can_mark_returned", "Set book as returned"), )
         
     def __str__(self):
         return f'{self.id} ({self.book.title})'
     
+    def save(self, *args, **kwargs):
+        # Without a status, a copy would not be listed anywhere: it stays in maintenance until one is set.
+        if not self.status:
+            self.status = 'm'
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'status'}
+        super().save(*args, **kwargs)
+    
     @property
     def is_overdue(self):
         """ Determines if the book is overdue based on the due date and current date. """
         return bool(self.due_back and date.today() > self.due_back)
     
     
-class Author(models.Model):
+class Author(OutboxModel):
     """ Model representing an author. """
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
     date_of_birth = models.DateField(null=True, blank=True)
     date_of_death = models.DateField('died', null=True, blank=True)
+    # Case- and accent-folded names, maintained on save, used to sort authors alphabetically.
+    last_name_key = models.CharField(max_length=100, editable=False, default='')
+    first_name_key = models.CharField(max_length=100, editable=False, default='')
     
     class Meta:
-        ordering = ['last_name', 'first_name']
+        ordering = ['last_name_key', 'first_name_key']
+        indexes = [
+            models.Index(fields=['last_name_key', 'first_name_key'], name='author_name_keys_idx')
+        ]
         constraints = [
             CheckConstraint(
                 check=Q(date_of_birth__lt=F('date_of_death')),
@@ -148,11 +235,19 @@ class Author(models.Model):
     def get_absolute_url(self):
         return reverse('author-detail', args=[str(self.id)])
     
+    def save(self, *args, **kwargs):
+        self.last_name_key = sort_key(self.last_name, max_length=100)
+        self.first_name_key = sort_key(self.first_name, max_length=100)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'last_name', 'first_name'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'last_name_key', 'first_name_key'}
+        super().save(*args, **kwargs)
+    
     def __str__(self):
         return f"{self.last_name}, {self.first_name}"
     
     
-class Review(models.Model):
+class Review(OutboxModel):
     """ Model representing a book review. """
     book = models.ForeignKey(Book, on_delete=models.RESTRICT, null=True)
     publish_date = models.DateTimeField("Publish Date", null=True, blank=True)
@@ -162,6 +257,13 @@ class Review(models.Model):
     # TODO: add user field
     
     class Meta:
+        ordering = ['-publish_date', '-id']
+        indexes = [
+            # Reviews of a book, newest first, paginated by (publish_date, id) keys (see catalog.reviews).
+            models.Index(fields=['book', '-publish_date', '-id'], name='review_book_date_idx'),
+            # Latest reviews of the whole catalog.
+            models.Index(fields=['-publish_date', '-id'], name='review_date_idx'),
+        ]
         constraints = [
             CheckConstraint(
                 check=Q(grade__gte=0.0) & Q(grade__lte=10.0),
@@ -169,5 +271,205 @@ class Review(models.Model):
             )
         ]
         
-    # TODO: Add __str__ method
-    
\ No newline at end of file
+    def __str__(self):
+        return f'{self.book.title if self.book_id else "No book"} ({self.grade:g}/10)'
+
+
+class BookRecommendation(models.Model):
+    """ Model representing a precomputed "readers also borrowed" neighbour of a book. """
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField(help_text="Position of the neighbour (0 is the closest one)")
+    score = models.FloatField(help_text="Normalized co-occurrence score between both books")
+
+    class Meta:
+        ordering = ['book', 'rank']
+        constraints = [
+            # Also works as the (book, rank) index used by the book detail page.
+            UniqueConstraint(fields=['book', 'rank'], name='bookrecommendation_book_rank_unique')
+        ]
+
+    def __str__(self):
+        return f'{self.book_id} -> {self.recommended_id} ({self.score:.3f})'
+
+
+class SimilarBook(models.Model):
+    """ Model representing a precomputed content-based neighbour of a book (see catalog.similarity). """
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='similar_books')
+    similar = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField(help_text="Position of the neighbour (0 is the closest one)")
+    score = models.FloatField(help_text="Cosine similarity between the TF-IDF vectors of both books")
+
+    class Meta:
+        ordering = ['book', 'rank']
+        constraints = [
+            UniqueConstraint(fields=['book', 'rank'], name='similarbook_book_rank_unique')
+        ]
+
+    def __str__(self):
+        return f'{self.book_id} ~ {self.similar_id} ({self.score:.3f})'
+
+
+class Task(models.Model):
+    """ Model representing a unit of background work, run by the run_tasks worker (see catalog.taskqueue). """
+    name = models.CharField(max_length=200, help_text="Import path of the task function")
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    
+    TASK_STATUS = (
+        ('q', 'Queued'),
+        ('r', 'Running'),
+        ('d', 'Done'),
+        ('f', 'Failed'),
+    )
+    
+    status = models.CharField(max_length=1, choices=TASK_STATUS, default='q')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now, help_text="The task does not run before this time")
+    locked_until = models.DateTimeField(null=True, blank=True, help_text="Running tasks are retried after this time")
+    created = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True, help_text="When the task succeeded or finally failed")
+    last_error = models.TextField(blank=True)
+    
+    class Meta:
+        ordering = ['run_at']
+        indexes = [
+            # The worker polls for the next due task.
+            models.Index(fields=['status', 'run_at'], name='task_status_run_at_idx')
+        ]
+        
+    def __str__(self):
+        return f'{self.name} ({self.get_status_display()})'
+
+
+class ArchiveQuerySet(models.QuerySet):
+    """ Archived rows are only reached explicitly, through this manager (see catalog.archive). """
+
+    def restore(self):
+        """ Move the rows back to their live table. Returns the number of restored rows. """
+        from .archive import restore
+        return restore(self)
+
+
+class ArchivedBookInstance(models.Model):
+    """ A retired copy moved out of BookInstance, so the live table only holds the copies in use. """
+    id = models.UUIDField(primary_key=True)
+    # Archived copies still belong to their book: it cannot be deleted while they exist.
+    book = models.ForeignKey(Book, on_delete=models.RESTRICT, null=True, related_name='archived_copies')
+    imprint = models.CharField(max_length=200)
+    due_back = models.DateField(null=True, blank=True)
+    borrower = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    status = models.CharField(max_length=1, choices=BookInstance.LOAN_STATUS, blank=True)
+    branch = models.ForeignKey(Branch, on_delete=models.RESTRICT, null=True, blank=True, related_name='+')
+    archived = models.DateTimeField(auto_now_add=True)
+    
+    objects = ArchiveQuerySet.as_manager()
+    
+    class Meta:
+        ordering = ['archived']
+        
+    def __str__(self):
+        return f'{self.id} (archived)'
+
+
+class ArchivedReview(models.Model):
+    """ An old review moved out of Review. """
+    id = models.IntegerField(primary_key=True)
+    book = models.ForeignKey(Book, on_delete=models.RESTRICT, null=True, related_name='archived_reviews')
+    publish_date = models.DateTimeField(null=True, blank=True)
+    content = models.TextField(max_length=1000)
+    grade = models.FloatField()
+    archived = models.DateTimeField(auto_now_add=True)
+    
+    objects = ArchiveQuerySet.as_manager()
+    
+    class Meta:
+        ordering = ['archived']
+        
+    def __str__(self):
+        return f'Review {self.id} (archived)'
+
+
+class ChangeEvent(models.Model):
+    """
+    Outbox row recording that a catalog object changed (see catalog.outbox).
+    Its id orders the changes and is the token of the /catalog/changes feed.
+    """
+    model = models.CharField(max_length=20, help_text="Model name, e.g. 'book'")
+    object_id = models.CharField(max_length=36)
+    
+    CHANGE_ACTIONS = (
+        ('s', 'Saved'),
+        ('d', 'Deleted'),
+    )
+    
+    action = models.CharField(max_length=1, choices=CHANGE_ACTIONS)
+    created = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            # Old events are purged by age.
+            models.Index(fields=['created'], name='changeevent_created_idx')
+        ]
+        
+    def __str__(self):
+        return f'{self.model} {self.object_id} {self.get_action_display().lower()}'
+
+
+class OutboxCursor(models.Model):
+    """ Position of an outbox consumer: the id of the last ChangeEvent it processed. """
+    name = models.CharField(max_length=100, unique=True)
+    position = models.BigIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f'{self.name} at {self.position}'
+
+
+class SlowQuery(models.Model):
+    """ A query that ran slower than settings.CATALOG_SLOW_QUERY_MS, one row per fingerprint (see catalog.slowqueries). """
+    fingerprint = models.CharField(max_length=40, unique=True, help_text="Hash of the database and normalized SQL")
+    database = models.CharField(max_length=100)
+    sql = models.TextField(help_text="Normalized SQL, without the parameters")
+    view = models.CharField(max_length=200, blank=True, help_text="URL name of the last view that ran it")
+    plan = models.TextField(blank=True, help_text="Last query plan")
+    count = models.PositiveIntegerField(default=0)
+    total_time = models.FloatField(default=0, help_text="Milliseconds")
+    max_time = models.FloatField(default=0, help_text="Milliseconds")
+    first_seen = models.DateTimeField(auto_now_add=True)
+    last_seen = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['-total_time']
+        verbose_name_plural = 'slow queries'
+        
+    def __str__(self):
+        return f'{self.sql[:80]} ({self.count}x)'
+    
+    @property
+    def mean_time(self):
+        return self.total_time / self.count if self.count else 0
+
+
+class BackfillProgress(models.Model):
+    """ Checkpoint of a resumable backfill (see catalog.backfills): the primary key of the last row processed. """
+    name = models.CharField(max_length=100, unique=True)
+    position = models.CharField(max_length=64, blank=True, help_text="Primary key of the last row processed")
+    processed = models.PositiveBigIntegerField(default=0, help_text="Rows read")
+    changed = models.PositiveBigIntegerField(default=0, help_text="Rows updated")
+    batches = models.PositiveIntegerField(default=0)
+    started = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+    completed = models.DateTimeField(null=True, blank=True, help_text="When every row was processed")
+    finalized = models.DateTimeField(null=True, blank=True, help_text="When the indexes were created")
+    
+    class Meta:
+        ordering = ['name']
+        verbose_name_plural = 'backfill progress'
+        
+    def __str__(self):
+        return f'{self.name} at {self.position or "start"}'
@@ -0,0 +1,239 @@
+"""
+Outbox of the catalog changes, for the caches, search indexes and kiosks that follow the catalog.
+
+Saving or deleting an object of the FEEDS models, or changing the genres or languages of a book, writes a
+ChangeEvent row (see catalog.signals). These models save and delete in a transaction (models.OutboxModel), as do
+the m2m and bulk helpers, so the change and its event are committed or rolled back together.
+Events only name the changed object. Readers load its current state, so they do work proportional to the number of
+changed objects, never to the size of the catalog.
+
+Changes can be followed in two ways:
+- consumers: functions registered with @consumer (in a consumers.py module of an installed app) and run by
+  python manage.py process_outbox. They get the new events in batches, and each one has a cursor (OutboxCursor)
+  that moves in the same transaction as its work.
+- the /catalog/changes?since=<token> JSON feed (changes_since).
+
+Events are purged after settings.CATALOG_OUTBOX_RETENTION days, once every consumer has processed them. A feed
+reader further behind than that gets a 410 and has to resync from scratch.
+"""
+import datetime
+import logging
+import time
+
+from itertools import chain
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from .models import Author, Book, BookInstance, ChangeEvent, Genre, Language, OutboxCursor, Review
+
+
+logger = logging.getLogger(__name__)
+
+# Model name -> (model, fields left out of the feed: derived sort keys, personal data).
+FEEDS = {
+    'author': (Author, ('last_name_key', 'first_name_key')),
+    'book': (Book, ('title_key',)),
+    'bookinstance': (BookInstance, ('borrower',)),
+    'genre': (Genre, ()),
+    'language': (Language, ()),
+    'review': (Review, ()),
+}
+
+BATCH_SIZE = 500
+CHANGES_PER_PAGE = 500
+# Backoff of a failing consumer, in seconds.
+RETRY_BASE_DELAY = 5
+RETRY_MAX_DELAY = 600
+
+# The position up to which events have been purged is kept as a cursor too.
+PURGED_CURSOR = '-purged'
+
+registry = {}
+# Consumer name -> (failures in a row, time.monotonic() before which it is not run again).
+backoff = {}
+
+
+def record_change(instance, deleted=False):
+    """ Write the outbox event of a saved or deleted object. """
+    record_changes(type(instance), [instance.pk], deleted)
+
+
+def record_changes(model, pks, deleted=False):
+    """ Write the outbox events of objects saved or deleted in bulk (bulk_create() and update() send no signals). """
+    name = model._meta.model_name
+    if name not in FEEDS or not pks:
+        return
+    action = 'd' if deleted else 's'
+    ChangeEvent.objects.using(DEFAULT_DB_ALIAS).bulk_create(
+        [ChangeEvent(model=name, object_id=str(pk), action=action) for pk in pks]
+    )
+
+
+def consumer(func=None, *, name=None, batch_size=BATCH_SIZE):
+    """
+    Register a function as an outbox consumer. It is called with lists of new ChangeEvents, in order, inside the
+    transaction that moves its cursor: if it fails, the same events are given to it again on the next run.
+    """
+    def decorator(func):
+        func.consumer_name = name or f'{func.__module__}.{func.__qualname__}'
+        func.batch_size = batch_size
+        registry[func.consumer_name] = func
+        return func
+
+    return decorator(func) if func is not None else decorator
+
+
+def process(name):
+    """ Give the pending events to a consumer, batch by batch. Returns the number of processed events. """
+    func = registry[name]
+    processed = 0
+    while True:
+        with transaction.atomic():
+            cursor, _ = OutboxCursor.objects.select_for_update().get_or_create(name=name)
+            events = list(ChangeEvent.objects.filter(id__gt=cursor.position).order_by('id')[:func.batch_size])
+            if not events:
+                return processed
+            func(events)
+            cursor.position = events[-1].pk
+            cursor.save(update_fields=['position', 'updated'])
+        processed += len(events)
+
+
+def retry_delay(failures):
+    """ Seconds a consumer is left out after `failures` failures in a row: exponential backoff. """
+    return min(RETRY_BASE_DELAY * 2 ** (failures - 1), RETRY_MAX_DELAY)
+
+
+def process_outbox(names=None):
+    """
+    Run the consumers (all of them by default). A failing consumer does not stop the others: its error is logged and
+    it is left out of the next runs for retry_delay() seconds. Returns ({consumer name: number of processed events},
+    {consumer name: exception} for the consumers that failed).
+    """
+    autodiscover_modules('consumers')
+    unknown = set(names or ()) - registry.keys()
+    if unknown:
+        raise ValueError(f"Unknown outbox consumer(s): {', '.join(sorted(unknown))}")
+    counts, failures = {}, {}
+    for name in names or sorted(registry):
+        failed, retry_at = backoff.get(name, (0, 0))
+        if time.monotonic() < retry_at:
+            continue
+        try:
+            counts[name] = process(name)
+        except Exception as error:
+            failed += 1
+            backoff[name] = failed, time.monotonic() + retry_delay(failed)
+            failures[name] = error
+            logger.exception('Outbox consumer %s failed (%s time(s) in a row)', name, failed)
+        else:
+            backoff.pop(name, None)
+    return counts, failures
+
+
+def purge_events(older_than=None):
+    """
+    Delete the events older than `older_than` (settings.CATALOG_OUTBOX_RETENTION days by default) that every
+    registered consumer has processed. Returns the number of deleted events.
+    """
+    if older_than is None:
+        older_than = datetime.timedelta(days=settings.CATALOG_OUTBOX_RETENTION)
+    events = ChangeEvent.objects.filter(created__lt=timezone.now() - older_than)
+    slowest = OutboxCursor.objects.filter(name__in=list(registry)).aggregate(position=Min('position'))['position']
+    if slowest is not None:
+        events = events.filter(id__lte=slowest)
+    elif registry:
+        # No registered consumer has run yet.
+        return 0
+    last = events.aggregate(last=Max('id'))['last']
+    if last is None:
+        return 0
+    with transaction.atomic():
+        deleted, _ = ChangeEvent.objects.filter(id__lte=last).delete()
+        OutboxCursor.objects.update_or_create(name=PURGED_CURSOR, defaults={'position': last})
+    return deleted
+
+
+def parse_token(token):
+    """ Event id of a feed token, or None if it is not valid. """
+    try:
+        position = int(token)
+    except (TypeError, ValueError):
+        return None
+    return position if position >= 0 else None
+
+
+def latest_token():
+    return str(ChangeEvent.objects.aggregate(last=Max('id'))['last'] or 0)
+
+
+def expired(position):
+    """ Whether events after `position` have already been purged. """
+    purged = OutboxCursor.objects.filter(name=PURGED_CURSOR).values_list('position', flat=True).first()
+    return purged is not None and position < purged
+
+
+def load_objects(model, object_ids):
+    """ {object id (str): object} of the objects still existing, with their many-to-many relations. """
+    if model is BookInstance:
+        # Copies can be kept in branch databases (see catalog.branches).
+        from .branches import fan_out
+        found = chain.from_iterable(
+            fan_out(lambda alias: list(BookInstance.objects.using(alias).filter(pk__in=object_ids)))
+        )
+    else:
+        found = model.objects.filter(pk__in=object_ids).prefetch_related(
+            *(field.name for field in model._meta.many_to_many)
+        )
+    return {str(instance.pk): instance for instance in found}
+
+
+def serialize(instance, excluded=()):
+    data = {
+        field.name: field.value_from_object(instance)
+        for field in instance._meta.concrete_fields if field.name not in excluded
+    }
+    for field in instance._meta.many_to_many:
+        data[field.name] = sorted(related.pk for related in getattr(instance, field.name).all())
+    return data
+
+
+def current_objects(events):
+    """
+    Collapse events to one per changed object, in the order of their last change, with the current state of the
+    object: [(event, object or None if it no longer exists), ...]. One query per model.
+    """
+    last_events = {}
+    for event in events:
+        last_events.pop((event.model, event.object_id), None)
+        last_events[(event.model, event.object_id)] = event
+    objects = {}
+    for name in {model for model, _ in last_events}:
+        object_ids = [object_id for model, object_id in last_events if model == name]
+        objects[name] = load_objects(FEEDS[name][0], object_ids)
+    return [(event, objects[event.model].get(event.object_id)) for event in last_events.values()]
+
+
+def changes_since(position, limit=CHANGES_PER_PAGE):
+    """
+    The objects changed after the event `position`, as JSON-serializable deltas:
+    {'changes': [{'model': ..., 'id': ..., 'deleted': ..., 'data': {...}}, ...], 'next': token, 'more': bool}.
+    """
+    events = list(ChangeEvent.objects.filter(id__gt=position).order_by('id')[:limit + 1])
+    more = len(events) > limit
+    events = events[:limit]
+    changes = []
+    for event, instance in current_objects(events):
+        change = {'model': event.model, 'id': event.object_id, 'deleted': instance is None}
+        if instance is not None:
+            change['data'] = serialize(instance, FEEDS[event.model][1])
+        changes.append(change)
+    return {
+        'changes': changes,
+        'next': str(events[-1].pk if events else position),
+        'more': more,
+    }
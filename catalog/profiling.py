@@ -0,0 +1,119 @@
+"""
+On-demand sampling profiler for production requests (catalog.middleware.ProfilingMiddleware).
+
+With settings.CATALOG_PROFILING on, a share of the requests (CATALOG_PROFILE_SAMPLE_RATE) is profiled, as well as
+any request of a staff user sending the "X-Profile: 1" header. While such a request runs, a sampler thread records
+the stack of the request thread every SAMPLE_INTERVAL seconds. Unlike cProfile, this does not slow down every
+function call, so the profile looks like the real request.
+
+Each capture is written to CATALOG_PROFILE_ROOT/<url name>/ in the "collapsed stacks" format
+("frame;frame;frame count" lines) read by flamegraph.pl, speedscope or inferno. The newest CATALOG_PROFILE_KEEP
+captures are kept per URL name. The staff page /catalog/staff/profiles lists them and merges the captures of a URL
+name into one profile.
+"""
+import os
+import re
+import sys
+import threading
+import time
+
+from collections import Counter
+
+from django.conf import settings
+from django.utils import timezone
+
+
+SAMPLE_INTERVAL = 0.002
+
+CAPTURE_SUFFIX = '.folded'
+UNSAFE_NAME_RE = re.compile(r'[^\w-]')
+
+
+class StackSampler:
+    """ Collapsed stacks of one thread, sampled by a background thread until stop(). """
+
+    def __init__(self, thread_id=None, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='catalog-profiler', daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.duration = time.perf_counter() - self.started
+        return self.stacks
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+            # Do not keep the frames of the profiled thread alive.
+            frame = None
+
+
+def collapse(frame):
+    """ "module:function;..." from the outermost frame to `frame`. """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{frame.f_globals.get('__name__', '?')}:{getattr(code, 'co_qualname', code.co_name)}")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def capture_directory(url_name):
+    return os.path.join(settings.CATALOG_PROFILE_ROOT, UNSAFE_NAME_RE.sub('_', url_name or 'unnamed'))
+
+
+def write_capture(url_name, stacks, duration):
+    """ Save the stacks of a profiled request, dropping the oldest captures of its URL name. Returns the file name. """
+    directory = capture_directory(url_name)
+    os.makedirs(directory, exist_ok=True)
+    name = f"{timezone.now().strftime('%Y%m%d-%H%M%S-%f')}-{int(duration * 1000)}ms{CAPTURE_SUFFIX}"
+    with open(os.path.join(directory, f'{name}.tmp'), 'w') as file:
+        file.writelines(f'{stack} {count}\n' for stack, count in sorted(stacks.items()))
+    os.replace(os.path.join(directory, f'{name}.tmp'), os.path.join(directory, name))
+    for old in capture_names(directory)[:-settings.CATALOG_PROFILE_KEEP]:
+        os.remove(os.path.join(directory, old))
+    return name
+
+
+def capture_names(directory):
+    """ Capture files of a directory, oldest first (their names start with their date). """
+    try:
+        return sorted(name for name in os.listdir(directory) if name.endswith(CAPTURE_SUFFIX))
+    except FileNotFoundError:
+        return []
+
+
+def list_captures():
+    """ [(url name, [capture file names, newest first]), ...] for every profiled URL name. """
+    root = settings.CATALOG_PROFILE_ROOT
+    try:
+        url_names = sorted(name for name in os.listdir(root) if os.path.isdir(os.path.join(root, name)))
+    except FileNotFoundError:
+        return []
+    return [(url_name, capture_names(os.path.join(root, url_name))[::-1]) for url_name in url_names]
+
+
+def read_captures(url_name, names=None):
+    """ Collapsed stacks of the captures of a URL name (all of them by default), summed. Unknown names are ignored. """
+    directory = capture_directory(url_name)
+    available = capture_names(directory)
+    stacks = Counter()
+    for name in (names if names is not None else available):
+        if name not in available:
+            continue
+        with open(os.path.join(directory, name)) as file:
+            for line in file:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                stacks[stack] += int(count)
+    return stacks
@@ -0,0 +1,161 @@
+"""
+"Readers also borrowed" recommendation engine.
+
+Two books co-occur when the same user has borrowed a copy of both. The book-by-book co-occurrence matrix
+is built offline from BookInstance.borrower in chunks of borrow events, so memory only depends on the
+chunk size and on the number of distinct book pairs (the sparse matrix itself, plus a buffer of the pairs of the last
+chunks), never on the number of events.
+
+Only the top-K neighbours of each book are kept and stored in the BookRecommendation table, which the
+book detail page reads with a single indexed query. Run it with: python manage.py build_recommendations
+"""
+import numpy as np
+
+from django.db import transaction
+from django.db.models import Max
+
+from .cache import invalidate_pages
+from .models import Book, BookInstance, BookRecommendation
+
+
+DEFAULT_TOP_K = 10
+DEFAULT_CHUNK_SIZE = 50_000
+# Distinct pairs of the last chunks kept aside before they are merged into the matrix.
+DEFAULT_BUFFER_SIZE = 1_000_000
+
+
+def iter_borrow_chunks(chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield (borrower_id, book_id) int64 arrays of shape (n, 2), ordered by borrower.
+    A borrower is never split across two chunks, so every chunk can be paired on its own.
+    """
+    queryset = (
+        BookInstance.objects.filter(borrower__isnull=False, book__isnull=False)
+        .order_by('borrower_id')
+        .values_list('borrower_id', 'book_id')
+    )
+    last_borrower = None
+
+    while True:
+        chunk = queryset if last_borrower is None else queryset.filter(borrower_id__gt=last_borrower)
+        rows = np.array(list(chunk[:chunk_size]), dtype=np.int64).reshape(-1, 2)
+        if not len(rows):
+            return
+
+        if len(rows) == chunk_size:
+            # The last borrower may have more rows in the next chunk: leave it for the next round.
+            tail = int(rows[-1, 0])
+            complete = rows[:, 0] != tail
+            if complete.any():
+                rows = rows[complete]
+            else:
+                # A single borrower larger than the chunk: take all of its rows at once.
+                rows = np.array(list(queryset.filter(borrower_id=tail)), dtype=np.int64).reshape(-1, 2)
+
+        last_borrower = int(rows[-1, 0])
+        yield rows
+
+
+def group_ranks(keys):
+    """ Return the position of every element inside its run of equal values in the sorted array `keys`. """
+    if not len(keys):
+        return np.empty(0, dtype=np.int64)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    sizes = np.diff(np.r_[starts, len(keys)])
+    return np.arange(len(keys)) - np.repeat(starts, sizes)
+
+
+def chunk_pairs(rows, width):
+    """
+    Return the co-occurrence pairs of a chunk encoded as `book_a * width + book_b`, in both directions.
+    `rows` must be ordered by borrower and free of duplicated (borrower, book) rows.
+    """
+    borrowers, books = rows[:, 0], rows[:, 1]
+    # Group boundaries: every row knows where its borrower group starts and how long it is.
+    starts = np.flatnonzero(np.r_[True, borrowers[1:] != borrowers[:-1]])
+    sizes = np.diff(np.r_[starts, len(rows)])
+    row_start = np.repeat(starts, sizes)
+    row_size = np.repeat(sizes, sizes)
+
+    # Pair every row with every row of its own group (a vectorized self-join).
+    left = np.repeat(np.arange(len(rows)), row_size)
+    offsets = np.arange(len(left)) - np.repeat(np.cumsum(row_size) - row_size, row_size)
+    right = np.repeat(row_start, row_size) + offsets
+    keep = left != right
+
+    return books[left[keep]] * width + books[right[keep]]
+
+
+def merge_pairs(keys, counts, buffered_keys, buffered_counts):
+    """ Add the buffered (keys, counts) arrays to the sorted, unique `keys` and return the merged arrays. """
+    merged, inverse = np.unique(np.concatenate([keys, *buffered_keys]), return_inverse=True)
+    counts = np.bincount(inverse, weights=np.concatenate([counts, *buffered_counts]), minlength=len(merged))
+    return merged, counts.astype(np.int64)
+
+
+def build_cooccurrence(chunk_size=DEFAULT_CHUNK_SIZE, buffer_size=DEFAULT_BUFFER_SIZE):
+    """
+    Build the sparse co-occurrence matrix from every borrow event.
+    Returns (pair_keys, pair_counts, popularity, width), where popularity[book_id] is the number of borrowers
+    of that book and pair keys are encoded as in chunk_pairs().
+    """
+    width = (Book.objects.aggregate(max_id=Max('id'))['max_id'] or 0) + 1
+    popularity = np.zeros(width, dtype=np.int64)
+    keys = np.empty(0, dtype=np.int64)
+    counts = np.empty(0, dtype=np.int64)
+    # Pairs of the last chunks, merged into (keys, counts) once they hold more than buffer_size entries, rather
+    # than re-sorting every pair seen so far on each chunk.
+    buffered_keys, buffered_counts, buffered = [], [], 0
+
+    for rows in iter_borrow_chunks(chunk_size):
+        # Several copies of the same book borrowed by one user count once.
+        rows = np.unique(rows, axis=0)
+        np.add.at(popularity, rows[:, 1], 1)
+
+        chunk_keys, chunk_counts = np.unique(chunk_pairs(rows, width), return_counts=True)
+        buffered_keys.append(chunk_keys)
+        buffered_counts.append(chunk_counts)
+        buffered += len(chunk_keys)
+        if buffered > buffer_size:
+            keys, counts = merge_pairs(keys, counts, buffered_keys, buffered_counts)
+            buffered_keys, buffered_counts, buffered = [], [], 0
+
+    keys, counts = merge_pairs(keys, counts, buffered_keys, buffered_counts)
+    return keys, counts, popularity, width
+
+
+def top_k_neighbours(keys, counts, popularity, width, top_k=DEFAULT_TOP_K):
+    """
+    Score every pair with the cosine similarity of both borrower sets and keep the best `top_k` per book.
+    Returns (book_ids, neighbour_ids, ranks, scores) arrays.
+    """
+    books, neighbours = keys // width, keys % width
+    scores = counts / np.sqrt(popularity[books] * popularity[neighbours])
+
+    # Sort by book, then by descending score (and neighbour id to break ties deterministically).
+    order = np.lexsort((neighbours, -scores, books))
+    books, neighbours, scores = books[order], neighbours[order], scores[order]
+
+    ranks = group_ranks(books)
+    keep = ranks < top_k
+
+    return books[keep], neighbours[keep], ranks[keep], scores[keep]
+
+
+def build_recommendations(top_k=DEFAULT_TOP_K, chunk_size=DEFAULT_CHUNK_SIZE, batch_size=1000):
+    """ Rebuild the whole BookRecommendation table. Returns the number of stored neighbours. """
+    books, neighbours, ranks, scores = top_k_neighbours(*build_cooccurrence(chunk_size), top_k=top_k)
+
+    with transaction.atomic():
+        BookRecommendation.objects.all().delete()
+        for start in range(0, len(books), batch_size):
+            batch = slice(start, start + batch_size)
+            BookRecommendation.objects.bulk_create(
+                BookRecommendation(book_id=book, recommended_id=neighbour, rank=rank, score=score)
+                for book, neighbour, rank, score in zip(
+                    books[batch].tolist(), neighbours[batch].tolist(), ranks[batch].tolist(), scores[batch].tolist()
+                )
+            )
+
+    invalidate_pages()
+    return len(books)
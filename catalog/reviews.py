@@ -0,0 +1,119 @@
+"""
+Review listings, newest first, with keyset pagination.
+
+Popular books can collect tens of thousands of reviews: instead of OFFSET pages (which scan every skipped row), each
+page starts after the (publish_date, id) key of the last review of the previous one, a range over the
+(book, -publish_date, -id) index. The key is passed around as an opaque cursor string.
+Reviews without a publish date are not published yet and are not listed.
+"""
+import datetime
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .cache import invalidate_pages
+from .models import Book, Review
+from .outbox import record_changes
+
+
+REVIEWS_PER_PAGE = 10
+IMPORT_BATCH_SIZE = 1000
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def encode_cursor(review):
+    """ Cursor pointing after `review`: its publish date (microseconds since the epoch) and id. """
+    microseconds = (review.publish_date - EPOCH) // datetime.timedelta(microseconds=1)
+    return f'{microseconds}-{review.pk}'
+
+
+def decode_cursor(cursor):
+    """ (publish_date, id) of a cursor, or None if it is not valid. """
+    try:
+        # The microseconds are negative before 1970: only the last dash separates them from the id.
+        microseconds, pk = (int(part) for part in cursor.rsplit('-', 1))
+        return EPOCH + datetime.timedelta(microseconds=microseconds), pk
+    except (ValueError, OverflowError):
+        return None
+
+
+def review_page(queryset, cursor=None, size=REVIEWS_PER_PAGE):
+    """
+    A page of published reviews, newest first, starting after `cursor` (from the start if it is missing or invalid).
+    Returns (reviews, cursor of the next page or None).
+    """
+    queryset = queryset.filter(publish_date__isnull=False).order_by('-publish_date', '-id')
+    position = decode_cursor(cursor) if cursor else None
+    if position is not None:
+        publish_date, pk = position
+        # Same as (publish_date, id) < position, written so the first condition is a plain index range.
+        queryset = queryset.filter(
+            Q(publish_date__lte=publish_date), Q(publish_date__lt=publish_date) | Q(id__lt=pk)
+        )
+    reviews = list(queryset[:size + 1])
+    if len(reviews) > size:
+        return reviews[:size], encode_cursor(reviews[size - 1])
+    return reviews, None
+
+
+def parse_publish_date(value):
+    """ Publish date of an imported review: an ISO 8601 date or datetime, defaulting to now. """
+    if not value:
+        return timezone.now()
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'Invalid date: {value!r}')
+        parsed = datetime.datetime.combine(day, datetime.time())
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def import_reviews(rows, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Bulk insert reviews from dicts with 'isbn', 'publish_date', 'grade' and 'content' keys (e.g. CSV rows).
+    Each batch is one INSERT in its own transaction. Rows with an unknown ISBN or invalid values are skipped.
+    Returns (number of imported reviews, list of (row number, error) for the skipped rows).
+    """
+    imported, errors = 0, []
+
+    def flush(batch):
+        books = Book.objects.in_bulk({row.get('isbn') for _, row in batch} - {None}, field_name='isbn')
+        reviews = []
+        for number, row in batch:
+            try:
+                book = books.get(row['isbn'])
+                if book is None:
+                    raise ValueError(f"Unknown ISBN: {row['isbn']!r}")
+                review = Review(
+                    book=book, publish_date=parse_publish_date(row.get('publish_date')),
+                    grade=float(row['grade']), content=row['content'],
+                )
+                if not 0.0 <= review.grade <= 10.0:
+                    raise ValueError(f'Grade out of range: {review.grade}')
+            except (KeyError, TypeError, ValueError) as error:
+                errors.append((number, str(error)))
+            else:
+                reviews.append(review)
+        with transaction.atomic():
+            Review.objects.bulk_create(reviews)
+            record_changes(Review, [review.pk for review in reviews])
+        return len(reviews)
+
+    batch = []
+    for number, row in enumerate(rows, start=1):
+        batch.append((number, row))
+        if len(batch) == batch_size:
+            imported += flush(batch)
+            batch = []
+    if batch:
+        imported += flush(batch)
+    if imported:
+        # bulk_create() sends no signals.
+        invalidate_pages()
+    return imported, errors
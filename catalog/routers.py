@@ -0,0 +1,42 @@
+"""
+Database router for the optional per-branch partitioning of the copies (settings.CATALOG_BRANCH_DATABASES).
+
+Copies (BookInstance) of a partitioned branch are read from and written to the database of their branch; everything
+else (the catalog, users, branches, copies of the other branches) stays in the default database.
+Branch databases only get the BookInstance table. Its foreign keys point to rows of the default database, so
+SQLite does not enforce them there (see catalog.signals).
+"""
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from .branches import branch_database
+
+
+class BranchRouter:
+    def db_for_copy(self, model, **hints):
+        from .models import BookInstance
+
+        if model is not BookInstance:
+            # Also for the books, borrowers and branches of copies read from a branch database, which Django would
+            # otherwise look up in the database of the copy.
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if isinstance(instance, BookInstance) and instance.branch_id is not None:
+            alias = branch_database(instance.branch_id)
+            if alias != DEFAULT_DB_ALIAS:
+                return alias
+        return None
+
+    db_for_read = db_for_copy
+    db_for_write = db_for_copy
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Copies in a branch database still point to their book, borrower and branch in the default one.
+        if 'catalog.bookinstance' in (obj1._meta.label_lower, obj2._meta.label_lower):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.CATALOG_BRANCH_DATABASES.values():
+            return app_label == 'catalog' and model_name == 'bookinstance'
+        return None
@@ -0,0 +1,170 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.db import connections, transaction
+from django.db.models import RestrictedError
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_delete
+from django.dispatch import receiver
+
+from .backends import invalidate_all_users, invalidate_user
+from .branches import copies, count_copies, forget_branch_databases
+from .cache import invalidate_book, invalidate_pages, invalidate_version
+from .models import Author, Book, BookInstance, Branch, Genre, Language, Review
+from .outbox import FEEDS, record_change, record_changes
+from .tasks import refresh_similar_books
+from .typeahead import TYPEAHEAD_VERSION_KEY
+
+
+@receiver(post_save, sender=Book)
+def refresh_similar_books_on_save(sender, instance, raw=False, **kwargs):
+    """ Keep the "similar books" of a book up to date when it is edited. """
+    if raw:
+        return
+    refresh_similar_books.delay(instance.pk)
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def refresh_similar_books_on_genre_change(sender, instance, action, reverse, **kwargs):
+    """ Genres are part of the book vector, but they are saved after the book itself. """
+    if reverse or action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    refresh_similar_books.delay(instance.pk)
+
+
+def invalidate_cached_pages(sender, **kwargs):
+    """ Any change to the catalog makes the cached anonymous pages stale. """
+    if not kwargs.get('raw', False):
+        invalidate_pages()
+
+
+@receiver(post_save, sender=BookInstance)
+@receiver(post_delete, sender=BookInstance)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_book_pages(sender, instance, raw=False, **kwargs):
+    """ Loans, returns and reviews only show on the page of their book, and copies in the availability counts. """
+    if not raw:
+        invalidate_book(instance.book_id, copies=sender is BookInstance)
+
+
+for model in (Author, Book, Branch, Genre, Language):
+    post_save.connect(invalidate_cached_pages, sender=model, dispatch_uid=f'invalidate_pages_{model.__name__}_save')
+    post_delete.connect(invalidate_cached_pages, sender=model, dispatch_uid=f'invalidate_pages_{model.__name__}_delete')
+
+for through in (Book.genre.through, Book.language.through):
+    m2m_changed.connect(invalidate_cached_pages, sender=through, dispatch_uid=f'invalidate_pages_{through.__name__}')
+
+
+def record_saved(sender, instance, **kwargs):
+    """ Outbox events of the catalog changes (see catalog.outbox). """
+    record_change(instance)
+
+
+def record_deleted(sender, instance, **kwargs):
+    record_change(instance, deleted=True)
+
+
+for model, _ in FEEDS.values():
+    post_save.connect(record_saved, sender=model, dispatch_uid=f'outbox_{model.__name__}_save')
+    post_delete.connect(record_deleted, sender=model, dispatch_uid=f'outbox_{model.__name__}_delete')
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+@receiver(m2m_changed, sender=Book.language.through)
+def record_book_relations(sender, instance, action, reverse, pk_set, **kwargs):
+    """ Genres and languages are part of the book in the feed. """
+    if action in ('post_add', 'post_remove'):
+        if reverse:
+            record_changes(Book, pk_set)
+        else:
+            record_change(instance)
+    elif action == 'post_clear' and not reverse:
+        record_change(instance)
+    elif action == 'pre_clear' and reverse:
+        # Afterwards, the books that had this genre or language cannot be found anymore.
+        record_changes(Book, list(instance.book_set.values_list('pk', flat=True)))
+
+
+@receiver(pre_delete, sender=Genre)
+@receiver(pre_delete, sender=Language)
+def record_book_relations_on_delete(sender, instance, **kwargs):
+    """ Deleting a genre or a language removes it from its books without m2m_changed signals. """
+    record_changes(Book, list(instance.book_set.values_list('pk', flat=True)))
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def refresh_typeahead_indexes(sender, **kwargs):
+    """ Tell the typeahead indexes of the workers to read the new outbox events, once they are committed. """
+    transaction.on_commit(lambda: invalidate_version(TYPEAHEAD_VERSION_KEY))
+
+
+@receiver(post_save, sender=Branch)
+@receiver(post_delete, sender=Branch)
+def forget_branch_databases_on_change(sender, **kwargs):
+    forget_branch_databases()
+
+
+@receiver(pre_delete, sender=Branch)
+def restrict_branch_delete(sender, instance, **kwargs):
+    """
+    BookInstance.branch is on_delete=RESTRICT, but the delete collector only sees the copies of the default
+    database: the copies kept in the branch databases would be left pointing to a deleted branch.
+    """
+    if count_copies(branch=instance):
+        raise RestrictedError(
+            f'Cannot delete the branch {instance}: copies of books still belong to it.', set(copies(branch=instance))
+        )
+
+
+@receiver(connection_created)
+def disable_foreign_keys_in_branch_databases(sender, connection, **kwargs):
+    """
+    Copies in a branch database refer to books, users and branches of the default database (see catalog.routers):
+    SQLite cannot check those foreign keys.
+    """
+    if connection.vendor == 'sqlite' and connection.alias in settings.CATALOG_BRANCH_DATABASES.values():
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA foreign_keys = OFF')
+
+
+@receiver(post_migrate)
+def disable_foreign_keys_after_migrate(sender, using, **kwargs):
+    """ Schema changes turn the checks back on for the connection they ran on. """
+    disable_foreign_keys_in_branch_databases(sender, connections[using])
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """ Saving a user (password, is_active, is_superuser...) drops their cached copy and permissions. """
+    invalidate_user(instance.pk)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def invalidate_cached_user_permissions(sender, instance, action, reverse, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # Users added to a group or given a permission from the other side: rare, drop everything.
+        invalidate_all_users()
+    else:
+        invalidate_user(instance.pk)
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_cached_group_permissions(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_all_users()
+
+
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Permission)
+def invalidate_cached_permissions(sender, **kwargs):
+    invalidate_all_users()
@@ -0,0 +1,245 @@
+"""
+Content-based "similar books" index.
+
+Every book is tokenized from its title, summary and genres into a TF-IDF vector. Vectors are pruned to their
+strongest terms and stored in an inverted index whose posting lists are capped, which makes the nearest
+neighbour search approximate but proportional to the number of shared terms instead of to the catalog size.
+
+The full build runs offline in blocks of books (python manage.py build_similar_books). It writes the top-N
+neighbours of every book to the SimilarBook table and saves the index to settings.CATALOG_SIMILARITY_INDEX,
+which is then used to refresh the neighbours of a single book whenever it is saved.
+"""
+import os
+import re
+
+from array import array
+from collections import Counter
+
+import numpy as np
+
+from django.conf import settings
+from django.db import transaction
+
+from .cache import invalidate_pages
+from .models import Book, SimilarBook
+from .recommendations import group_ranks
+
+
+DEFAULT_TOP_N = 10
+DEFAULT_BLOCK_SIZE = 1000
+MAX_TERMS_PER_BOOK = 32
+MAX_POSTINGS_PER_TERM = 2000
+
+TITLE_WEIGHT = 3
+GENRE_WEIGHT = 2
+
+TOKEN_RE = re.compile(r'[^\W\d_]{3,}')
+STOP_WORDS = frozenset(
+    'about after all also and are been but can for from had has have her his into its more not one other '
+    'she than that the their them then there they this was were what when where which who will with you your'.split()
+)
+
+
+def tokenize(text):
+    """ Split a text into lowercase words of at least 3 letters, skipping stop words. """
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOP_WORDS]
+
+
+def book_terms(title, summary, genres):
+    """ Return the term frequencies of a book. Title words and genres weigh more than summary words. """
+    terms = Counter(tokenize(summary))
+    for token in tokenize(title):
+        terms[token] += TITLE_WEIGHT
+    for genre in genres:
+        terms[f'genre:{genre.lower()}'] += GENRE_WEIGHT
+    return terms
+
+
+def weigh(docs, frequencies, idf, n_docs):
+    """
+    Turn (doc, term) frequencies into L2-normalized TF-IDF weights and keep the MAX_TERMS_PER_BOOK strongest
+    terms of every document. `docs` must be sorted. Returns the kept (mask, weights).
+    """
+    weights = (1 + np.log(frequencies)) * idf
+    norms = np.sqrt(np.bincount(docs, weights=weights ** 2, minlength=n_docs))
+    weights = weights / norms[docs]
+
+    order = np.lexsort((-weights, docs))
+    keep = np.zeros(len(docs), dtype=bool)
+    keep[order[group_ranks(docs[order]) < MAX_TERMS_PER_BOOK]] = True
+    return keep, weights
+
+
+class SimilarityIndex:
+    """ Vocabulary, IDF and capped inverted index of the whole catalog. """
+
+    def __init__(self, book_ids, terms, idf, indptr, posting_docs, posting_weights):
+        self.book_ids = book_ids
+        self.terms = terms
+        self.vocabulary = {term: position for position, term in enumerate(terms.tolist())}
+        self.idf = idf
+        self.indptr = indptr
+        self.posting_docs = posting_docs
+        self.posting_weights = posting_weights
+
+    @classmethod
+    def build(cls, docs, term_ids, frequencies, book_ids, terms):
+        """ Build the index from the (doc, term, frequency) entries of every book, sorted by doc. """
+        n_docs = len(book_ids)
+        idf = np.log((1 + n_docs) / (1 + np.bincount(term_ids, minlength=len(terms)))) + 1
+        keep, weights = weigh(docs, frequencies, idf[term_ids], n_docs)
+        docs, term_ids, weights = docs[keep], term_ids[keep], weights[keep]
+
+        # Posting lists sorted by term and then by weight, capped to the strongest MAX_POSTINGS_PER_TERM books.
+        order = np.lexsort((-weights, term_ids))
+        order = order[group_ranks(term_ids[order]) < MAX_POSTINGS_PER_TERM]
+        indptr = np.r_[0, np.cumsum(np.bincount(term_ids[order], minlength=len(terms)))]
+
+        index = cls(book_ids, terms, idf, indptr, docs[order], weights[order].astype(np.float32))
+        return index, docs, term_ids, weights
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(**{name: data[name] for name in data.files})
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first, so workers never load a half-written index.
+        temporary_path = f'{path}.tmp.npz'
+        np.savez_compressed(
+            temporary_path, book_ids=self.book_ids, terms=self.terms, idf=self.idf, indptr=self.indptr,
+            posting_docs=self.posting_docs, posting_weights=self.posting_weights,
+        )
+        os.replace(temporary_path, path)
+
+    def search(self, query_docs, term_ids, weights, top_n=DEFAULT_TOP_N, exclude=None):
+        """
+        Score the query documents against the index, accumulating the products over the posting lists of
+        their terms. `exclude[i]` is a doc position never returned for query i (the query book itself).
+        Returns (query_docs, neighbour_book_ids, ranks, scores) arrays sorted by query and rank.
+        """
+        starts = self.indptr[term_ids]
+        lengths = self.indptr[term_ids + 1] - starts
+        positions = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+
+        queries = np.repeat(query_docs, lengths)
+        candidates = self.posting_docs[positions]
+        products = np.repeat(weights, lengths) * self.posting_weights[positions]
+
+        n_docs = len(self.book_ids)
+        keys, inverse = np.unique(queries * n_docs + candidates, return_inverse=True)
+        scores = np.bincount(inverse, weights=products, minlength=len(keys))
+        queries, candidates = keys // n_docs, keys % n_docs
+
+        if exclude is not None:
+            keep = candidates != exclude[queries]
+            queries, candidates, scores = queries[keep], candidates[keep], scores[keep]
+
+        order = np.lexsort((candidates, -scores, queries))
+        queries, candidates, scores = queries[order], candidates[order], scores[order]
+        ranks = group_ranks(queries)
+        keep = ranks < top_n
+        return queries[keep], self.book_ids[candidates[keep]], ranks[keep], scores[keep]
+
+
+def collect_book_terms(chunk_size=DEFAULT_BLOCK_SIZE):
+    """ Tokenize the whole catalog, reading it in chunks. Returns the arrays used by SimilarityIndex.build(). """
+    vocabulary = {}
+    book_ids, docs, term_ids, frequencies = array('q'), array('q'), array('q'), array('d')
+
+    books = Book.objects.order_by('pk').prefetch_related('genre').only('pk', 'title', 'summary')
+    for doc, book in enumerate(books.iterator(chunk_size=chunk_size)):
+        book_ids.append(book.pk)
+        for term, frequency in book_terms(book.title, book.summary, [g.name for g in book.genre.all()]).items():
+            docs.append(doc)
+            term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+            frequencies.append(frequency)
+
+    return (
+        np.frombuffer(docs, dtype=np.int64), np.frombuffer(term_ids, dtype=np.int64),
+        np.frombuffer(frequencies, dtype=np.float64), np.frombuffer(book_ids, dtype=np.int64),
+        np.array(list(vocabulary), dtype=str),
+    )
+
+
+def store_neighbours(book_ids, neighbour_ids, ranks, scores):
+    SimilarBook.objects.bulk_create(
+        SimilarBook(book_id=book, similar_id=neighbour, rank=rank, score=score)
+        for book, neighbour, rank, score in zip(
+            book_ids.tolist(), neighbour_ids.tolist(), ranks.tolist(), scores.tolist()
+        )
+    )
+
+
+def build_similar_books(top_n=DEFAULT_TOP_N, block_size=DEFAULT_BLOCK_SIZE, path=None):
+    """ Rebuild the index and the whole SimilarBook table. Returns the number of stored neighbours. """
+    index, docs, term_ids, weights = SimilarityIndex.build(*collect_book_terms(block_size))
+    index.save(path or settings.CATALOG_SIMILARITY_INDEX)
+    _loaded.clear()
+
+    n_docs = len(index.book_ids)
+    bounds = np.searchsorted(docs, np.arange(0, n_docs + block_size, block_size))
+    self_exclusion = np.arange(n_docs)
+    stored = 0
+
+    with transaction.atomic():
+        SimilarBook.objects.all().delete()
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            if start == end:
+                continue
+            block = slice(start, end)
+            queries, neighbour_ids, ranks, scores = index.search(
+                docs[block], term_ids[block], weights[block], top_n=top_n, exclude=self_exclusion
+            )
+            store_neighbours(index.book_ids[queries], neighbour_ids, ranks, scores)
+            stored += len(queries)
+
+    invalidate_pages()
+    return stored
+
+
+# Index loaded by this process, refreshed when the file on disk changes.
+_loaded = {}
+
+
+def get_index(path=None):
+    path = path or settings.CATALOG_SIMILARITY_INDEX
+    try:
+        modified = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if _loaded.get('key') != (path, modified):
+        _loaded.update(key=(path, modified), index=SimilarityIndex.load(path))
+    return _loaded['index']
+
+
+def update_similar_books(book, top_n=DEFAULT_TOP_N):
+    """
+    Refresh the neighbours of a single book against the last built index (e.g. after it has been saved).
+    Does nothing until the index has been built once. Other books will see it after the next full build.
+    """
+    index = get_index()
+    if index is None:
+        return
+
+    terms = book_terms(book.title, book.summary, [genre.name for genre in book.genre.all()])
+    known = [(index.vocabulary[term], frequency) for term, frequency in terms.items() if term in index.vocabulary]
+
+    with transaction.atomic():
+        SimilarBook.objects.filter(book=book).delete()
+        if not known:
+            return
+        term_ids, frequencies = np.array(known, dtype=np.float64).T
+        term_ids = term_ids.astype(np.int64)
+        docs = np.zeros(len(term_ids), dtype=np.int64)
+        keep, weights = weigh(docs, frequencies, index.idf[term_ids], 1)
+
+        # Exclude the book itself, if it was already part of the index.
+        position = np.flatnonzero(index.book_ids == book.pk)
+        exclude = position[:1] if len(position) else np.array([-1])
+
+        _, neighbour_ids, ranks, scores = index.search(
+            docs[keep], term_ids[keep], weights[keep], top_n=top_n, exclude=exclude
+        )
+        store_neighbours(np.full(len(neighbour_ids), book.pk), neighbour_ids, ranks, scores)
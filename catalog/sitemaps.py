@@ -0,0 +1,178 @@
+"""
+Sitemaps and the "new books" Atom feed, generated offline into settings.CATALOG_SITEMAP_ROOT
+(python manage.py build_sitemaps) and served as static files, so crawlers do not walk the paginated lists.
+
+Books and authors are split into shards by primary key range (SHARD_SIZE keys per file, well below the 50,000 URLs
+allowed per sitemap), listed by sitemap.xml. Rows are streamed with .iterator(). A shard is only rewritten when the
+fingerprint of its primary keys changed since the last run (URLs only depend on them); the fingerprints are kept in
+manifest.json. Every file also gets a precompressed .gz variant.
+"""
+import datetime
+import gzip
+import hashlib
+import io
+import json
+import os
+
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.feedgenerator import Atom1Feed
+
+from .models import Author, Book
+
+
+SHARD_SIZE = 10_000
+FEED_SIZE = 50
+
+SITEMAPS = (
+    # (name, model)
+    ('books', Book),
+    ('authors', Author),
+)
+
+INDEX_NAME = 'sitemap.xml'
+FEED_NAME = 'new-books.atom'
+MANIFEST_NAME = 'manifest.json'
+
+
+def write_file(root, name, content):
+    """ Atomically replace a generated file (and its .gz variant). """
+    path = os.path.join(root, name)
+    for target, data in ((path, content), (f'{path}.gz', gzip.compress(content, mtime=0))):
+        with open(f'{target}.tmp', 'wb') as file:
+            file.write(data)
+        os.replace(f'{target}.tmp', target)
+
+
+def remove_file(root, name):
+    for target in (os.path.join(root, name), os.path.join(root, f'{name}.gz')):
+        if os.path.exists(target):
+            os.remove(target)
+
+
+def shard_name(name, shard):
+    return f'{name}-{shard:05d}.xml'
+
+
+def shard_fingerprints(model, shard_size):
+    """ {shard number: fingerprint of its primary keys}, streaming the keys in order. """
+    fingerprints, digest, current = {}, None, None
+    for pk in model.objects.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=5000):
+        shard = (pk - 1) // shard_size
+        if shard != current:
+            if digest is not None:
+                fingerprints[current] = digest.hexdigest()
+            digest, current = hashlib.md5(f'{shard_size}:'.encode()), shard
+        digest.update(f'{pk},'.encode())
+    if digest is not None:
+        fingerprints[current] = digest.hexdigest()
+    return fingerprints
+
+
+def render_shard(model, shard, shard_size, base_url):
+    rows = (
+        model.objects.filter(pk__gt=shard * shard_size, pk__lte=(shard + 1) * shard_size)
+        .only('pk').order_by('pk').iterator(chunk_size=2000)
+    )
+    output = io.StringIO()
+    output.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    output.write('<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+    for row in rows:
+        output.write(f'<url><loc>{escape(base_url + row.get_absolute_url())}</loc></url>\n')
+    output.write('</urlset>\n')
+    return output.getvalue().encode()
+
+
+def render_index(shards, base_url):
+    output = io.StringIO()
+    output.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    output.write('<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+    for name, entry in sorted(shards.items()):
+        location = base_url + reverse('sitemap-file', args=[name])
+        output.write(f"<sitemap><loc>{escape(location)}</loc><lastmod>{entry['updated']}</lastmod></sitemap>\n")
+    output.write('</sitemapindex>\n')
+    return output.getvalue().encode()
+
+
+def render_feed(base_url, first_seen, now):
+    """
+    Atom feed of the newest books (highest primary keys). Books have no creation date, so entries are dated by
+    the run that first saw them (`first_seen`, {pk: ISO date}, updated in place).
+    """
+    feed = Atom1Feed(
+        title='LocalLibrary: new books',
+        link=base_url + reverse('books'),
+        description='Books recently added to the catalog.',
+        feed_url=base_url + reverse('new-books-feed'),
+    )
+    books = Book.objects.select_related('author').order_by('-pk')[:FEED_SIZE]
+    seen = {}
+    for book in books.iterator():
+        key = str(book.pk)
+        seen[key] = first_seen.get(key, now.isoformat())
+        feed.add_item(
+            title=book.title,
+            link=base_url + book.get_absolute_url(),
+            description=book.summary,
+            unique_id=base_url + book.get_absolute_url(),
+            updateddate=datetime.datetime.fromisoformat(seen[key]),
+            author_name=str(book.author) if book.author_id else None,
+        )
+    first_seen.clear()
+    first_seen.update(seen)
+    output = io.BytesIO()
+    feed.write(output, 'utf-8')
+    return output.getvalue()
+
+
+def build_sitemaps(base_url=None, shard_size=SHARD_SIZE, force=False):
+    """
+    Regenerate the changed sitemap shards, the sitemap index and the feed. Returns the number of files written.
+    """
+    base_url = (base_url or settings.CATALOG_SITE_URL).rstrip('/')
+    root = settings.CATALOG_SITEMAP_ROOT
+    os.makedirs(root, exist_ok=True)
+    manifest_path = os.path.join(root, MANIFEST_NAME)
+    try:
+        with open(manifest_path) as file:
+            manifest = json.load(file)
+    except (FileNotFoundError, ValueError):
+        manifest = {}
+    if force or manifest.get('base_url') != base_url:
+        manifest = {}
+    old_shards = manifest.get('shards', {})
+    now = timezone.now().replace(microsecond=0)
+    written = 0
+
+    shards = {}
+    for name, model in SITEMAPS:
+        for shard, fingerprint in shard_fingerprints(model, shard_size).items():
+            filename = shard_name(name, shard)
+            entry = old_shards.get(filename)
+            if entry is None or entry['fingerprint'] != fingerprint or not os.path.exists(os.path.join(root, filename)):
+                write_file(root, filename, render_shard(model, shard, shard_size, base_url))
+                entry = {'fingerprint': fingerprint, 'updated': now.isoformat()}
+                written += 1
+            shards[filename] = entry
+    for filename in old_shards.keys() - shards.keys():
+        remove_file(root, filename)
+
+    if shards != old_shards or not os.path.exists(os.path.join(root, INDEX_NAME)):
+        write_file(root, INDEX_NAME, render_index(shards, base_url))
+        written += 1
+
+    first_seen = manifest.get('feed_first_seen', {})
+    feed = render_feed(base_url, first_seen, now)
+    feed_fingerprint = hashlib.md5(feed).hexdigest()
+    if feed_fingerprint != manifest.get('feed') or not os.path.exists(os.path.join(root, FEED_NAME)):
+        write_file(root, FEED_NAME, feed)
+        written += 1
+
+    manifest = {'base_url': base_url, 'shards': shards, 'feed': feed_fingerprint, 'feed_first_seen': first_seen}
+    with open(f'{manifest_path}.tmp', 'w') as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(f'{manifest_path}.tmp', manifest_path)
+    return written
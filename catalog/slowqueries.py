@@ -0,0 +1,123 @@
+"""
+Slow-query log: the queries taking longer than settings.CATALOG_SLOW_QUERY_MS, with their query plan.
+
+catalog.middleware.SlowQueryMiddleware installs a SlowQueryRecorder on every database connection of the request
+(connection.execute_wrapper), and keeps it until the content of streaming responses has been sent. The recorder
+only times the queries. Once the response is done, each slow query is stored in the SlowQuery table, which has one
+row per fingerprint (a hash of the database and the normalized SQL, with literals and IN lists folded). The row
+counts the occurrences and keeps the total and maximum time, the last calling view, and the EXPLAIN QUERY PLAN of
+the last occurrence.
+Queries run by other threads (e.g. catalog.branches.fan_out) are not timed.
+
+python manage.py slow_queries ranks the worst offenders.
+"""
+import hashlib
+import logging
+import re
+import time
+
+from contextlib import ExitStack, contextmanager
+
+from django.db import DatabaseError, IntegrityError, connections, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import SlowQuery
+
+
+logger = logging.getLogger(__name__)
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+IN_LIST_RE = re.compile(r'\bIN \((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+SPACE_RE = re.compile(r'\s+')
+
+
+def normalize(sql):
+    """ SQL with its literals replaced by ?, IN lists folded and whitespace collapsed. """
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = IN_LIST_RE.sub('IN (...)', sql)
+    return SPACE_RE.sub(' ', sql).strip()
+
+
+def fingerprint(alias, normalized_sql):
+    return hashlib.sha1(f'{alias}\n{normalized_sql}'.encode()).hexdigest()
+
+
+class SlowQueryRecorder:
+    """ Execute wrapper keeping the queries slower than `threshold` milliseconds. """
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - start) * 1000
+            if duration >= self.threshold:
+                self.queries.append((context['connection'].alias, sql, None if many else params, duration))
+
+    @contextmanager
+    def installed(self):
+        """ Time the queries of every database connection of this thread. """
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(self))
+            yield self
+
+    def save(self, view=''):
+        """ Store the slow queries recorded so far. """
+        for alias, sql, params, duration in self.queries:
+            try:
+                record(alias, sql, params, duration, view)
+            except DatabaseError:
+                logger.exception('Could not record a slow query')
+        self.queries = []
+
+
+def explain(alias, sql, params):
+    """ The query plan of a SELECT query, or '' for other statements. """
+    if params is None or not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return ''
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+            rows = cursor.fetchall()
+    except DatabaseError:
+        return ''
+    if connection.vendor == 'sqlite':
+        # (id, parent, notused, detail) rows.
+        return '\n'.join(str(row[-1]) for row in rows)
+    return '\n'.join(' '.join(str(column) for column in row) for row in rows)
+
+
+def record(alias, sql, params, duration, view=''):
+    """ Add an occurrence of a slow query to its SlowQuery row. """
+    normalized = normalize(sql)
+    key = fingerprint(alias, normalized)
+    changes = {
+        'count': F('count') + 1,
+        'total_time': F('total_time') + duration,
+        'max_time': Greatest('max_time', duration),
+        'last_seen': timezone.now(),
+        'view': view or '',
+        'plan': explain(alias, sql, params),
+    }
+    if SlowQuery.objects.filter(fingerprint=key).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            SlowQuery.objects.create(
+                fingerprint=key, database=alias, sql=normalized, view=view or '', plan=changes['plan'],
+                count=1, total_time=duration, max_time=duration,
+            )
+    except IntegrityError:
+        # Created meanwhile by another worker.
+        SlowQuery.objects.filter(fingerprint=key).update(**changes)
@@ -0,0 +1,35 @@
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Manifest storage (content-hashed file names) that also writes a gzip-compressed copy of every
+    text asset at collectstatic time, so they never have to be compressed while serving a request.
+    """
+    compressible_extensions = ('.css', '.js', '.map', '.svg', '.txt', '.html', '.json', '.xml')
+    # Hash files missing from the manifest on the fly instead of failing the whole page.
+    manifest_strict = False
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+
+        for name in self.hashed_files.values():
+            if name.endswith(self.compressible_extensions):
+                self.compress(name)
+
+    def compress(self, name):
+        """ Write `name`.gz next to the file, unless compressing it does not save anything. """
+        path = self.path(name)
+        with open(path, 'rb') as source:
+            content = source.read()
+        compressed = gzip.compress(content, compresslevel=9, mtime=0)
+        if len(compressed) < len(content):
+            with open(f'{path}.gz', 'wb') as target:
+                target.write(compressed)
+        elif os.path.exists(f'{path}.gz'):
+            os.remove(f'{path}.gz')
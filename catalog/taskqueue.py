@@ -0,0 +1,125 @@
+"""
+Small database-backed task queue, so slow follow-up work (emails, index refreshes, cache rebuilds...) runs
+outside of the request.
+
+Declare a task with the @task decorator and queue it with .delay(), with JSON-serializable arguments:
+
+    @task
+    def send_notice(book_instance_id):
+        ...
+
+    send_notice.delay(str(book_instance.id))
+
+The task row is written in the current transaction, so work queued by a request that fails is dropped too.
+Tasks are run by: python manage.py run_tasks. Failed tasks are retried with exponential backoff.
+With settings.CATALOG_TASKS_EAGER, tasks run immediately instead (useful while developing).
+"""
+import logging
+import random
+import traceback
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from .models import Task
+
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+RETRY_BASE_DELAY = 10
+RETRY_MAX_DELAY = 3600
+LOCK_DURATION = timedelta(minutes=10)
+
+
+def task(func=None, *, max_attempts=5):
+    """ Register a function as a task and give it a delay(*args, **kwargs) method that queues it. """
+    def decorator(func):
+        name = f'{func.__module__}.{func.__qualname__}'
+        registry[name] = func
+
+        def delay(*args, **kwargs):
+            if settings.CATALOG_TASKS_EAGER:
+                return func(*args, **kwargs)
+            return Task.objects.create(name=name, args=list(args), kwargs=kwargs, max_attempts=max_attempts)
+
+        func.task_name = name
+        func.delay = delay
+        return func
+
+    return decorator(func) if func is not None else decorator
+
+
+def retry_delay(attempts):
+    """ Seconds to wait before the next attempt: exponential backoff with jitter. """
+    delay = min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def claim_next_task():
+    """
+    Return the next due task, marked as running, or None.
+    The claim is a conditional UPDATE, so two workers never run the same task. It also counts the attempt, so a task
+    killing its worker (out of memory, timeout...) still runs at most max_attempts times.
+    """
+    now = timezone.now()
+    # Tasks whose last attempt never finished.
+    Task.objects.filter(status='r', locked_until__lt=now, attempts__gte=F('max_attempts')).update(
+        status='f', locked_until=None, finished_at=now, last_error='The worker stopped during the last attempt.'
+    )
+    due = Q(status='q', run_at__lte=now) | Q(status='r', locked_until__lt=now)
+    for candidate in Task.objects.filter(due).order_by('run_at').values_list('pk', flat=True)[:10]:
+        claimed = Task.objects.filter(due, pk=candidate).update(
+            status='r', locked_until=now + LOCK_DURATION, attempts=F('attempts') + 1
+        )
+        if claimed:
+            return Task.objects.get(pk=candidate)
+    return None
+
+
+def run_task(queued):
+    """ Run a claimed task and record its result, scheduling a retry if it fails. """
+    try:
+        func = registry[queued.name]
+        with transaction.atomic():
+            func(*queued.args, **queued.kwargs)
+    except Exception:
+        queued.last_error = traceback.format_exc()
+        if queued.attempts < queued.max_attempts:
+            queued.status = 'q'
+            queued.run_at = timezone.now() + timedelta(seconds=retry_delay(queued.attempts))
+        else:
+            queued.status = 'f'
+        logger.exception('Task %s (%s) failed, attempt %s', queued.pk, queued.name, queued.attempts)
+    else:
+        queued.status = 'd'
+    if queued.status in ('d', 'f'):
+        queued.finished_at = timezone.now()
+    queued.locked_until = None
+    queued.save(update_fields=['status', 'run_at', 'locked_until', 'finished_at', 'last_error'])
+    return queued.status == 'd'
+
+
+def run_due_tasks(limit=None):
+    """ Run due tasks until there are none left (or `limit` have run). Returns the number of tasks run. """
+    autodiscover_modules('tasks')
+    count = 0
+    while limit is None or count < limit:
+        queued = claim_next_task()
+        if queued is None:
+            break
+        run_task(queued)
+        count += 1
+    return count
+
+
+def purge_finished_tasks(older_than=timedelta(days=7)):
+    """ Delete the tasks that succeeded more than `older_than` ago. Returns the number of deleted tasks. """
+    deleted, _ = Task.objects.filter(status='d', finished_at__lt=timezone.now() - older_than).delete()
+    return deleted
@@ -0,0 +1,49 @@
+"""
+Background tasks of the catalog, queued from views and signals (see catalog.taskqueue).
+"""
+from django.core.mail import send_mail
+
+from .branches import get_copy
+from .models import Book
+from .taskqueue import task
+
+
+@task
+def refresh_similar_books(book_id):
+    """ Refresh the "similar books" of a book after it has been edited. """
+    from .similarity import update_similar_books
+
+    book = Book.objects.filter(pk=book_id).first()
+    if book is not None:
+        update_similar_books(book)
+
+
+@task
+def rebuild_similar_books():
+    from .similarity import build_similar_books
+    build_similar_books()
+
+
+@task
+def rebuild_recommendations():
+    from .recommendations import build_recommendations
+    build_recommendations()
+
+
+@task
+def send_renewal_notice(book_instance_id):
+    """ Tell the borrower of a copy that its loan has been renewed. """
+    book_instance = get_copy(book_instance_id)
+    if book_instance is None or book_instance.borrower is None or not book_instance.borrower.email:
+        return
+
+    send_mail(
+        subject=f'Your loan of "{book_instance.book.title}" has been renewed',
+        message=(
+            f'Hello {book_instance.borrower.get_username()},\n\n'
+            f'Your loan of "{book_instance.book.title}" has been renewed. '
+            f'Please return it by {book_instance.due_back:%d %B %Y}.\n\nLocal Library'
+        ),
+        from_email=None,
+        recipient_list=[book_instance.borrower.email],
+    )
@@ -0,0 +1,58 @@
+import datetime
+import io
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import RestrictedError
+from django.test import TestCase
+from django.utils import timezone
+
+from catalog.archive import archive_cold_rows
+from catalog.models import ArchivedBookInstance, ArchivedReview, Book, BookInstance, Review
+
+
+class ArchiveTest(TestCase):
+    def setUp(self):
+        self.book = Book.objects.create(title='Book Title', summary='A little summary', isbn='ABCDERGTKWOEJ')
+        borrower = get_user_model().objects.create_user(username='testuser1', password='oisam23ilne4')
+        long_ago = datetime.date.today() - datetime.timedelta(days=800)
+        self.retired = BookInstance.objects.create(book=self.book, imprint='Old Imprint', status='m', due_back=long_ago)
+        self.in_repair = BookInstance.objects.create(book=self.book, imprint='Imprint', status='m',
+                                                     due_back=datetime.date.today())
+        self.on_loan = BookInstance.objects.create(book=self.book, imprint='Imprint', status='o', due_back=long_ago,
+                                                   borrower=borrower)
+        self.old_review = Review.objects.create(book=self.book, grade=4, content='Old',
+                                                publish_date=timezone.now() - datetime.timedelta(days=2000))
+        self.new_review = Review.objects.create(book=self.book, grade=8, content='New', publish_date=timezone.now())
+
+    def test_only_cold_rows_are_archived(self):
+        self.assertEqual(archive_cold_rows(batch_size=1), {'copies': 1, 'reviews': 1})
+        self.assertEqual(set(BookInstance.objects.all()), {self.in_repair, self.on_loan})
+        self.assertEqual(list(Review.objects.all()), [self.new_review])
+        archived = ArchivedBookInstance.objects.get()
+        self.assertEqual((archived.pk, archived.imprint, archived.book), (self.retired.pk, 'Old Imprint', self.book))
+        self.assertEqual(ArchivedReview.objects.get().pk, self.old_review.pk)
+
+    def test_restore(self):
+        archive_cold_rows()
+        self.assertEqual(ArchivedReview.objects.filter(book=self.book).restore(), 1)
+        self.assertEqual(ArchivedBookInstance.objects.all().restore(), 1)
+        self.assertFalse(ArchivedReview.objects.exists())
+        restored = BookInstance.objects.get(pk=self.retired.pk)
+        self.assertEqual((restored.status, restored.due_back), ('m', self.retired.due_back))
+        self.assertEqual(Review.objects.get(pk=self.old_review.pk).content, 'Old')
+
+    def test_books_with_archived_rows_cannot_be_deleted(self):
+        archive_cold_rows()
+        BookInstance.objects.all().delete()
+        Review.objects.all().delete()
+        with self.assertRaises(RestrictedError):
+            self.book.delete()
+
+    def test_command(self):
+        output = io.StringIO()
+        call_command('archive_catalog', '--dry-run', stdout=output)
+        self.assertIn('Would archive 1 copies and 1 reviews', output.getvalue())
+        self.assertFalse(ArchivedBookInstance.objects.exists())
+        call_command('archive_catalog', stdout=output)
+        self.assertIn('Archived 1 copies and 1 reviews', output.getvalue())
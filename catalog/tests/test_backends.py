@@ -0,0 +1,76 @@
+from unittest import mock
+
+from django.contrib.auth import BACKEND_SESSION_KEY, get_user_model
+from django.contrib.auth.hashers import get_hasher
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog.backends import CachedModelBackend
+
+
+@override_settings(CATALOG_AUTH_CACHE_TIMEOUT=300)
+class CachedModelBackendTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.backend = CachedModelBackend()
+        self.user = get_user_model().objects.create_user(username='librarian', password='oismd23929ma')
+        self.user.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+        self.librarians = Group.objects.create(name='Librarians')
+
+    def fresh_user(self):
+        return get_user_model().objects.get(pk=self.user.pk)
+
+    def test_permissions_are_loaded_once(self):
+        self.assertTrue(self.backend.has_perm(self.fresh_user(), 'catalog.can_mark_returned'))
+        user = self.fresh_user()
+        with self.assertNumQueries(0):
+            self.assertTrue(self.backend.has_perm(user, 'catalog.can_mark_returned'))
+            self.assertFalse(self.backend.has_perm(user, 'catalog.add_book'))
+
+    def test_user_is_loaded_once(self):
+        self.backend.get_user(self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.backend.get_user(self.user.pk), self.user)
+
+    def test_permission_changes_are_seen(self):
+        self.assertFalse(self.backend.has_perm(self.fresh_user(), 'catalog.add_book'))
+
+        self.user.groups.add(self.librarians)
+        self.librarians.permissions.add(Permission.objects.get(codename='add_book'))
+        self.assertTrue(self.backend.has_perm(self.fresh_user(), 'catalog.add_book'))
+
+        self.librarians.permissions.clear()
+        self.assertFalse(self.backend.has_perm(self.fresh_user(), 'catalog.add_book'))
+
+        self.user.user_permissions.remove(Permission.objects.get(codename='can_mark_returned'))
+        self.assertFalse(self.backend.has_perm(self.fresh_user(), 'catalog.can_mark_returned'))
+
+    def test_saving_the_user_drops_the_cached_copy(self):
+        self.backend.get_user(self.user.pk)
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(self.backend.get_user(self.user.pk))
+
+    def test_staff_page(self):
+        self.client.login(username='librarian', password='oismd23929ma')
+        self.client.get(reverse('all-borrowed'))
+        # Session, loans count (there are none) and branches: the user and their permissions come from the cache.
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('all-borrowed'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_sessions_opened_with_model_backend_stay_logged_in(self):
+        self.client.force_login(self.user, backend='django.contrib.auth.backends.ModelBackend')
+        response = self.client.get(reverse('all-borrowed'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['user'], self.user)
+        # Moved to the cached backend.
+        self.assertEqual(self.client.session[BACKEND_SESSION_KEY], 'catalog.backends.CachedModelBackend')
+
+    def test_failed_login_checks_the_password_once(self):
+        hasher = type(get_hasher())
+        with mock.patch.object(hasher, 'verify', autospec=True, side_effect=hasher.verify) as verify:
+            self.assertFalse(self.client.login(username='librarian', password='wrong password'))
+        self.assertEqual(verify.call_count, 1)
@@ -0,0 +1,94 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+from django.test import TestCase
+
+from catalog import backfills
+from catalog.models import Author, BackfillProgress, Book, BookInstance, ChangeEvent
+
+
+class BackfillTest(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        for number in range(5):
+            Book.objects.create(title=f'The Title {number}', summary='A little summary', isbn=f'ABCDERGTKWOE{number}')
+        Author.objects.create(first_name='Émile', last_name='Zola')
+        # As if utils.sort_key had changed since they were saved.
+        Book.objects.filter(title__in=['The Title 1', 'The Title 3']).update(title_key='')
+
+    def setUp(self):
+        self.backfill = backfills.get_backfill('book-sort-keys')
+
+    def index_exists(self, name):
+        with connection.cursor() as cursor:
+            return name in connection.introspection.get_constraints(cursor, Book._meta.db_table)
+
+    def test_batches_resume_from_their_checkpoint(self):
+        progress = backfills.run(self.backfill, batch_size=2, sleep=0, max_batches=2)
+        self.assertEqual((progress.processed, progress.changed, progress.batches), (4, 2, 2))
+        self.assertIsNone(progress.completed)
+        self.assertEqual(progress.position, str(Book.objects.order_by('pk')[3].pk))
+        self.assertEqual(Book.objects.filter(title_key='').count(), 0)
+
+        progress = backfills.run(self.backfill, batch_size=2, sleep=0)
+        self.assertEqual((progress.processed, progress.changed, progress.batches), (5, 2, 3))
+        self.assertIsNotNone(progress.finalized)
+        # A finished backfill does nothing.
+        with self.assertNumQueries(1):
+            backfills.run(self.backfill)
+
+    def test_indexes_are_created_last(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP INDEX book_title_key_idx')
+        backfills.run(self.backfill, batch_size=2, sleep=0, max_batches=2)
+        self.assertFalse(self.index_exists('book_title_key_idx'))
+        backfills.run(self.backfill, batch_size=2, sleep=0)
+        self.assertTrue(self.index_exists('book_title_key_idx'))
+
+    def test_migration_operations(self):
+        # The models as the migrations see them.
+        apps = MigrationLoader(connection).project_state().apps
+        schema_editor = connection.schema_editor()
+        require = backfills.RequireBackfill('book-sort-keys')
+        with self.assertRaises(backfills.BackfillError):
+            require.code(apps, schema_editor)
+        # Too big to run inside the migration.
+        with self.assertLogs('catalog.backfills', 'WARNING') as logs:
+            backfills.RunBackfill('book-sort-keys', inline_rows=4).code(apps, schema_editor)
+        self.assertIn('run_backfill book-sort-keys', logs.output[0])
+        self.assertFalse(BackfillProgress.objects.filter(name='book-sort-keys').exists())
+        backfills.RunBackfill('book-sort-keys').code(apps, schema_editor)
+        self.assertEqual(BackfillProgress.objects.get(name='book-sort-keys').changed, 2)
+        require.code(apps, schema_editor)
+
+    def test_copies_backfill_ran_with_the_migrations(self):
+        # Migration 0021 ran it inline on the empty test database, then created the index.
+        progress = BackfillProgress.objects.get(name='bookinstance-status')
+        self.assertIsNotNone(progress.finalized)
+        with connection.cursor() as cursor:
+            self.assertIn('bookinstance_loans_idx',
+                          connection.introspection.get_constraints(cursor, BookInstance._meta.db_table))
+
+        book = Book.objects.first()
+        copy = BookInstance.objects.create(book=book, imprint='Imprint', status='')
+        self.assertEqual(copy.status, 'm')
+        BookInstance.objects.filter(pk=copy.pk).update(status='')
+        backfills.restart(backfills.get_backfill('bookinstance-status'))
+        progress = backfills.run(backfills.get_backfill('bookinstance-status'), sleep=0)
+        self.assertEqual((progress.processed, progress.changed), (1, 1))
+        copy.refresh_from_db()
+        self.assertEqual(copy.status, 'm')
+        # The feed sees the copies moved to maintenance.
+        self.assertEqual(ChangeEvent.objects.filter(model='bookinstance', object_id=str(copy.pk)).count(), 2)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('run_backfill', 'book-sort-keys', batch_size=2, sleep=0, max_batches=1, stdout=out)
+        self.assertIn('book-sort-keys: 2 rows read', out.getvalue())
+        call_command('run_backfill', sleep=0, stdout=out)
+        self.assertIn('book-sort-keys: 5 rows read, 2 updated, done.', out.getvalue())
+        self.assertIn('author-sort-keys: 1 rows read, 0 updated, done.', out.getvalue())
+        call_command('run_backfill', 'book-sort-keys', list=True, stdout=out)
+        self.assertIn('done', out.getvalue().splitlines()[-1])
@@ -0,0 +1,52 @@
+import gzip
+import os
+import sqlite3
+import tempfile
+
+from django.test import TransactionTestCase, override_settings
+
+from catalog.backups import BackupError, backup, check_integrity, restore, restore_file
+from catalog.models import Genre
+
+
+class BackupTest(TransactionTestCase):
+    """ The snapshots are read through their own connection: the test data has to be committed. """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        settings_override = override_settings(CATALOG_BACKUP_ROOT=self.directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        Genre.objects.create(name='Fantasy')
+
+    def test_snapshots_are_only_kept_when_the_database_changed(self):
+        first = backup(keep=2)
+        self.assertTrue(first['name'].endswith('.sqlite3.gz'))
+        self.assertIsNone(backup(keep=2))
+        Genre.objects.create(name='Horror')
+        second = backup(keep=2)
+        Genre.objects.create(name='Poetry')
+        third = backup(keep=2, compress=False)
+        self.assertEqual(
+            sorted(name for name in os.listdir(self.directory.name) if name != 'manifest.json'),
+            sorted([second['name'], third['name']]),
+        )
+
+    def test_snapshot_can_be_restored(self):
+        path = os.path.join(self.directory.name, backup()['name'])
+        target = os.path.join(self.directory.name, 'replica.sqlite3')
+        restore_file(path, target)
+        with sqlite3.connect(target) as connection:
+            self.assertEqual(connection.execute('SELECT name FROM catalog_genre').fetchall(), [('Fantasy',)])
+        with self.assertRaises(BackupError):
+            restore(path, 'default')
+
+    def test_corrupt_snapshots_are_rejected(self):
+        path = os.path.join(self.directory.name, 'corrupt.sqlite3.gz')
+        with gzip.open(path, 'wb') as file:
+            file.write(b'not a database' * 100)
+        with self.assertRaises(BackupError):
+            restore_file(path, os.path.join(self.directory.name, 'replica.sqlite3'))
+        with self.assertRaises(BackupError):
+            check_integrity(path)
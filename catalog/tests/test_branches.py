@@ -0,0 +1,129 @@
+import datetime
+import unittest
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import RestrictedError
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog.branches import availability, branch_counters, copies, count_copies, get_copy
+from catalog.models import Book, BookInstance, Branch
+from catalog.routers import BranchRouter
+
+
+@override_settings(CATALOG_BRANCH_DATABASES={})
+class BranchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.north = Branch.objects.create(name='North', code='north')
+        cls.south = Branch.objects.create(name='South', code='south')
+        cls.book = Book.objects.create(title='Book Title', summary='A little summary', isbn='ABCDERGTKWOEJ')
+        cls.librarian = get_user_model().objects.create_user(username='librarian', password='oismd23929ma')
+        cls.librarian.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+        due_back = datetime.date.today() + datetime.timedelta(days=5)
+        for branch, status in ((cls.north, 'a'), (cls.north, 'a'), (cls.north, 'o'), (cls.south, 'o'), (None, 'a')):
+            BookInstance.objects.create(
+                book=cls.book, imprint='Imprint', branch=branch, status=status,
+                due_back=due_back if status == 'o' else None,
+                borrower=cls.librarian if status == 'o' else None,
+            )
+
+    def test_branch_counters(self):
+        self.assertEqual(branch_counters(), [
+            (self.north, {'copies': 3, 'available': 2, 'on_loan': 1}),
+            (self.south, {'copies': 1, 'available': 0, 'on_loan': 1}),
+        ])
+
+    def test_availability_per_branch(self):
+        self.assertEqual(availability(self.book), [(self.north, 2), (None, 1)])
+
+    def test_branch_loan_list(self):
+        self.client.login(username='librarian', password='oismd23929ma')
+        response = self.client.get(reverse('all-borrowed') + '?branch=south')
+        self.assertEqual([copy.branch for copy in response.context['bookinstance_list']], [self.south])
+        response = self.client.get(reverse('all-borrowed'))
+        self.assertEqual(len(response.context['bookinstance_list']), 2)
+        self.assertEqual(self.client.get(reverse('all-borrowed') + '?branch=nowhere').status_code, 404)
+
+    def test_book_detail_shows_availability(self):
+        response = self.client.get(reverse('book-detail', args=[self.book.pk]))
+        self.assertContains(response, 'North (2)')
+        self.assertContains(response, 'Main library (1)')
+
+
+@override_settings(CATALOG_BRANCH_DATABASES={'north': 'branch_north'})
+class BranchRouterTest(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.north = Branch.objects.create(name='North', code='north')
+        cls.south = Branch.objects.create(name='South', code='south')
+
+    def test_copies_are_routed_by_branch(self):
+        router = BranchRouter()
+        self.assertEqual(router.db_for_write(BookInstance, instance=BookInstance(branch=self.north)), 'branch_north')
+        self.assertIsNone(router.db_for_write(BookInstance, instance=BookInstance(branch=self.south)))
+        self.assertEqual(router.db_for_read(Book, instance=BookInstance(branch=self.north)), 'default')
+
+    def test_branch_databases_only_hold_copies(self):
+        router = BranchRouter()
+        self.assertTrue(router.allow_migrate('branch_north', 'catalog', model_name='bookinstance'))
+        self.assertFalse(router.allow_migrate('branch_north', 'catalog', model_name='book'))
+        self.assertFalse(router.allow_migrate('branch_north', 'auth', model_name='user'))
+        self.assertIsNone(router.allow_migrate('default', 'catalog', model_name='book'))
+
+
+@unittest.skipUnless('north' in settings.CATALOG_BRANCH_DATABASES, 'Run with CATALOG_BRANCH_DATABASES=north')
+class PartitionedBranchTest(TransactionTestCase):
+    """ Copies of the north branch in their own database, queried in parallel with the default one. """
+    databases = {'default', *settings.CATALOG_BRANCH_DATABASES.values()}
+
+    def setUp(self):
+        self.north = Branch.objects.create(name='North', code='north')
+        self.book = Book.objects.create(title='Book Title', summary='A little summary', isbn='ABCDERGTKWOEJ')
+        self.central_copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        self.north_copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a', branch=self.north)
+
+    def test_copies_are_stored_in_the_branch_database(self):
+        self.assertEqual(list(BookInstance.objects.using('branch_north')), [self.north_copy])
+        self.assertEqual(list(BookInstance.objects.using('default')), [self.central_copy])
+
+    def test_queries_fan_out(self):
+        self.assertEqual(count_copies(status__exact='a'), 2)
+        self.assertEqual({copy.pk for copy in copies(book=self.book)}, {self.central_copy.pk, self.north_copy.pk})
+        self.assertEqual(list(copies(branch=self.north)), [self.north_copy])
+        self.assertEqual(get_copy(self.north_copy.pk).book, self.book)
+        self.assertEqual(dict(availability(self.book)), {self.north: 1, None: 1})
+
+    def test_merged_copies_are_read_one_page_at_a_time(self):
+        today = datetime.date.today()
+        for days in range(5):
+            for branch in (None, self.north):
+                BookInstance.objects.create(book=self.book, imprint='Imprint', status='o', branch=branch,
+                                            due_back=today + datetime.timedelta(days=days))
+        loans = copies(status__exact='o')
+        self.assertEqual(loans.count(), 10)
+        with CaptureQueriesContext(connections['default']) as default_queries:
+            page = Paginator(loans, 4).page(2)
+        self.assertEqual([copy.due_back for copy in page],
+                         [today + datetime.timedelta(days=days) for days in (2, 2, 3, 3)])
+        # Only the first two pages of each database, then the books and branches of the page.
+        self.assertIn('LIMIT 8', default_queries[0]['sql'])
+
+    def test_branch_with_copies_in_its_database_cannot_be_deleted(self):
+        with self.assertRaises(RestrictedError):
+            self.north.delete()
+        self.assertTrue(Branch.objects.filter(pk=self.north.pk).exists())
+        self.north_copy.delete()
+        self.north.delete()
+        self.assertFalse(Branch.objects.exists())
+
+    def test_saving_a_copy_keeps_it_in_its_database(self):
+        copy = get_copy(self.north_copy.pk)
+        copy.status = 'o'
+        copy.save()
+        self.assertEqual(BookInstance.objects.using('branch_north').get().status, 'o')
@@ -0,0 +1,39 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.management.commands.warm_cache import Command as WarmCacheCommand
+from catalog.models import Author, Book, BookInstance
+
+
+class WarmCachePathsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.books = [
+            Book.objects.create(title=f'Book {i}', summary='Summary', isbn=f'{i:013d}', author=cls.author)
+            for i in range(25)
+        ]
+        borrower = get_user_model().objects.create_user(username='testuser1', password='oisam23ilne4')
+        for _ in range(2):
+            BookInstance.objects.create(book=cls.books[7], imprint='Imprint', borrower=borrower, status='o')
+
+    def test_list_pages_stop_at_the_last_page(self):
+        paths = WarmCacheCommand.paths(list_pages=5, detail_pages=0)
+        self.assertEqual(
+            paths, [reverse('books'), f"{reverse('books')}?page=2", f"{reverse('books')}?page=3", reverse('authors')]
+        )
+
+    def test_most_borrowed_books_first(self):
+        paths = WarmCacheCommand.paths(list_pages=0, detail_pages=2)
+        self.assertEqual(paths[-3:], [
+            self.books[7].get_absolute_url(), self.books[0].get_absolute_url(), self.author.get_absolute_url(),
+        ])
+
+    def test_failing_page_is_counted_as_an_error(self):
+        path = self.books[0].get_absolute_url()
+        with mock.patch('catalog.views.BookDetailView.get_context_data', side_effect=RuntimeError('Boom')):
+            with self.assertLogs('django.request', 'ERROR'):
+                self.assertEqual(WarmCacheCommand.warm(path, deadline=float('inf')), 'error')
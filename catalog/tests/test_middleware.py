@@ -0,0 +1,249 @@
+import gzip
+import hashlib
+import os
+import tempfile
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog import profiling
+from catalog.middleware import RateLimitMiddleware
+from catalog.models import Author, Book, BookInstance, Review
+
+
+class StaticFilesMiddlewareTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        os.makedirs(os.path.join(directory.name, 'css'))
+
+        self.content = b'.sidebar-nav { margin-top: 20px; }\n' * 20
+        for name in ('styles.css', 'styles.0123456789ab.css'):
+            with open(os.path.join(directory.name, 'css', name), 'wb') as file:
+                file.write(self.content)
+        with open(os.path.join(directory.name, 'css', 'styles.0123456789ab.css.gz'), 'wb') as file:
+            file.write(gzip.compress(self.content))
+
+        settings_override = override_settings(STATIC_ROOT=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_hashed_file_is_immutable(self):
+        response = self.client.get('/static/css/styles.0123456789ab.css')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    def test_unhashed_file_is_cached_briefly(self):
+        response = self.client.get('/static/css/styles.css')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+
+    def test_gzip_variant_when_accepted(self):
+        response = self.client.get('/static/css/styles.0123456789ab.css', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), self.content)
+
+    def test_not_modified(self):
+        etag = self.client.get('/static/css/styles.css')['ETag']
+        response = self.client.get('/static/css/styles.css', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_path_traversal_is_not_served(self):
+        response = self.client.get('/static/../manage.py')
+        self.assertEqual(response.status_code, 404)
+
+    def test_missing_file_falls_through(self):
+        response = self.client.get('/static/css/missing.css')
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(CATALOG_PAGE_CACHE_TIMEOUT=60)
+class AnonymousPageCacheMiddlewareTest(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        Author.objects.create(first_name='John', last_name='Smith')
+        get_user_model().objects.create_user(username='testuser1', password='oisam23ilne4')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_second_anonymous_request_is_served_from_cache(self):
+        self.assertEqual(self.client.get(reverse('authors'))['X-Page-Cache'], 'MISS')
+        response = self.client.get(reverse('authors'))
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+        self.assertContains(response, 'Smith, John')
+
+    def test_catalog_change_invalidates_pages(self):
+        self.client.get(reverse('authors'))
+        Author.objects.create(first_name='Jane', last_name='Doe')
+        response = self.client.get(reverse('authors'))
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertContains(response, 'Doe, Jane')
+
+    def test_stale_page_served_while_another_worker_regenerates(self):
+        self.client.get(reverse('authors'))
+        key = f"catalog:page:{hashlib.md5(reverse('authors').encode()).hexdigest()}"
+        entry = cache.get(key)
+        entry['fresh_until'] = 0
+        cache.set(key, entry)
+
+        # Another worker holds the regeneration lock.
+        cache.add(f'{key}:lock', 1)
+        self.assertEqual(self.client.get(reverse('authors'))['X-Page-Cache'], 'STALE')
+
+        cache.delete(f'{key}:lock')
+        self.assertEqual(self.client.get(reverse('authors'))['X-Page-Cache'], 'MISS')
+
+    def test_stale_page_served_after_a_catalog_change(self):
+        self.client.get(reverse('authors'))
+        Author.objects.create(first_name='Jane', last_name='Doe')
+        # Another worker is already rendering the new version: no one waits for it.
+        cache.add(f"catalog:page:{hashlib.md5(reverse('authors').encode()).hexdigest()}:lock", 1)
+        response = self.client.get(reverse('authors'))
+        self.assertEqual(response['X-Page-Cache'], 'STALE')
+        self.assertNotContains(response, 'Doe, Jane')
+
+    def test_loans_only_invalidate_the_pages_showing_copies(self):
+        book = Book.objects.create(title='Book Title', summary='A little summary', isbn='ABCDERGTKWOEJ')
+        for name in ('authors', 'books'):
+            self.client.get(reverse(name))
+        self.client.get(book.get_absolute_url())
+        BookInstance.objects.create(book=book, imprint='Imprint', status='o')
+        self.assertEqual(self.client.get(reverse('authors'))['X-Page-Cache'], 'HIT')
+        self.assertEqual(self.client.get(reverse('books'))['X-Page-Cache'], 'MISS')
+        self.assertEqual(self.client.get(book.get_absolute_url())['X-Page-Cache'], 'MISS')
+
+        Review.objects.create(book=book, grade=8, content='Good')
+        self.assertEqual(self.client.get(reverse('books'))['X-Page-Cache'], 'HIT')
+        self.assertEqual(self.client.get(book.get_absolute_url())['X-Page-Cache'], 'MISS')
+
+    def test_authenticated_users_are_not_cached(self):
+        self.client.login(username='testuser1', password='oisam23ilne4')
+        self.client.get(reverse('authors'))
+        self.assertNotIn('X-Page-Cache', self.client.get(reverse('authors')))
+
+    def test_index_is_not_cached(self):
+        self.client.get(reverse('index'))
+        self.assertNotIn('X-Page-Cache', self.client.get(reverse('index')))
+
+
+@override_settings(
+    CATALOG_RATE_LIMITS={'authors': (0.001, 2)}, CATALOG_SHED_QUEUE_LATENCY_MS=500, CATALOG_PAGE_CACHE_TIMEOUT=0
+)
+class RateLimitMiddlewareTest(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = get_user_model().objects.create_user(username='testuser1', password='oisam23ilne4')
+        get_user_model().objects.create_user(username='staff', password='oismd23929ma', is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_client_is_limited_after_burst(self):
+        self.assertEqual(self.client.get(reverse('authors')).status_code, 200)
+        self.assertEqual(self.client.get(reverse('authors')).status_code, 200)
+        response = self.client.get(reverse('authors'))
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+    def test_clients_have_separate_buckets(self):
+        for _ in range(3):
+            self.client.get(reverse('authors'))
+        self.assertEqual(self.client.get(reverse('authors'), REMOTE_ADDR='10.0.0.2').status_code, 200)
+        self.client.login(username='testuser1', password='oisam23ilne4')
+        self.assertEqual(self.client.get(reverse('authors')).status_code, 200)
+
+    @override_settings(CATALOG_TRUSTED_PROXIES=1)
+    def test_clients_behind_the_proxy_have_separate_buckets(self):
+        def get(forwarded_for):
+            return self.client.get(reverse('authors'), REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR=forwarded_for)
+
+        for _ in range(2):
+            get('203.0.113.5')
+        self.assertEqual(get('203.0.113.5').status_code, 429)
+        # Addresses forged before the one added by the proxy are ignored.
+        self.assertEqual(get('198.51.100.7, 203.0.113.5').status_code, 429)
+        self.assertEqual(get('203.0.113.6').status_code, 200)
+
+    def test_concurrent_requests_are_all_counted(self):
+        middleware = RateLimitMiddleware(lambda request: None)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            allowed = list(executor.map(lambda _: middleware.consume('catalog:ratelimit:test', 0.001, 20), range(100)))
+        self.assertEqual(allowed.count(True), 20)
+
+    def test_views_without_limit_are_not_limited(self):
+        for _ in range(5):
+            self.assertEqual(self.client.get(reverse('books')).status_code, 200)
+
+    def test_staff_is_not_limited(self):
+        self.client.login(username='staff', password='oismd23929ma')
+        for _ in range(5):
+            self.assertEqual(self.client.get(reverse('authors')).status_code, 200)
+
+    def test_anonymous_list_pages_are_shed_when_queue_is_slow(self):
+        slow = {'HTTP_X_REQUEST_START': f't={time.time() - 0.8:.3f}'}
+        self.assertEqual(self.client.get(reverse('books'), **slow).status_code, 503)
+        # Only the list pages are shed at this latency.
+        self.assertEqual(self.client.get(reverse('index'), **slow).status_code, 200)
+
+        self.client.login(username='testuser1', password='oisam23ilne4')
+        self.assertEqual(self.client.get(reverse('books'), **slow).status_code, 200)
+
+    def test_fast_queue_is_not_shed(self):
+        fast = {'HTTP_X_REQUEST_START': f'{time.time() * 1000:.0f}'}
+        self.assertEqual(self.client.get(reverse('books'), **fast).status_code, 200)
+
+
+class ProfilingMiddlewareTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(CATALOG_PROFILING=True, CATALOG_PROFILE_ROOT=directory.name,
+                                              CATALOG_PROFILE_KEEP=2)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.staff = get_user_model().objects.create_user(username='staff', password='oismd23929ma', is_staff=True)
+        self.author = Author.objects.create(first_name='John', last_name='Smith')
+
+    def test_sampler_records_the_stacks_of_the_thread(self):
+        def busy_function():
+            end = time.perf_counter() + 0.05
+            while time.perf_counter() < end:
+                pass
+
+        sampler = profiling.StackSampler(interval=0.001).start()
+        busy_function()
+        stacks = sampler.stop()
+        self.assertTrue(any(stack.endswith('busy_function') for stack in stacks))
+
+    def test_staff_requests_are_profiled_on_demand(self):
+        url = reverse('author-detail', args=[self.author.pk])
+        self.assertNotIn('X-Profile-Capture', self.client.get(url, headers={'X-Profile': '1'}))
+        self.client.login(username='staff', password='oismd23929ma')
+        self.assertNotIn('X-Profile-Capture', self.client.get(url))
+        names = [self.client.get(url, headers={'X-Profile': '1'})['X-Profile-Capture'] for _ in range(3)]
+        self.assertEqual(profiling.list_captures(), [('author-detail', names[:0:-1])])
+
+        response = self.client.get(reverse('profiles'))
+        self.assertContains(response, names[-1])
+        response = self.client.get(reverse('profile-stacks', args=['author-detail']), {'capture': names[-1]})
+        self.assertEqual(response['Content-Type'], 'text/plain')
+        self.assertEqual(
+            self.client.get(reverse('profile-stacks', args=['author-detail']), {'capture': '../x'}).status_code, 404
+        )
+
+    def test_sample_rate(self):
+        with override_settings(CATALOG_PROFILE_SAMPLE_RATE=1.0):
+            response = self.client.get(reverse('author-detail', args=[self.author.pk]))
+        self.assertIn('X-Profile-Capture', response)
+
+    def test_profile_pages_are_for_staff_only(self):
+        self.assertEqual(self.client.get(reverse('profiles')).status_code, 302)
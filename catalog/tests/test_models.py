@@ -1,6 +1,11 @@
+import time
+import uuid
+
 from django.test import TestCase
+from django.urls import reverse
 
-from catalog.models import Author
+from catalog.models import Author, Book, BookInstance
+from catalog.utils import sort_key, uuid7
 
 """ EXAMPLE:
 class YourTestClass(TestCase):
@@ -59,3 +64,49 @@ class AuthorModelTest(TestCase):
     def test_content_meta(self):
         author = Author.objects.get(id=1)
         print(author._meta.get_field('first_name'))
+
+
+class BookInstanceIdTest(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.book = Book.objects.create(title='Book Title', summary='A little summary', isbn='ABCDERGTKWOEJ')
+
+    def test_uuid7_version_and_variant(self):
+        value = uuid7()
+        self.assertEqual(value.version, 7)
+        self.assertEqual(value.variant, uuid.RFC_4122)
+
+    def test_uuid7_is_time_ordered(self):
+        first = uuid7()
+        time.sleep(0.002)
+        self.assertLess(first, uuid7())
+
+    def test_new_copies_get_time_ordered_ids(self):
+        copy = BookInstance.objects.create(book=self.book, imprint='Unlikely Imprint, 2016')
+        self.assertEqual(copy.id.version, 7)
+
+    def test_existing_random_ids_are_still_valid(self):
+        copy = BookInstance.objects.create(id=uuid.uuid4(), book=self.book, imprint='Unlikely Imprint, 2016')
+        self.assertEqual(BookInstance.objects.get(pk=copy.pk), copy)
+        self.assertEqual(reverse('renew-book-librarian', kwargs={'pk': copy.pk}), f'/catalog/book/{copy.pk}/renew/')
+
+
+class SortKeyTest(TestCase):
+    def test_folds_case_and_accents(self):
+        self.assertEqual(sort_key('Ávila'), 'avila')
+        self.assertEqual(sort_key(' Straße '), 'strasse')
+
+    def test_authors_sort_regardless_of_case_and_accents(self):
+        for last_name in ('Azimov', 'Ávila', 'austen', 'Böll', 'Brontë'):
+            Author.objects.create(first_name='Test', last_name=last_name)
+        self.assertEqual(
+            list(Author.objects.values_list('last_name', flat=True)),
+            ['austen', 'Ávila', 'Azimov', 'Böll', 'Brontë'],
+        )
+
+    def test_keys_follow_renames(self):
+        book = Book.objects.create(title='Book Title', summary='A little summary', isbn='ABCDERGTKWOEJ')
+        book.title = 'Élan'
+        book.save(update_fields=['title'])
+        book.refresh_from_db()
+        self.assertEqual(book.title_key, 'elan')
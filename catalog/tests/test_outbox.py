@@ -0,0 +1,128 @@
+import datetime
+
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db.models.signals import post_save
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog import outbox
+from catalog.models import Book, BookInstance, ChangeEvent, Genre, OutboxCursor
+from catalog.reviews import import_reviews
+
+
+class OutboxTest(TestCase):
+    def setUp(self):
+        self.genre = Genre.objects.create(name='Fantasy')
+        self.book = Book.objects.create(title='Book Title', summary='A little summary', isbn='ABCDERGTKWOEJ')
+        self.start = int(outbox.latest_token())
+        self.addCleanup(outbox.registry.clear)
+        self.addCleanup(outbox.backoff.clear)
+
+    def events(self):
+        return [(event.model, event.object_id, event.action) for event in ChangeEvent.objects.filter(id__gt=self.start)]
+
+    def test_changes_are_recorded(self):
+        self.book.genre.add(self.genre)
+        self.genre.book_set.clear()
+        copy = BookInstance.objects.create(book=self.book, imprint='Imprint')
+        copy_id, book_id = str(copy.pk), str(self.book.pk)
+        copy.delete()
+        self.assertEqual(self.events(), [
+            ('book', book_id, 's'), ('book', book_id, 's'),
+            ('bookinstance', copy_id, 's'), ('bookinstance', copy_id, 'd'),
+        ])
+
+    def test_failed_save_rolls_back_its_event(self):
+        def fail(sender, **kwargs):
+            raise RuntimeError('Worker crashed')
+
+        post_save.connect(fail, sender=Book)
+        self.addCleanup(post_save.disconnect, fail, sender=Book)
+        with self.assertRaises(RuntimeError):
+            Book.objects.create(title='Lost Title', summary='A little summary', isbn='ABCDERGTKWOEK')
+        self.assertFalse(Book.objects.filter(title='Lost Title').exists())
+        self.assertEqual(self.events(), [])
+
+    def test_bulk_imports_are_recorded(self):
+        import_reviews([{'isbn': 'ABCDERGTKWOEJ', 'grade': '7', 'content': 'Good'}])
+        self.assertEqual([model for model, _, _ in self.events()], ['review'])
+
+    def test_changes_since_collapses_events(self):
+        self.book.genre.add(self.genre)
+        self.book.title = 'New Title'
+        self.book.save()
+        borrower = get_user_model().objects.create_user(username='testuser1', password='oisam23ilne4')
+        copy = BookInstance.objects.create(book=self.book, imprint='Imprint', borrower=borrower, status='o',
+                                           due_back=datetime.date(2026, 1, 1))
+        deleted = Genre.objects.create(name='Horror')
+        deleted.delete()
+
+        feed = outbox.changes_since(self.start)
+        self.assertEqual(
+            [(change['model'], change['deleted']) for change in feed['changes']],
+            [('book', False), ('bookinstance', False), ('genre', True)],
+        )
+        book, copy_change = feed['changes'][0]['data'], feed['changes'][1]['data']
+        self.assertEqual((book['title'], book['genre']), ('New Title', [self.genre.pk]))
+        self.assertNotIn('title_key', book)
+        self.assertEqual((copy_change['status'], copy_change['book']), ('o', self.book.pk))
+        self.assertNotIn('borrower', copy_change)
+        self.assertEqual(feed['next'], outbox.latest_token())
+        self.assertFalse(feed['more'])
+
+    def test_changes_view(self):
+        response = self.client.get(reverse('changes'))
+        self.assertEqual(response.json(), {'changes': [], 'next': outbox.latest_token(), 'more': False})
+
+        self.book.save()
+        response = self.client.get(reverse('changes'), {'since': self.start})
+        self.assertEqual(response.json()['changes'][0]['id'], str(self.book.pk))
+        self.assertEqual(self.client.get(reverse('changes'), {'since': 'abc'}).status_code, 400)
+
+        outbox.purge_events(older_than=datetime.timedelta(0))
+        self.assertFalse(ChangeEvent.objects.exists())
+        self.assertEqual(self.client.get(reverse('changes'), {'since': self.start}).status_code, 410)
+
+    def test_consumers_process_new_events_once(self):
+        seen = []
+
+        @outbox.consumer(name='test', batch_size=2)
+        def collect(events):
+            seen.extend(event.object_id for event in events)
+
+        for number in range(3):
+            Genre.objects.create(name=f'Genre {number}')
+        self.assertEqual(outbox.process_outbox(), ({'test': ChangeEvent.objects.count()}, {}))
+        self.assertEqual(outbox.process_outbox(), ({'test': 0}, {}))
+        self.assertEqual(len(seen), ChangeEvent.objects.count())
+        self.assertEqual(OutboxCursor.objects.get(name='test').position, ChangeEvent.objects.last().pk)
+
+    def test_failing_consumer_keeps_its_position(self):
+        @outbox.consumer(name='failing')
+        def fail(events):
+            raise RuntimeError('Index is down')
+
+        seen = []
+
+        @outbox.consumer(name='working')
+        def collect(events):
+            seen.extend(events)
+
+        with self.assertLogs('catalog.outbox', 'ERROR'):
+            counts, failures = outbox.process_outbox()
+        # The other consumers still run.
+        self.assertEqual(counts, {'working': ChangeEvent.objects.count()})
+        self.assertIsInstance(failures['failing'], RuntimeError)
+        self.assertFalse(OutboxCursor.objects.filter(name='failing', position__gt=0).exists())
+        # Left out until its backoff expires.
+        self.assertEqual(outbox.process_outbox(), ({'working': 0}, {}))
+        # process_outbox --once reports it.
+        outbox.backoff.clear()
+        with self.assertRaisesMessage(CommandError, 'failing'), self.assertLogs('catalog.outbox', 'ERROR'):
+            call_command('process_outbox', once=True, stdout=StringIO())
+        # Events not processed by every consumer are kept.
+        OutboxCursor.objects.create(name='failing')
+        self.assertEqual(outbox.purge_events(older_than=datetime.timedelta(0)), 0)
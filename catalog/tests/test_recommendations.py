@@ -0,0 +1,67 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+
+from catalog.models import Author, Book, BookInstance, BookRecommendation
+from catalog.recommendations import build_cooccurrence, build_recommendations
+
+User = get_user_model()
+
+
+class BuildRecommendationsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.books = [
+            Book.objects.create(title=f'Book {i}', summary='Summary', isbn=f'{i:013d}', author=author)
+            for i in range(4)
+        ]
+
+        # Book 0 and book 1 are borrowed together by three users, book 0 and book 2 only by one of them.
+        borrowed = {
+            'user1': [0, 1, 2],
+            'user2': [0, 1],
+            'user3': [0, 1, 1],
+            'user4': [3],
+        }
+        for username, book_indexes in borrowed.items():
+            user = User.objects.create_user(username=username, password='oisam23ilne4')
+            for index in book_indexes:
+                BookInstance.objects.create(book=cls.books[index], imprint='Imprint', borrower=user, status='o')
+
+    def test_most_borrowed_together_is_first(self):
+        build_recommendations(top_k=5)
+        neighbours = list(
+            BookRecommendation.objects.filter(book=self.books[0]).values_list('recommended', flat=True)
+        )
+        self.assertEqual(neighbours, [self.books[1].id, self.books[2].id])
+
+    def test_small_chunks_give_same_result(self):
+        build_recommendations(top_k=5)
+        expected = list(BookRecommendation.objects.values_list('book', 'recommended', 'rank', 'score'))
+        build_recommendations(top_k=5, chunk_size=2)
+        self.assertEqual(list(BookRecommendation.objects.values_list('book', 'recommended', 'rank', 'score')), expected)
+
+    def test_merged_buffers_give_same_matrix(self):
+        keys, counts, popularity, width = build_cooccurrence()
+        merged = build_cooccurrence(chunk_size=2, buffer_size=1)
+        self.assertEqual(merged[0].tolist(), keys.tolist())
+        self.assertEqual(merged[1].tolist(), counts.tolist())
+        self.assertEqual(merged[2].tolist(), popularity.tolist())
+
+    def test_top_k_limits_neighbours(self):
+        build_recommendations(top_k=1)
+        self.assertEqual(BookRecommendation.objects.filter(book=self.books[0]).count(), 1)
+
+    def test_book_without_co_borrowers_has_no_recommendations(self):
+        build_recommendations()
+        self.assertFalse(BookRecommendation.objects.filter(book=self.books[3]).exists())
+
+    def test_detail_view_shows_recommendations(self):
+        build_recommendations()
+        response = self.client.get(reverse('book-detail', args=[self.books[0].id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [r.recommended for r in response.context['recommendations']], [self.books[1], self.books[2]]
+        )
+        self.assertContains(response, 'Readers also borrowed')
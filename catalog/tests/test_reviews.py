@@ -0,0 +1,99 @@
+import datetime
+import io
+import tempfile
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog.models import Book, Review
+from catalog.reviews import import_reviews, review_page
+
+
+class ReviewPageTest(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.book = Book.objects.create(title='Book Title', summary='A little summary', isbn='ABCDERGTKWOEJ')
+        other_book = Book.objects.create(title='Other Title', summary='A little summary', isbn='ABCDERGTKWOEK')
+        now = timezone.now()
+        # Pairs of reviews published at the same time, so pages also have to split on the id.
+        cls.reviews = [
+            Review.objects.create(
+                book=cls.book, publish_date=now - datetime.timedelta(days=index // 2), grade=5, content=f'Review {index}'
+            )
+            for index in range(25)
+        ]
+        Review.objects.create(book=other_book, publish_date=now, grade=5, content='Other book')
+        Review.objects.create(book=cls.book, publish_date=None, grade=5, content='Unpublished')
+
+    def test_pages_cover_every_published_review_once(self):
+        seen, cursor = [], None
+        while True:
+            reviews, cursor = review_page(self.book.review_set.all(), cursor=cursor)
+            seen.extend(reviews)
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(set(seen), set(self.reviews))
+        keys = [(review.publish_date, review.pk) for review in seen]
+        self.assertEqual(keys, sorted(keys, reverse=True))
+
+    def test_pages_before_1970(self):
+        old_book = Book.objects.create(title='Old Title', summary='A little summary', isbn='ABCDERGTKWOEL')
+        published = datetime.datetime(1960, 5, 1, tzinfo=datetime.timezone.utc)
+        old_reviews = [
+            Review.objects.create(book=old_book, publish_date=published, grade=5, content=f'Review {index}')
+            for index in range(3)
+        ]
+        reviews, cursor = review_page(old_book.review_set.all(), size=2)
+        self.assertEqual(reviews, old_reviews[:0:-1])
+        self.assertEqual(review_page(old_book.review_set.all(), cursor=cursor, size=2), ([old_reviews[0]], None))
+
+    def test_invalid_cursor_starts_from_the_beginning(self):
+        first_page, _ = review_page(self.book.review_set.all())
+        self.assertEqual(review_page(self.book.review_set.all(), cursor='nonsense')[0], first_page)
+
+    def test_detail_view_shows_one_page(self):
+        response = self.client.get(reverse('book-detail', args=[self.book.pk]))
+        self.assertEqual(len(response.context['reviews']), 10)
+        self.assertNotContains(response, 'Other book')
+        response = self.client.get(
+            reverse('book-detail', args=[self.book.pk]) + f"?reviews_after={response.context['next_reviews']}"
+        )
+        self.assertEqual(len(response.context['reviews']), 10)
+
+    def test_latest_reviews(self):
+        response = self.client.get(reverse('reviews'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['review_list']), 10)
+        self.assertContains(response, 'Other book')
+        self.assertNotContains(response, 'Unpublished')
+
+
+class ImportReviewsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.book = Book.objects.create(title='Book Title', summary='A little summary', isbn='ABCDERGTKWOEJ')
+
+    def test_import_skips_invalid_rows(self):
+        rows = [
+            {'isbn': 'ABCDERGTKWOEJ', 'publish_date': '2024-01-02', 'grade': '7.5', 'content': 'Good'},
+            {'isbn': 'ABCDERGTKWOEJ', 'publish_date': '', 'grade': '3', 'content': 'Meh'},
+            {'isbn': 'UNKNOWN', 'publish_date': '', 'grade': '3', 'content': 'Lost'},
+            {'isbn': 'ABCDERGTKWOEJ', 'publish_date': '', 'grade': '11', 'content': 'Too good'},
+            {'isbn': 'ABCDERGTKWOEJ', 'publish_date': 'yesterday', 'grade': '3', 'content': 'Bad date'},
+        ]
+        imported, errors = import_reviews(rows, batch_size=2)
+        self.assertEqual(imported, 2)
+        self.assertEqual([number for number, _ in errors], [3, 4, 5])
+        self.assertEqual(sorted(self.book.review_set.values_list('content', flat=True)), ['Good', 'Meh'])
+
+    def test_command_reads_csv(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as file:
+            file.write('isbn,publish_date,grade,content\nABCDERGTKWOEJ,2024-01-02T10:00:00,8,"Nice, really"\n')
+            file.flush()
+            output = io.StringIO()
+            call_command('import_reviews', file.name, stdout=output)
+        self.assertIn('Imported 1 reviews', output.getvalue())
+        self.assertEqual(self.book.review_set.get().content, 'Nice, really')
@@ -0,0 +1,77 @@
+import os
+import tempfile
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog.models import Author, Book, Genre, SimilarBook
+from catalog.similarity import build_similar_books, tokenize
+from catalog.taskqueue import run_due_tasks
+
+
+class TokenizeTest(TestCase):
+    def test_skips_stop_words_numbers_and_short_words(self):
+        self.assertEqual(tokenize('The Dragon of 1984 and a Wizard'), ['dragon', 'wizard'])
+
+
+class BuildSimilarBooksTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        settings_override = override_settings(
+            CATALOG_SIMILARITY_INDEX=os.path.join(self.directory.name, 'similar_books.npz')
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        fantasy = Genre.objects.create(name='Fantasy')
+        self.dragons = Book.objects.create(
+            title='Dragons of the North', summary='A young wizard tames dragons in a frozen kingdom.',
+            isbn='0000000000001', author=author,
+        )
+        self.dragons.genre.add(fantasy)
+        self.more_dragons = Book.objects.create(
+            title='The Last Dragon', summary='An old wizard hunts the last dragon of the kingdom.',
+            isbn='0000000000002', author=author,
+        )
+        self.more_dragons.genre.add(fantasy)
+        self.cooking = Book.objects.create(
+            title='Cooking Pasta', summary='Recipes for fresh pasta and tomato sauces.',
+            isbn='0000000000003', author=author,
+        )
+
+    def test_closest_book_shares_most_terms(self):
+        build_similar_books()
+        neighbours = SimilarBook.objects.filter(book=self.dragons).values_list('similar', flat=True)
+        self.assertEqual(neighbours[0], self.more_dragons.pk)
+        self.assertNotIn(self.dragons.pk, neighbours)
+
+    def test_books_without_shared_terms_are_not_similar(self):
+        build_similar_books()
+        self.assertFalse(SimilarBook.objects.filter(book=self.cooking).exists())
+
+    def test_saving_a_book_refreshes_its_neighbours(self):
+        build_similar_books()
+        self.cooking.summary = 'A wizard cooks dragon steaks in the kingdom.'
+        self.cooking.save()
+        run_due_tasks()
+        neighbours = SimilarBook.objects.filter(book=self.cooking).values_list('similar', flat=True)
+        self.assertIn(self.dragons.pk, neighbours)
+
+    def test_saving_without_index_does_nothing(self):
+        self.cooking.save()
+        run_due_tasks()
+        self.assertFalse(SimilarBook.objects.exists())
+
+    def test_json_view(self):
+        build_similar_books()
+        response = self.client.get(reverse('book-similar-json', args=[self.dragons.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['similar'][0]['id'], self.more_dragons.pk)
+        self.assertEqual(response.json()['similar'][0]['url'], self.more_dragons.get_absolute_url())
+
+    def test_detail_view_shows_similar_books(self):
+        build_similar_books()
+        response = self.client.get(reverse('book-detail', args=[self.dragons.pk]))
+        self.assertContains(response, 'Similar books')
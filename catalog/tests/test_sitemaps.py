@@ -0,0 +1,63 @@
+import os
+import tempfile
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog.models import Author, Book
+from catalog.sitemaps import build_sitemaps
+
+
+class BuildSitemapsTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        settings_override = override_settings(
+            CATALOG_SITEMAP_ROOT=self.directory.name, CATALOG_SITE_URL='https://library.example.com'
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.author = Author.objects.create(first_name='John', last_name='Smith')
+        self.books = [
+            Book.objects.create(title=f'Book {i}', summary='Summary', isbn=f'{i:013d}', author=self.author)
+            for i in range(5)
+        ]
+
+    def read(self, name):
+        with open(os.path.join(self.directory.name, name)) as file:
+            return file.read()
+
+    def shard(self, book):
+        return f'books-{(book.pk - 1) // 2:05d}.xml'
+
+    def test_shards_index_and_feed(self):
+        build_sitemaps(shard_size=2)
+        index = self.read('sitemap.xml')
+        for book in self.books:
+            self.assertIn(f'https://library.example.com/sitemaps/{self.shard(book)}', index)
+            self.assertIn(f'https://library.example.com{book.get_absolute_url()}', self.read(self.shard(book)))
+        self.assertIn(self.author.get_absolute_url(), self.read('authors-00000.xml'))
+        self.assertIn('Book 4', self.read('new-books.atom'))
+
+    def test_only_changed_shards_are_rewritten(self):
+        build_sitemaps(shard_size=2)
+        self.assertEqual(build_sitemaps(shard_size=2), 0)
+
+        first = self.books[0]
+        url, shard = first.get_absolute_url(), self.shard(first)
+        first.delete()
+        # The shard of the deleted book, the index and the feed (it lists the newest books).
+        self.assertEqual(build_sitemaps(shard_size=2), 3)
+        self.assertNotIn(url, self.read(shard))
+
+    def test_files_are_served_with_cache_headers(self):
+        build_sitemaps(shard_size=2)
+        response = self.client.get(reverse('sitemap-index'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('max-age=3600', response['Cache-Control'])
+        response = self.client.get(reverse('new-books-feed'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('new-books-feed'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get(reverse('sitemap-file', args=['manifest.json'])).status_code, 404)
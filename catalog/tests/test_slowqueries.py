@@ -0,0 +1,62 @@
+import io
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog.models import Book, SlowQuery
+from catalog.slowqueries import SlowQueryRecorder, normalize
+
+
+class SlowQueryTest(TestCase):
+    # The overdue report reads the copies of every branch database.
+    databases = {'default', *settings.CATALOG_BRANCH_DATABASES.values()}
+
+    def test_normalize(self):
+        self.assertEqual(
+            normalize('SELECT "id" FROM "book"\n WHERE "title" LIKE %s AND "id" IN (%s, %s, %s) LIMIT 21'),
+            'SELECT "id" FROM "book" WHERE "title" LIKE ? AND "id" IN (...) LIMIT ?',
+        )
+        self.assertEqual(normalize("SELECT 'it''s' , 3.5"), 'SELECT ? , ?')
+
+    def test_queries_are_grouped_by_fingerprint(self):
+        recorder = SlowQueryRecorder(threshold=0)
+        with recorder.installed():
+            for pk in (1, 2):
+                list(Book.objects.filter(pk__in=[pk, pk + 1], title__icontains='The'))
+            Book.objects.create(title='Book Title', summary='A little summary', isbn='ABCDERGTKWOEJ')
+        recorder.save('books')
+
+        select = SlowQuery.objects.get(sql__startswith='SELECT')
+        self.assertEqual((select.count, select.view, select.database), (2, 'books', 'default'))
+        self.assertIn('catalog_book', select.plan)
+        self.assertEqual(SlowQuery.objects.get(sql__startswith='INSERT INTO "catalog_book"').plan, '')
+
+    @override_settings(CATALOG_SLOW_QUERY_MS=0.001)
+    def test_middleware_records_the_view(self):
+        self.client.get(reverse('index'))
+        self.assertTrue(SlowQuery.objects.filter(view='index', sql__contains='LIKE').exists())
+
+        output = io.StringIO()
+        call_command('slow_queries', '--plans', '--view', 'index', '--order', 'mean', stdout=output)
+        self.assertIn('LIKE', output.getvalue())
+        call_command('slow_queries', '--reset', stdout=io.StringIO())
+        self.assertFalse(SlowQuery.objects.exists())
+
+    @override_settings(CATALOG_SLOW_QUERY_MS=0.001)
+    def test_middleware_times_streaming_responses(self):
+        librarian = get_user_model().objects.create_user(username='librarian', password='oismd23929ma')
+        librarian.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+        self.client.login(username='librarian', password='oismd23929ma')
+        response = self.client.get(reverse('overdue-report'))
+        # The loans are read while the content is iterated.
+        self.assertFalse(SlowQuery.objects.filter(sql__contains='FROM "catalog_bookinstance"').exists())
+        b''.join(response.streaming_content)
+        # One per database holding copies.
+        loans = SlowQuery.objects.filter(sql__contains='FROM "catalog_bookinstance"')
+        self.assertTrue(loans.exists())
+        self.assertEqual({query.view for query in loans}, {'overdue-report'})
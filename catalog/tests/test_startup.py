@@ -0,0 +1,45 @@
+import os
+import subprocess
+
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+from django.urls import get_resolver
+
+from catalog.management.commands.startup_report import Command, boot_command
+from catalog.warmup import HOT_TEMPLATES, warm_templates, warm_url_resolver
+
+
+class WorkerBootTest(SimpleTestCase):
+    def test_heavy_optional_modules_are_not_imported_at_boot(self):
+        command = boot_command()
+        command[1:1] = ['-X', 'importtime']
+        result = subprocess.run(command, capture_output=True, text=True, cwd=settings.BASE_DIR)
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+        modules = Command.parse(result.stderr)
+        self.assertIn('catalog.views', modules)
+        for name in ('numpy', 'jinja2', 'fpdf', 'pypdf'):
+            self.assertNotIn(name, modules)
+
+
+class WarmWorkerTest(SimpleTestCase):
+    @override_settings(CATALOG_JINJA2_VIEWS=[])
+    def test_jinja2_is_not_imported_unless_used(self):
+        self.assertEqual(warm_templates(), len(HOT_TEMPLATES))
+        command = boot_command()
+        command[-1] += (
+            '\nfrom catalog.warmup import warm_worker\nwarm_worker()\nimport sys\nprint("jinja2" in sys.modules)\n'
+        )
+        result = subprocess.run(command, capture_output=True, text=True, cwd=settings.BASE_DIR,
+                                env={**os.environ, 'CATALOG_JINJA2_VIEWS': ''})
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.split(), ['False'])
+
+    @override_settings(CATALOG_JINJA2_VIEWS=['books'])
+    def test_hot_templates_are_loaded_in_both_engines(self):
+        # The Jinja2 engine has no index.html port.
+        self.assertEqual(warm_templates(), len(HOT_TEMPLATES) * 2 - 1)
+
+    def test_url_resolver_is_warmed(self):
+        warm_url_resolver()
+        self.assertIn('book-detail', get_resolver().reverse_dict)
@@ -0,0 +1,119 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.core import mail
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog.models import Book, BookInstance, Task
+from catalog.taskqueue import claim_next_task, purge_finished_tasks, run_due_tasks, task
+
+calls = []
+
+
+@task(max_attempts=2)
+def record_call(value):
+    calls.append(value)
+
+
+@task(max_attempts=2)
+def always_fail():
+    raise RuntimeError('Boom')
+
+
+class TaskQueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_delay_queues_the_task(self):
+        queued = record_call.delay('a')
+        self.assertEqual(queued.status, 'q')
+        self.assertEqual(calls, [])
+
+        self.assertEqual(run_due_tasks(), 1)
+        self.assertEqual(calls, ['a'])
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, 'd')
+
+    @override_settings(CATALOG_TASKS_EAGER=True)
+    def test_eager_mode_runs_immediately(self):
+        record_call.delay('b')
+        self.assertEqual(calls, ['b'])
+        self.assertFalse(Task.objects.exists())
+
+    def test_failing_task_is_retried_later_then_marked_as_failed(self):
+        queued = always_fail.delay()
+        run_due_tasks()
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('q', 1))
+        self.assertIn('Boom', queued.last_error)
+        self.assertGreater(queued.run_at, timezone.now())
+
+        # The retry is not due yet.
+        self.assertEqual(run_due_tasks(), 0)
+
+        Task.objects.filter(pk=queued.pk).update(run_at=timezone.now())
+        run_due_tasks()
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('f', 2))
+
+    def test_claimed_task_is_not_claimed_twice(self):
+        record_call.delay('c')
+        self.assertIsNotNone(claim_next_task())
+        self.assertIsNone(claim_next_task())
+
+    def test_tasks_of_a_crashed_worker_are_run_again(self):
+        record_call.delay('d')
+        claim_next_task()
+        Task.objects.update(locked_until=timezone.now() - datetime.timedelta(seconds=1))
+        run_due_tasks()
+        self.assertEqual(calls, ['d'])
+
+    def test_task_killing_its_worker_is_not_retried_forever(self):
+        queued = record_call.delay('e')
+        for attempt in (1, 2):
+            # The worker dies while running the task.
+            self.assertEqual(claim_next_task().attempts, attempt)
+            Task.objects.update(locked_until=timezone.now() - datetime.timedelta(seconds=1))
+        self.assertIsNone(claim_next_task())
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('f', 2))
+        self.assertEqual(calls, [])
+
+    def test_purge_keeps_recently_finished_tasks(self):
+        old, recent = record_call.delay('f'), record_call.delay('g')
+        Task.objects.update(run_at=timezone.now() - datetime.timedelta(days=30))
+        run_due_tasks()
+        Task.objects.filter(pk=old.pk).update(finished_at=timezone.now() - datetime.timedelta(days=8))
+        self.assertEqual(purge_finished_tasks(), 1)
+        self.assertEqual(list(Task.objects.values_list('pk', flat=True)), [recent.pk])
+
+
+class RenewalNoticeTest(TestCase):
+    def setUp(self):
+        librarian = get_user_model().objects.create_user(username='librarian', password='oismd23929ma')
+        librarian.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+        borrower = get_user_model().objects.create_user(
+            username='borrower', password='oisam23ilne4', email='borrower@example.com'
+        )
+        book = Book.objects.create(title='Book Title', summary='A little summary', isbn='ABCDERGTKWOEJ')
+        self.book_instance = BookInstance.objects.create(
+            book=book, imprint='Unlikely Imprint, 2016', borrower=borrower, status='o',
+            due_back=datetime.date.today() + datetime.timedelta(days=5),
+        )
+
+    def test_renewal_email_is_sent_by_the_worker(self):
+        self.client.login(username='librarian', password='oismd23929ma')
+        response = self.client.post(
+            reverse('renew-book-librarian', kwargs={'pk': self.book_instance.pk}),
+            {'renewal_date': datetime.date.today() + datetime.timedelta(weeks=2)},
+        )
+        self.assertRedirects(response, reverse('all-borrowed'))
+        self.assertEqual(len(mail.outbox), 0)
+
+        run_due_tasks()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['borrower@example.com'])
+        self.assertIn('Book Title', mail.outbox[0].subject)
@@ -0,0 +1,52 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog import typeahead
+from catalog.models import Author, Book
+
+
+@override_settings(CATALOG_TYPEAHEAD_REFRESH_INTERVAL=0)
+class TypeaheadTest(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.tolkien = Author.objects.create(first_name='J.R.R.', last_name='Tolkien')
+        cls.hobbit = Book.objects.create(title='The Hobbit', summary='Summary', isbn='0000000000001', author=cls.tolkien)
+        cls.rings = Book.objects.create(title='The Lord of the Rings', summary='Summary', isbn='0000000000002')
+        cls.avila = Book.objects.create(title='Ávila', summary='Summary', isbn='0000000000003')
+
+    def setUp(self):
+        typeahead.reset_index()
+        self.addCleanup(typeahead.reset_index)
+
+    def suggest(self, text):
+        return typeahead.suggest(text)
+
+    def test_prefix_suggestions(self):
+        self.assertEqual(self.suggest('the')['books'], [(self.hobbit.pk, 'The Hobbit'),
+                                                        (self.rings.pk, 'The Lord of the Rings')])
+        self.assertEqual(self.suggest('AVI')['books'], [(self.avila.pk, 'Ávila')])
+        self.assertEqual(self.suggest('tolkien j')['authors'], [(self.tolkien.pk, 'Tolkien, J.R.R.')])
+        self.assertEqual(self.suggest('  '), {'books': [], 'authors': []})
+        self.assertEqual(typeahead.suggest('the', limit=1)['books'], [(self.hobbit.pk, 'The Hobbit')])
+
+    def test_changes_reach_the_index_without_rebuilding_it(self):
+        index = typeahead.get_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hobbit.title = 'There and Back Again'
+            self.hobbit.save()
+            self.rings.delete()
+            added = Book.objects.create(title='The Silmarillion', summary='Summary', isbn='0000000000004')
+        self.assertEqual(self.suggest('the')['books'], [(added.pk, 'The Silmarillion'),
+                                                        (self.hobbit.pk, 'There and Back Again')])
+        self.assertIs(typeahead.get_index(), index)
+
+    def test_suggest_view(self):
+        typeahead.get_index()
+        # Once the index is built, suggestions do not query the database.
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('suggest'), {'q': 'tol'})
+        self.assertEqual(response.json(), {
+            'books': [],
+            'authors': [{'id': self.tolkien.pk, 'name': 'Tolkien, J.R.R.',
+                         'url': reverse('author-detail', args=[self.tolkien.pk])}],
+        })
@@ -1,7 +1,8 @@
 import datetime
 import uuid
 
-from django.test import TestCase
+from django.conf import settings
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.utils import timezone
 from django.contrib.auth import get_user_model
@@ -49,6 +50,92 @@ class AuthorListViewTest(TestCase):
         self.assertEqual(len(response.context['author_list']), 2)
         
         
+class InitialJumpTest(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        for last_name in ('Adams', 'Asimov', 'Ávila', 'Bradbury', 'Clarke', 'Christie', 'Dick'):
+            Author.objects.create(first_name='Test', last_name=last_name)
+
+    def test_letters_link_to_the_page_they_start_on(self):
+        # A (3), B (1) and C (2) come before D: D starts on the 2nd page of 5 authors.
+        response = self.client.get(reverse('authors') + '?letter=D')
+        self.assertRedirects(response, reverse('authors') + '?page=2')
+        response = self.client.get(reverse('authors') + '?letter=b')
+        self.assertRedirects(response, reverse('authors') + '?page=1')
+
+    def test_bar_shows_counts_per_letter(self):
+        response = self.client.get(reverse('authors'))
+        initials = dict(response.context['initials'])
+        self.assertEqual((initials['A'], initials['C'], initials['Z']), (3, 2, 0))
+        self.assertContains(response, '?letter=A')
+        self.assertNotContains(response, '?letter=Z')
+
+
+class FacetedBookListTest(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.smith = Author.objects.create(first_name='John', last_name='Smith')
+        cls.jones = Author.objects.create(first_name='Jane', last_name='Jones')
+        cls.fantasy = Genre.objects.create(name='Fantasy')
+        cls.poetry = Genre.objects.create(name='Poetry')
+        cls.english = Language.objects.create(name='English')
+        cls.dragons = Book.objects.create(title='Dragons', summary='Summary', isbn='0000000000001', author=cls.smith)
+        cls.dragons.genre.add(cls.fantasy)
+        cls.dragons.language.add(cls.english)
+        cls.poems = Book.objects.create(title='Poems', summary='Summary', isbn='0000000000002', author=cls.jones)
+        cls.poems.genre.add(cls.fantasy, cls.poetry)
+        BookInstance.objects.create(book=cls.poems, imprint='Unlikely Imprint, 2016', status='a')
+        BookInstance.objects.create(book=cls.dragons, imprint='Unlikely Imprint, 2016', status='o')
+
+    def facet(self, response, name):
+        facet = next(facet for facet in response.context['facets'] if facet['name'] == name)
+        return {option['label']: option['count'] for option in facet['options']}
+
+    def test_filters(self):
+        for query, expected in (
+            (f'?genre={self.poetry.pk}', [self.poems]),
+            (f'?language={self.english.pk}', [self.dragons]),
+            (f'?author={self.smith.pk}', [self.dragons]),
+            ('?available=1', [self.poems]),
+            (f'?genre={self.fantasy.pk}&available=1', [self.poems]),
+            ('?genre=nonsense', [self.dragons, self.poems]),
+        ):
+            with self.subTest(query=query):
+                response = self.client.get(reverse('books') + query)
+                self.assertEqual(list(response.context['book_list']), expected)
+
+    def test_facet_counts_follow_the_filters(self):
+        response = self.client.get(reverse('books'))
+        self.assertEqual(self.facet(response, 'genre'), {'Fantasy': 2, 'Poetry': 1})
+        self.assertEqual(self.facet(response, 'available'), {'Available now': 1})
+
+        response = self.client.get(reverse('books') + f'?author={self.smith.pk}')
+        self.assertEqual(self.facet(response, 'genre'), {'Fantasy': 1})
+        self.assertEqual(self.facet(response, 'language'), {'English': 1})
+        self.assertEqual(self.facet(response, 'available'), {'Available now': 0})
+
+    def test_facet_counts_take_one_query_per_facet(self):
+        # Books count and page, then one query per facet (genre, language, author and availability).
+        with self.assertNumQueries(6):
+            self.client.get(reverse('books') + f'?genre={self.fantasy.pk}')
+
+    def test_option_links_toggle_the_filter(self):
+        response = self.client.get(reverse('books') + f'?genre={self.fantasy.pk}&page=1')
+        facet = next(facet for facet in response.context['facets'] if facet['name'] == 'genre')
+        fantasy, poetry = facet['options']
+        self.assertTrue(fantasy['selected'])
+        self.assertEqual(fantasy['url'], '?')
+        self.assertEqual(poetry['url'], f'?genre={self.poetry.pk}')
+        self.assertNotIn('initials', response.context)
+
+    def test_genre_detail(self):
+        response = self.client.get(self.poetry.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'catalog/genre_detail.html')
+        self.assertContains(response, 'Poems')
+        self.assertNotContains(response, 'Dragons')
+
+
 class LoanedBookInstancesByUserListViewTest(TestCase):
     def setUp(self) -> None:
         # Create two users
@@ -308,4 +395,64 @@ class RenewBookInstancesViewTest(TestCase):
         )
         self.assertEqual(response.status_code, 200)
         self.assertFormError(response.context['form'], 'renewal_date', 'Invalid date - renewal more than 4 weeks ahead.')
-        
\ No newline at end of file
+        
+
+class LoanReportTest(TestCase):
+    # The report streams the copies of every branch database.
+    databases = {'default', *settings.CATALOG_BRANCH_DATABASES.values()}
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.librarian = User.objects.create_user(username='librarian', password='oismd23929ma', is_staff=True)
+        cls.librarian.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+        book = Book.objects.create(title='Book Title', summary='A little summary', isbn='ABCDERGTKWOEJ')
+        today = datetime.date.today()
+        for days in (3, -2, 10, -7):
+            BookInstance.objects.create(book=book, imprint=f'Imprint {days}', status='o', borrower=cls.librarian,
+                                        due_back=today + datetime.timedelta(days=days))
+        BookInstance.objects.create(book=book, imprint='On the shelf', status='a')
+
+    def test_librarians_only(self):
+        self.assertEqual(self.client.get(reverse('loan-report')).status_code, 302)
+        User.objects.create_user(username='reader', password='oisam23ilne4')
+        self.client.login(username='reader', password='oisam23ilne4')
+        self.assertEqual(self.client.get(reverse('loan-report')).status_code, 403)
+
+    def test_reports_are_streamed_by_due_date(self):
+        self.client.login(username='librarian', password='oismd23929ma')
+        with self.assertNumQueries(5):
+            # Session, user, user and group permissions, then the loans with their books and borrowers.
+            response = self.client.get(reverse('loan-report'))
+            self.assertTrue(response.streaming)
+            content = b''.join(response.streaming_content).decode()
+        imprints = [f'Imprint {days}' for days in (-7, -2, 3, 10)]
+        self.assertEqual(sorted(imprints, key=content.index), imprints)
+        self.assertNotIn('On the shelf', content)
+        self.assertTrue(content.rstrip().endswith('</html>'))
+
+        content = b''.join(self.client.get(reverse('overdue-report')).streaming_content).decode()
+        self.assertIn('Imprint -7', content)
+        self.assertNotIn('Imprint 3', content)
+
+
+class Jinja2TemplateEngineTest(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.book = Book.objects.create(title='Book Title', summary='A little summary', isbn='ABCDERGTKWOEJ', author=cls.author)
+        BookInstance.objects.create(book=cls.book, imprint='Unlikely Imprint, 2016', status='a')
+
+    def test_django_engine_by_default(self):
+        response = self.client.get(reverse('books'))
+        self.assertTemplateUsed(response, 'catalog/book_list.html')
+
+    @override_settings(CATALOG_JINJA2_VIEWS=['books', 'book-detail', 'authors', 'author-detail', 'genre-detail'])
+    def test_selected_views_render_with_jinja2(self):
+        for url in (reverse('books'), self.book.get_absolute_url(), reverse('authors'), self.author.get_absolute_url()):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                # Only the Django engine reports the templates it renders.
+                self.assertEqual(response.templates, [])
+                self.assertContains(response, 'Book Title' if 'book' in url else 'Smith, John')
+                self.assertContains(response, reverse('index'))
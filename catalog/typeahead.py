@@ -0,0 +1,232 @@
+"""
+In-memory prefix index of the book titles and author names, for the suggestions of /catalog/suggest.
+
+A LIKE 'abc%' query per keystroke costs a database round trip; instead every web worker keeps its own index. The
+normalized keys (utils.sort_key) and the texts shown are packed, sorted, in two bytes buffers, with arrays of
+offsets and ids, so an entry costs its UTF-8 text plus 12 bytes and the garbage collector has almost nothing to
+track. A prefix lookup is a bisect over the keys (python manage.py benchmark_typeahead measures both).
+
+The index is built on the first suggestion. Book and author changes then reach it incrementally: their signal
+handlers bump a version stamp in the shared cache once committed, and a worker that sees a new version (it checks
+at most every settings.CATALOG_TYPEAHEAD_REFRESH_INTERVAL seconds) reads the new outbox events (see catalog.outbox)
+and keeps the changed entries in a small overlay, until the overlay grows big enough to rebuild the index.
+"""
+import heapq
+import threading
+import time
+
+from array import array
+from bisect import bisect_left
+from itertools import islice
+
+from django.conf import settings
+
+from . import outbox
+from .cache import cache_version
+from .models import Author, Book, ChangeEvent
+from .utils import sort_key
+
+
+TYPEAHEAD_VERSION_KEY = 'catalog:typeahead-version'
+
+SUGGESTIONS = 8
+# The overlay of changed entries is merged into the index when it reaches this share of it.
+OVERLAY_RATIO = 0.01
+MIN_OVERLAY = 1000
+
+
+def book_key(title):
+    return sort_key(title, max_length=200)
+
+
+def author_key(last_name, first_name):
+    # Searched by last name first: "tolkien j" finds "Tolkien, J.R.R.".
+    return f'{sort_key(last_name, max_length=100)} {sort_key(first_name, max_length=100)}'
+
+
+def author_text(last_name, first_name):
+    return f'{last_name}, {first_name}'
+
+
+class PackedStrings:
+    """ Read-only sequence of byte strings stored in one buffer. """
+    __slots__ = ('data', 'offsets')
+
+    def __init__(self, strings):
+        self.offsets = array('I', [0])
+        chunks = []
+        for string in strings:
+            chunks.append(string)
+            self.offsets.append(self.offsets[-1] + len(string))
+        self.data = b''.join(chunks)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return self.data[self.offsets[index]:self.offsets[index + 1]]
+
+    def memory_usage(self):
+        return len(self.data) + self.offsets.itemsize * len(self.offsets)
+
+
+class PrefixIndex:
+    """ Entries (key, id, text) sorted by key. """
+
+    def __init__(self, entries):
+        entries = sorted((key.encode(), pk, text.encode()) for key, pk, text in entries)
+        self.keys = PackedStrings(key for key, _, _ in entries)
+        self.texts = PackedStrings(text for _, _, text in entries)
+        self.ids = array('I', (pk for _, pk, _ in entries))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, prefix, skip=()):
+        """ Yield the (key, id, text) of the entries whose key starts with `prefix` (bytes), in order. """
+        position = bisect_left(self.keys, prefix)
+        while position < len(self.ids):
+            key = self.keys[position]
+            if not key.startswith(prefix):
+                return
+            if self.ids[position] not in skip:
+                yield key, self.ids[position], self.texts[position].decode()
+            position += 1
+
+    def memory_usage(self):
+        """ Bytes used by the index data. """
+        return self.keys.memory_usage() + self.texts.memory_usage() + self.ids.itemsize * len(self.ids)
+
+
+class Overlay:
+    """ Entries changed since a PrefixIndex was built: {id: (key, text) or None if deleted}, kept sorted by key. """
+
+    def __init__(self):
+        self.changed = {}
+        self.entries = []
+
+    def __len__(self):
+        return len(self.changed)
+
+    def update(self, changed):
+        self.changed.update(changed)
+        self.entries = sorted((key, pk, text) for pk, (key, text) in
+                              ((pk, entry) for pk, entry in self.changed.items() if entry is not None))
+
+    def search(self, prefix):
+        for key, pk, text in self.entries[bisect_left(self.entries, (prefix,)):]:
+            if not key.startswith(prefix):
+                return
+            yield key, pk, text
+
+
+class TypeaheadIndex:
+    """ Prefix indexes of the books and the authors of one process. """
+
+    def __init__(self, version):
+        self.version = version
+        self.lock = threading.Lock()
+        self.next_check = time.monotonic() + settings.CATALOG_TYPEAHEAD_REFRESH_INTERVAL
+        # Changes after this outbox event are not in the index yet (reading them twice is harmless).
+        self.position = int(outbox.latest_token())
+        self.books = PrefixIndex(
+            (book_key(title), pk, title)
+            for pk, title in Book.objects.order_by().values_list('pk', 'title').iterator(chunk_size=5000)
+        )
+        self.authors = PrefixIndex(
+            (author_key(last_name, first_name), pk, author_text(last_name, first_name))
+            for pk, last_name, first_name in
+            Author.objects.order_by().values_list('pk', 'last_name', 'first_name').iterator(chunk_size=5000)
+        )
+        self.overlays = {'book': Overlay(), 'author': Overlay()}
+
+    def suggest(self, text, limit=SUGGESTIONS):
+        """ {'books': [(id, title), ...], 'authors': [(id, name), ...]} starting with `text`. """
+        prefix = sort_key(text).encode()
+        if not prefix:
+            return {'books': [], 'authors': []}
+        return {
+            'books': self.search(self.books, self.overlays['book'], prefix, limit),
+            'authors': self.search(self.authors, self.overlays['author'], prefix, limit),
+        }
+
+    @staticmethod
+    def search(index, overlay, prefix, limit):
+        found = heapq.merge(index.search(prefix, skip=overlay.changed), overlay.search(prefix))
+        return [(pk, text) for _, pk, text in islice(found, limit)]
+
+    def memory_usage(self):
+        return self.books.memory_usage() + self.authors.memory_usage()
+
+    def stale(self, now):
+        """ Whether the catalog changed since the last refresh (checked at most once per refresh interval). """
+        if now < self.next_check:
+            return False
+        self.next_check = now + settings.CATALOG_TYPEAHEAD_REFRESH_INTERVAL
+        return cache_version(TYPEAHEAD_VERSION_KEY) != self.version
+
+    def refresh(self):
+        """
+        Apply the book and author changes of the outbox to the overlays. Returns False when the index has to be
+        rebuilt instead: the overlays are too big, or the events have been purged.
+        """
+        version = cache_version(TYPEAHEAD_VERSION_KEY)
+        if outbox.expired(self.position):
+            return False
+        events = list(
+            ChangeEvent.objects.filter(id__gt=self.position, model__in=['book', 'author'])
+            .order_by('id').values_list('id', 'model', 'object_id')
+        )
+        if events:
+            self.apply({model: {int(object_id) for _, event_model, object_id in events if event_model == model}
+                        for model in ('book', 'author')})
+            self.position = events[-1][0]
+        self.version = version
+        limit = max(MIN_OVERLAY, OVERLAY_RATIO * (len(self.books) + len(self.authors)))
+        return sum(len(overlay) for overlay in self.overlays.values()) < limit
+
+    def apply(self, changed):
+        books, authors = changed['book'], changed['author']
+        titles = dict(Book.objects.filter(pk__in=books).values_list('pk', 'title'))
+        self.overlays['book'].update({
+            pk: (book_key(titles[pk]).encode(), titles[pk]) if pk in titles else None for pk in books
+        })
+        names = {pk: (last_name, first_name) for pk, last_name, first_name in
+                 Author.objects.filter(pk__in=authors).values_list('pk', 'last_name', 'first_name')}
+        self.overlays['author'].update({
+            pk: (author_key(*names[pk]).encode(), author_text(*names[pk])) if pk in names else None for pk in authors
+        })
+
+
+_index = None
+_build_lock = threading.Lock()
+
+
+def get_index():
+    """ The index of this process, built on first use and refreshed when the catalog changed. """
+    global _index
+    index = _index
+    if index is None:
+        with _build_lock:
+            if _index is None:
+                _index = TypeaheadIndex(cache_version(TYPEAHEAD_VERSION_KEY))
+            return _index
+    if index.stale(time.monotonic()):
+        with index.lock:
+            refreshed = index.refresh()
+        if not refreshed:
+            with _build_lock:
+                if _index is index:
+                    _index = TypeaheadIndex(cache_version(TYPEAHEAD_VERSION_KEY))
+            return _index
+    return index
+
+
+def reset_index():
+    """ Drop the index of this process (e.g. in tests). """
+    global _index
+    _index = None
+
+
+def suggest(text, limit=SUGGESTIONS):
+    return get_index().suggest(text, limit)
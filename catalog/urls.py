@@ -5,10 +5,20 @@ urlpatterns = [
     path('', views.index, name='index'),
     path('books/', views.BookListView.as_view(), name='books'),
     path('book/<int:pk>', views.BookDetailView.as_view(), name='book-detail'),
+    path('book/<int:pk>/similar.json', views.book_similar_json, name='book-similar-json'),
+    path('feeds/new-books.atom', views.sitemap_file, {'name': 'new-books.atom'}, name='new-books-feed'),
+    path('reviews/', views.ReviewListView.as_view(), name='reviews'),
+    path('suggest', views.suggest, name='suggest'),
+    path('changes', views.changes, name='changes'),
+    path('genre/<int:pk>', views.GenreDetailView.as_view(), name='genre-detail'),
     path('author/', views.AuthorListView.as_view(), name='authors'),
     path('author/<int:pk>', views.AuthorDetailView.as_view(), name='author-detail'),
     path('mybooks/', views.LoanedBooksByUserListView.as_view(), name='my-borrowed'),
     path('staff/allbooks', views.AllLoanedBooksListView.as_view(), name='all-borrowed'),
+    path('staff/reports/loans', views.loan_report, name='loan-report'),
+    path('staff/reports/overdue', views.loan_report, {'overdue': True}, name='overdue-report'),
+    path('staff/profiles', views.profile_list, name='profiles'),
+    path('staff/profiles/<str:url_name>.folded', views.profile_stacks, name='profile-stacks'),
     path('book/<uuid:pk>/renew/', views.renew_book_librarian, name='renew-book-librarian'),
     path('author/create/', view=views.AuthorCreate.as_view(), name='author-create'),
     path('author/<int:pk>/update', view=views.AuthorUpdate.as_view(), name='author-update'),
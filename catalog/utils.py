@@ -0,0 +1,33 @@
+import os
+import time
+import unicodedata
+import uuid
+
+
+def uuid7():
+    """
+    Return a time-ordered UUID (version 7, RFC 9562).
+
+    The first 48 bits are the Unix time in milliseconds and the next 12 bits the sub-millisecond fraction, so
+    keys generated one after the other are also close in the primary key index. The remaining 62 bits are random.
+    """
+    nanoseconds = time.time_ns()
+    milliseconds, remainder = divmod(nanoseconds, 1_000_000)
+    fraction = remainder * 4096 // 1_000_000
+
+    value = (milliseconds & 0xFFFF_FFFF_FFFF) << 80
+    value |= 0x7 << 76  # Version
+    value |= fraction << 64
+    value |= 0x2 << 62  # Variant (RFC 9562)
+    value |= int.from_bytes(os.urandom(8), 'big') & 0x3FFF_FFFF_FFFF_FFFF
+    return uuid.UUID(int=value)
+
+
+def sort_key(text, max_length=None):
+    """
+    Case- and accent-folded version of a text, used to sort names and titles alphabetically
+    (e.g. "Ávila" sorts with "avila", between "Austen" and "Azimov").
+    """
+    decomposed = unicodedata.normalize('NFKD', text.strip())
+    folded = ''.join(character for character in decomposed if not unicodedata.combining(character)).casefold()
+    return folded[:max_length]
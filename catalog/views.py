@@ -1,49 +1,44 @@
 import datetime
+import string
 
+from itertools import islice
 from typing import Any
 
+from django.conf import settings
 from django.db.models.query import QuerySet
-from django.http import HttpResponseRedirect
+from django.http import Http404, HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
+from django.template.loader import get_template, render_to_string
 from django.urls import reverse, reverse_lazy
+from django.utils.safestring import mark_safe
 from django.views.generic import ListView, DetailView
 from django.views.generic.edit import CreateView, DeleteView, UpdateView
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required, permission_required
 
-from .models import Book, Author, BookInstance, Genre
+from . import outbox, profiling, typeahead
+from .branches import availability, copies, get_copy, iter_copies
+from .cache import home_counters, initial_counts
+from .facets import facet_links, filter_books, parse_filters
+from .middleware import serve_file
+from .models import Book, Author, BookInstance, Branch, Genre, Review
+from .reviews import review_page
 from .forms import RenewBookForm
+from .tasks import send_renewal_notice
 
 
 def index(request):
     """ View function for home page of site. """
 
-    # Generate counts of some of the main objects
-    num_books = Book.objects.all().count()
-    num_instances = BookInstance.objects.all().count()
-
-    # Available books (status = 'a')
-    num_instances_available = BookInstance.objects.filter(status__exact='a').count()
-
-    # The 'all()' is implied by default
-    num_authors = Author.objects.count()
-
     # Number of visits to this view, as counted in the session available.
     num_visits = request.session.get('num_visits', 0)
     num_visits += 1
     request.session['num_visits'] = num_visits
 
-    # Challenge:
-    num_genres = Genre.objects.count()
-    num_books_containing_The = Book.objects.filter(title__icontains='The').count()
-
     context = {
-        'num_books': num_books,
-        'num_instances': num_instances,
-        'num_instances_available': num_instances_available,
-        'num_authors': num_authors,
-        'num_genres': num_genres,
-        'num_books_containing_The': num_books_containing_The,
+        # Counts of the main objects (books, copies, available copies, authors...), cached with the pages.
+        **home_counters(),
         'num_visits': num_visits
     }
 
@@ -51,27 +46,209 @@ def index(request):
     return render(request=request, template_name='index.html', context=context)
 
 
-class BookListView(ListView):
+class TemplateEngineMixin:
+    """
+    Render with the Jinja2 engine when the URL name of the view is listed in settings.CATALOG_JINJA2_VIEWS.
+    The view needs a ported template in catalog/jinja2/.
+    """
+
+    @property
+    def template_engine(self):
+        match = self.request.resolver_match
+        if match and match.url_name in settings.CATALOG_JINJA2_VIEWS:
+            return 'jinja2'
+        return None
+
+
+class InitialJumpMixin:
+    """
+    A-Z jump bar for list views ordered by a sort key (see catalog.utils.sort_key).
+    ?letter=M redirects to the page where the records starting with M begin, computed from the number of records
+    per initial instead of scanning the list.
+    """
+    sort_key_field = None
+
+    def initial_jump_enabled(self):
+        return True
+
+    def get(self, request, *args, **kwargs):
+        letter = request.GET.get('letter', '').lower()
+        if len(letter) == 1 and letter in string.ascii_lowercase and self.initial_jump_enabled():
+            query = request.GET.copy()
+            del query['letter']
+            query['page'] = self.page_for_initial(letter)
+            return HttpResponseRedirect(f'{request.path}?{query.urlencode()}')
+        return super().get(request, *args, **kwargs)
+
+    def page_for_initial(self, letter):
+        before = sum(
+            count for initial, count in initial_counts(self.model, self.sort_key_field).items() if initial < letter
+        )
+        return before // self.paginate_by + 1
+
+    def get_context_data(self, **kwargs: Any) -> dict[str, Any]:
+        context = super().get_context_data(**kwargs)
+        if not self.initial_jump_enabled():
+            return context
+        counts = initial_counts(self.model, self.sort_key_field)
+        context['initials'] = [(letter.upper(), counts.get(letter, 0)) for letter in string.ascii_lowercase]
+        return context
+
+
+class BookListView(InitialJumpMixin, TemplateEngineMixin, ListView):
     model = Book
     context_object_name = 'book_list'  # self-defined name for the model context variable.
     paginate_by = 10
+    sort_key_field = 'title_key'
     # template_name = 'books/book_list.html'
     
     # queryset = Book.objects.filter(author__name__iexact='George')  # Would do the same as below: 
     # def get_queryset(self) -> QuerySet[Any]:
     #     return Book.objects.filter(author__name__iexact='George')
     
+    def setup(self, request, *args, **kwargs):
+        super().setup(request, *args, **kwargs)
+        # Faceted browsing: ?genre=<id>&language=<id>&author=<id>&available=1 (see catalog.facets)
+        self.filters = parse_filters(request.GET)
+
+    def initial_jump_enabled(self):
+        # The letter counts are for the whole catalog, they don't apply to a filtered list.
+        return not self.filters
+
+    def get_queryset(self) -> QuerySet[Any]:
+        return filter_books(super().get_queryset().select_related('author'), self.filters)
+
     def get_context_data(self, **kwargs: Any) -> dict[str, Any]:
         # Call the base implementation first to get the context
         context = super().get_context_data(**kwargs)
         # Then create any data and add it to the context
         context['year'] = '2024'
+        context['facets'] = facet_links(self.request.GET, self.filters)
+        # Keeps the filters in the pagination links.
+        query = self.request.GET.copy()
+        query.pop('page', None)
+        context['page_query'] = f'{query.urlencode()}&' if query else ''
         return context
     
 
-class BookDetailView(DetailView):
+class BookDetailView(TemplateEngineMixin, DetailView):
     model = Book
 
+    def get_context_data(self, **kwargs: Any) -> dict[str, Any]:
+        context = super().get_context_data(**kwargs)
+        # Precomputed offline (see catalog.recommendations): a single query over the (book, rank) index.
+        context['recommendations'] = self.object.recommendations.select_related('recommended')
+        context['similar_books'] = self.object.similar_books.select_related('similar')
+        # Copies of every branch (see catalog.branches).
+        context['copies'] = copies(book=self.object)
+        context['availability'] = availability(self.object)
+        # One page of reviews at a time, newest first (see catalog.reviews).
+        context['reviews'], context['next_reviews'] = review_page(
+            self.object.review_set.all(), cursor=self.request.GET.get('reviews_after')
+        )
+        return context
+
+
+class ReviewListView(TemplateEngineMixin, ListView):
+    """ Latest reviews of the whole catalog, with the same keyset pagination as the reviews of a book. """
+    model = Review
+    context_object_name = 'review_list'
+    template_name = 'catalog/review_list.html'
+
+    def get_queryset(self) -> QuerySet[Any]:
+        reviews, self.next_reviews = review_page(
+            Review.objects.select_related('book'), cursor=self.request.GET.get('after')
+        )
+        return reviews
+
+    def get_context_data(self, **kwargs: Any) -> dict[str, Any]:
+        context = super().get_context_data(**kwargs)
+        context['next_reviews'] = self.next_reviews
+        return context
+
+
+def book_similar_json(request, pk):
+    """ JSON list of the precomputed similar books of a book (see catalog.similarity). """
+    book = get_object_or_404(Book, pk=pk)
+    similar_books = book.similar_books.select_related('similar')
+    return JsonResponse({
+        'id': book.pk,
+        'title': book.title,
+        'similar': [
+            {
+                'id': neighbour.similar.pk,
+                'title': neighbour.similar.title,
+                'url': neighbour.similar.get_absolute_url(),
+                'score': round(neighbour.score, 4),
+            }
+            for neighbour in similar_books
+        ],
+    })
+
+
+def suggest(request):
+    """ JSON suggestions of book titles and author names starting with `q` (see catalog.typeahead). """
+    suggestions = typeahead.suggest(request.GET.get('q', '')[:100])
+    return JsonResponse({
+        'books': [
+            {'id': pk, 'title': title, 'url': reverse('book-detail', args=[pk])}
+            for pk, title in suggestions['books']
+        ],
+        'authors': [
+            {'id': pk, 'name': name, 'url': reverse('author-detail', args=[pk])}
+            for pk, name in suggestions['authors']
+        ],
+    })
+
+
+def changes(request):
+    """
+    JSON feed of the catalog changes after the `since` token (see catalog.outbox). Without a token, only returns the
+    current one: read the catalog, then follow the changes from there.
+    """
+    if 'since' not in request.GET:
+        return JsonResponse({'changes': [], 'next': outbox.latest_token(), 'more': False})
+    position = outbox.parse_token(request.GET['since'])
+    if position is None:
+        return JsonResponse({'error': 'Invalid token.'}, status=400)
+    if outbox.expired(position):
+        return JsonResponse({'error': 'Token expired, resync from scratch.'}, status=410)
+    return JsonResponse(outbox.changes_since(position))
+
+
+@staff_member_required
+def profile_list(request):
+    """ Captures of the sampling profiler, per URL name (see catalog.profiling). """
+    return render(request, 'catalog/profile_list.html', context={
+        'profiling': settings.CATALOG_PROFILING,
+        'captures': profiling.list_captures(),
+    })
+
+
+@staff_member_required
+def profile_stacks(request, url_name):
+    """ Collapsed stacks of the captures of a URL name (or only of the `capture` ones), for flame graph tools. """
+    available = profiling.capture_names(profiling.capture_directory(url_name))
+    names = request.GET.getlist('capture') or available
+    if not names or not set(names) <= set(available):
+        raise Http404('No such capture.')
+    stacks = profiling.read_captures(url_name, names)
+    response = HttpResponse(
+        ''.join(f'{stack} {count}\n' for stack, count in sorted(stacks.items())), content_type='text/plain'
+    )
+    response['Content-Disposition'] = f'attachment; filename="{profiling.UNSAFE_NAME_RE.sub("_", url_name)}.folded"'
+    return response
+
+
+def sitemap_file(request, name):
+    """ Sitemaps and feeds generated by the build_sitemaps command (see catalog.sitemaps). """
+    response = None
+    if name.endswith(('.xml', '.atom')):
+        response = serve_file(request, settings.CATALOG_SITEMAP_ROOT, name, 'public, max-age=3600')
+    if response is None:
+        raise Http404('No such file.')
+    return response
+
 
 """
 Similar but with Function-based method:
@@ -95,13 +272,25 @@ def book_detail_view(request, primary_key):
 """
 
 
-class AuthorListView(ListView):
+class GenreDetailView(TemplateEngineMixin, DetailView):
+    model = Genre
+
+    def get_context_data(self, **kwargs: Any) -> dict[str, Any]:
+        context = super().get_context_data(**kwargs)
+        books = self.object.book_set.select_related('author')
+        context['num_books'] = books.count()
+        context['books'] = books[:10]
+        return context
+
+
+class AuthorListView(InitialJumpMixin, TemplateEngineMixin, ListView):
     model = Author
     context_object_name = 'author_list'
     paginate_by = 5
+    sort_key_field = 'last_name_key'
     
 
-class AuthorDetailView(DetailView):
+class AuthorDetailView(TemplateEngineMixin, DetailView):
     model = Author
 
 
@@ -112,11 +301,8 @@ class LoanedBooksByUserListView(LoginRequiredMixin, ListView):
     paginate_by = 10
 
     def get_queryset(self):
-        return (
-            BookInstance.objects.filter(borrower=self.request.user)
-            .filter(status__exact='o')
-            .order_by('due_back')
-        )
+        # Loans of every branch, ordered by due date (see catalog.branches).
+        return copies(borrower=self.request.user, status__exact='o')
         
         
 class AllLoanedBooksListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
@@ -127,15 +313,59 @@ class AllLoanedBooksListView(LoginRequiredMixin, PermissionRequiredMixin, ListVi
     permission_required = 'catalog.can_mark_returned'
     
     def get_queryset(self):
-        return (
-            BookInstance.objects.filter(status__exact='o').order_by('due_back')
-        )
+        # ?branch=<code> restricts the list to the loans of a branch.
+        code = self.request.GET.get('branch')
+        self.branch = get_object_or_404(Branch, code=code) if code else None
+        return copies(branch=self.branch, status__exact='o')
+
+    def get_context_data(self, **kwargs: Any) -> dict[str, Any]:
+        context = super().get_context_data(**kwargs)
+        context['branch'] = self.branch
+        context['branches'] = Branch.objects.all()
+        context['page_query'] = f'branch={self.branch.code}&' if self.branch else ''
+        return context
         
         
+REPORT_CHUNK_SIZE = 500
+
+
+@login_required
+@permission_required('catalog.can_mark_returned', raise_exception=True)
+def loan_report(request, overdue=False):
+    """
+    Every loan (or every overdue loan) on one printable page, e.g. ?branch=<code> for a branch. The page is streamed:
+    the rows are read with an iterator and rendered by chunks of REPORT_CHUNK_SIZE between the top and the bottom of
+    the page, so the first bytes are sent at once and memory does not grow with the number of loans.
+    """
+    code = request.GET.get('branch')
+    branch = get_object_or_404(Branch, code=code) if code else None
+    filters = {'status__exact': 'o'}
+    if overdue:
+        filters['due_back__lt'] = datetime.date.today()
+    marker = '<!-- report rows -->'
+    page = render_to_string('catalog/loan_report.html', {
+        'overdue': overdue, 'branch': branch, 'rows_marker': mark_safe(marker), 'today': datetime.date.today(),
+    }, request=request)
+    top, bottom = page.split(marker)
+    row_template = get_template('catalog/loan_report_rows.html')
+
+    def render_page():
+        yield top
+        loans = iter_copies(branch=branch, **filters)
+        while chunk := list(islice(loans, REPORT_CHUNK_SIZE)):
+            yield row_template.render({'loans': chunk, 'user': request.user})
+        yield bottom
+
+    return StreamingHttpResponse(render_page(), content_type='text/html; charset=utf-8')
+
+
 @login_required
 @permission_required('catalog.can_mark_returned', raise_exception=True)
 def renew_book_librarian(request, pk):
-    book_instance = get_object_or_404(BookInstance, pk=pk)
+    # The copy may be kept in the database of its branch (see catalog.branches).
+    book_instance = get_copy(pk)
+    if book_instance is None:
+        raise Http404('No such copy.')
     
     # If this is a POST request then process the Form data
     if request.method == 'POST':
@@ -149,6 +379,9 @@ def renew_book_librarian(request, pk):
             book_instance.due_back = form.cleaned_data['renewal_date']
             book_instance.save()
             
+            # Emailing the borrower is slow: queue it instead of making the librarian wait.
+            send_renewal_notice.delay(str(book_instance.pk))
+            
             # Redirect to the new URL
             return HttpResponseRedirect(reverse('all-borrowed'))
     
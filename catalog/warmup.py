@@ -0,0 +1,57 @@
+"""
+Warm the per-process caches of a freshly started web worker (see gunicorn.conf.py), so its first requests
+are not slower than the next ones.
+"""
+from django.conf import settings
+from django.template import engines
+from django.template.exceptions import TemplateDoesNotExist
+from django.urls import get_resolver
+
+
+# Templates of the hot pages, parsed ahead of the first request when the cached loader is enabled.
+HOT_TEMPLATES = [
+    'base.html',
+    'index.html',
+    'catalog/book_list.html',
+    'catalog/book_detail.html',
+    'catalog/author_list.html',
+    'catalog/author_detail.html',
+]
+
+
+def warm_url_resolver():
+    """ Import the URLconf and every view module, and build the reverse() lookup tables. """
+    resolver = get_resolver()
+    resolver.url_patterns
+    resolver.reverse_dict
+    for namespace in resolver.namespace_dict:
+        resolver.namespace_dict[namespace][1].reverse_dict
+
+
+def warmed_engines():
+    """
+    The Django template engines, and the Jinja2 ones only when views are rendered with them
+    (settings.CATALOG_JINJA2_VIEWS): creating a Jinja2 engine imports jinja2.
+    """
+    for alias, options in engines.templates.items():
+        if options['BACKEND'] == 'django.template.backends.jinja2.Jinja2' and not settings.CATALOG_JINJA2_VIEWS:
+            continue
+        yield engines[alias]
+
+
+def warm_templates():
+    """ Load the hot templates in every warmed engine that has them. Returns the number of templates loaded. """
+    loaded = 0
+    for engine in warmed_engines():
+        for name in HOT_TEMPLATES:
+            try:
+                engine.get_template(name)
+            except TemplateDoesNotExist:
+                continue
+            loaded += 1
+    return loaded
+
+
+def warm_worker():
+    warm_url_resolver()
+    warm_templates()
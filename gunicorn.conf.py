@@ -0,0 +1,53 @@
+"""
+Gunicorn configuration for the LocalLibrary site:
+
+    gunicorn -c gunicorn.conf.py locallibrary.wsgi
+
+Every setting can be overridden from the environment (GUNICORN_WORKERS, GUNICORN_THREADS...).
+"""
+import multiprocessing
+import os
+
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+cpu_count = multiprocessing.cpu_count()
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+
+# gthread workers overlap the time spent waiting on the database and the clients, so fewer processes
+# (and less memory) are needed than with sync workers for the same concurrency.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+workers = env_int('GUNICORN_WORKERS', cpu_count + 1 if worker_class == 'gthread' else cpu_count * 2 + 1)
+threads = env_int('GUNICORN_THREADS', 4 if worker_class == 'gthread' else 1)
+
+# Import Django once in the master: workers share those pages copy-on-write and boot faster.
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True') == 'True'
+
+# Recycle workers regularly to bound memory growth, with jitter so they do not all restart at once.
+max_requests = env_int('GUNICORN_MAX_REQUESTS', 2000)
+max_requests_jitter = env_int('GUNICORN_MAX_REQUESTS_JITTER', 200)
+
+timeout = env_int('GUNICORN_TIMEOUT', 30)
+graceful_timeout = env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = env_int('GUNICORN_KEEPALIVE', 5)
+
+# An empty GUNICORN_ACCESSLOG disables the access log.
+accesslog = os.environ.get('GUNICORN_ACCESSLOG', '-') or None
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOGLEVEL', 'info')
+
+
+def post_fork(server, worker):
+    """ Database connections opened by the master while preloading must not be shared with the workers. """
+    if server.cfg.preload_app:
+        from django.db import connections
+        connections.close_all()
+
+
+def post_worker_init(worker):
+    """ The URL resolver and template caches are per process: warm them before the first request. """
+    from catalog.warmup import warm_worker
+    warm_worker()
@@ -0,0 +1,25 @@
+"""
+Jinja2 environment for the optional Jinja2 template engine (see TEMPLATES and CATALOG_JINJA2_VIEWS in settings).
+
+It exposes the helpers the Django templates get from template tags.
+"""
+from django.template.defaultfilters import date
+from django.templatetags.static import static
+from django.urls import reverse
+
+from jinja2 import Environment
+
+
+def url(viewname, *args, **kwargs):
+    """ Equivalent of the {% url %} template tag. """
+    return reverse(viewname, args=args or None, kwargs=kwargs or None)
+
+
+def environment(**options):
+    env = Environment(**options)
+    env.globals.update({
+        'static': static,
+        'url': url,
+    })
+    env.filters['date'] = date
+    return env
@@ -11,15 +11,16 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 import os
 
-from dotenv import load_dotenv
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-# Support env variables from .env file if defined
+# Support env variables from .env file if defined (dotenv is only imported when there is one to read)
 env_path = os.path.join(BASE_DIR, '.env')
-load_dotenv(env_path)
+if os.path.exists(env_path):
+    from dotenv import load_dotenv
+    load_dotenv(env_path)
 
 
 # Quick-start development settings - unsuitable for production
@@ -32,7 +33,8 @@ SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', "django-insecure-%%95*onc)7gw2d
 DEBUG = os.environ.get('DJANGO_DEBUG', '') != 'False'
 
 
-ALLOWED_HOSTS = []
+# Comma-separated list, e.g. DJANGO_ALLOWED_HOSTS=library.example.com,localhost
+ALLOWED_HOSTS = [host for host in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',') if host]
 
 
 # Application definition
@@ -51,21 +53,31 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "catalog.middleware.StaticFilesMiddleware",
+    "catalog.middleware.SlowQueryMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
+    "catalog.middleware.SessionBackendMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "catalog.middleware.ProfilingMiddleware",
+    "catalog.middleware.RateLimitMiddleware",
+    "catalog.middleware.AnonymousPageCacheMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
 ROOT_URLCONF = "locallibrary.urls"
 
+TEMPLATE_LOADERS = [
+    "django.template.loaders.filesystem.Loader",
+    "django.template.loaders.app_directories.Loader",
+]
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
         "DIRS": [os.path.join(BASE_DIR, 'templates')],
-        "APP_DIRS": True,
         "OPTIONS": {
             "context_processors": [
                 "django.template.context_processors.debug",
@@ -73,10 +85,30 @@ TEMPLATES = [
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
             ],
+            # Parse every template once per process in production, re-read them on each render while developing.
+            "loaders": TEMPLATE_LOADERS if DEBUG else [("django.template.loaders.cached.Loader", TEMPLATE_LOADERS)],
+        },
+    },
+    {
+        # Optional engine for hot templates (catalog/jinja2/), see CATALOG_JINJA2_VIEWS below.
+        "BACKEND": "django.template.backends.jinja2.Jinja2",
+        "NAME": "jinja2",
+        "DIRS": [],
+        "APP_DIRS": True,
+        "OPTIONS": {
+            "environment": "locallibrary.jinja2.environment",
+            "auto_reload": DEBUG,
+            "context_processors": [
+                "django.contrib.auth.context_processors.auth",
+            ],
         },
     },
 ]
 
+# URL names of the views rendered with the Jinja2 engine instead of the Django one, e.g. "books,book-detail".
+# Only views with a ported template in catalog/jinja2/ can be listed here.
+CATALOG_JINJA2_VIEWS = [name for name in os.environ.get('CATALOG_JINJA2_VIEWS', '').split(',') if name]
+
 WSGI_APPLICATION = "locallibrary.wsgi.application"
 
 
@@ -90,6 +122,49 @@ DATABASES = {
     }
 }
 
+# Optional partitioning of the copies by branch (catalog.routers.BranchRouter): with
+# CATALOG_BRANCH_DATABASES=north,south the copies of the branches with these codes are kept in their own database,
+# var/branch_<code>.sqlite3 (create it with: python manage.py migrate --database=branch_<code>).
+CATALOG_BRANCH_DATABASES = {
+    code: f'branch_{code}' for code in os.environ.get('CATALOG_BRANCH_DATABASES', '').split(',') if code
+}
+for alias in CATALOG_BRANCH_DATABASES.values():
+    DATABASES[alias] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "var" / f"{alias}.sqlite3",
+    }
+DATABASE_ROUTERS = ['catalog.routers.BranchRouter'] if CATALOG_BRANCH_DATABASES else []
+
+# Online snapshots (python manage.py backup_db, see catalog.backups) are written to CATALOG_BACKUP_ROOT. They can be
+# restored into a read replica: CATALOG_REPLICA_DATABASE=/path/to/replica.sqlite3 adds it as the "replica" database.
+if os.environ.get('CATALOG_REPLICA_DATABASE'):
+    DATABASES['replica'] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.environ['CATALOG_REPLICA_DATABASE'],
+    }
+CATALOG_BACKUP_ROOT = os.environ.get('CATALOG_BACKUP_ROOT', os.path.join(BASE_DIR, 'var', 'backups'))
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Use a cache shared by every worker in production, e.g.
+# DJANGO_CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache DJANGO_CACHE_LOCATION=/var/tmp/locallibrary
+
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get('DJANGO_CACHE_BACKEND', "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.environ.get('DJANGO_CACHE_LOCATION', ''),
+    }
+}
+
+# Users and their permissions are cached in the shared cache for CATALOG_AUTH_CACHE_TIMEOUT seconds
+# (catalog.backends.CachedModelBackend, 0 disables it).
+AUTHENTICATION_BACKENDS = ['catalog.backends.CachedModelBackend']
+# A session keeps the path of the backend that logged its user in: the sessions opened with these backends are moved
+# to the first one of AUTHENTICATION_BACKENDS (catalog.middleware.SessionBackendMiddleware).
+CATALOG_LEGACY_AUTH_BACKENDS = ['django.contrib.auth.backends.ModelBackend']
+CATALOG_AUTH_CACHE_TIMEOUT = int(os.environ.get('CATALOG_AUTH_CACHE_TIMEOUT', 0 if DEBUG else 300))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -128,6 +203,23 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 
+# Where collectstatic gathers the hashed and precompressed files served by catalog.middleware.StaticFilesMiddleware
+STATIC_ROOT = os.environ.get('DJANGO_STATIC_ROOT', os.path.join(BASE_DIR, 'staticfiles'))
+
+# Content-hashed, gzip-precompressed files in production. The manifest only exists after collectstatic,
+# so development keeps the plain storage.
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": (
+            "django.contrib.staticfiles.storage.StaticFilesStorage" if DEBUG
+            else "catalog.storage.CompressedManifestStaticFilesStorage"
+        ),
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -135,4 +227,66 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 LOGIN_REDIRECT_URL = '/'
 
-EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
\ No newline at end of file
+EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
+
+# Content-based "similar books" index, built with: python manage.py build_similar_books
+CATALOG_SIMILARITY_INDEX = os.environ.get('CATALOG_SIMILARITY_INDEX', os.path.join(BASE_DIR, 'var', 'similar_books.npz'))
+
+# Sitemaps and the "new books" feed (python manage.py build_sitemaps, see catalog.sitemaps).
+# CATALOG_SITE_URL is the public address of the site, used for the absolute URLs they contain.
+CATALOG_SITEMAP_ROOT = os.environ.get('CATALOG_SITEMAP_ROOT', os.path.join(BASE_DIR, 'var', 'sitemaps'))
+CATALOG_SITE_URL = os.environ.get('CATALOG_SITE_URL', 'http://localhost:8000')
+
+# Full-page cache for anonymous users (catalog.middleware.AnonymousPageCacheMiddleware).
+# Pages are fresh for CATALOG_PAGE_CACHE_TIMEOUT seconds (0 disables the cache) and can be served stale for
+# CATALOG_PAGE_CACHE_STALE more seconds while one worker regenerates them.
+CATALOG_PAGE_CACHE_VIEWS = ['books', 'book-detail', 'authors', 'author-detail']
+CATALOG_PAGE_CACHE_TIMEOUT = int(os.environ.get('CATALOG_PAGE_CACHE_TIMEOUT', 0 if DEBUG else 300))
+CATALOG_PAGE_CACHE_STALE = int(os.environ.get('CATALOG_PAGE_CACHE_STALE', 3600))
+
+# Background tasks (catalog.taskqueue) are run by: python manage.py run_tasks
+# Set CATALOG_TASKS_EAGER=True to run them immediately inside the request instead.
+CATALOG_TASKS_EAGER = os.environ.get('CATALOG_TASKS_EAGER', '') == 'True'
+
+# Rate limits per client (catalog.middleware.RateLimitMiddleware):
+# URL name -> (requests per second, burst size). Disabled while developing or with CATALOG_RATE_LIMITS=off.
+CATALOG_RATE_LIMITS = {} if DEBUG or os.environ.get('CATALOG_RATE_LIMITS') == 'off' else {
+    'books': (1, 20),
+    'book-detail': (3, 60),
+    'authors': (1, 20),
+    'author-detail': (3, 60),
+}
+
+# Number of proxies in front of the site that append the client address to X-Forwarded-For. Anonymous clients are
+# rate limited by the address the farthest one saw; with 0, by the address of the connection (REMOTE_ADDR).
+CATALOG_TRUSTED_PROXIES = int(os.environ.get('CATALOG_TRUSTED_PROXIES', 0 if DEBUG else 1))
+
+# Load shedding: when requests wait longer than this in the server queue (milliseconds, 0 disables it),
+# anonymous requests to these views are answered with a 503 first.
+CATALOG_SHED_QUEUE_LATENCY_MS = int(os.environ.get('CATALOG_SHED_QUEUE_LATENCY_MS', 0 if DEBUG else 500))
+CATALOG_SHED_VIEWS = ['books', 'authors']
+
+# Archival of cold rows (python manage.py archive_catalog, see catalog.archive): copies in maintenance that have not
+# been due for CATALOG_ARCHIVE_COPIES_AFTER days, and reviews published more than CATALOG_ARCHIVE_REVIEWS_AFTER days ago.
+CATALOG_ARCHIVE_COPIES_AFTER = int(os.environ.get('CATALOG_ARCHIVE_COPIES_AFTER', 365))
+CATALOG_ARCHIVE_REVIEWS_AFTER = int(os.environ.get('CATALOG_ARCHIVE_REVIEWS_AFTER', 3 * 365))
+
+# Outbox of the catalog changes (see catalog.outbox): events are kept CATALOG_OUTBOX_RETENTION days, and longer if an
+# outbox consumer has not processed them yet (python manage.py process_outbox).
+CATALOG_OUTBOX_RETENTION = int(os.environ.get('CATALOG_OUTBOX_RETENTION', 7))
+
+# Suggestions of /catalog/suggest come from an in-memory index in every worker (see catalog.typeahead), which checks
+# for book and author changes at most every CATALOG_TYPEAHEAD_REFRESH_INTERVAL seconds.
+CATALOG_TYPEAHEAD_REFRESH_INTERVAL = float(os.environ.get('CATALOG_TYPEAHEAD_REFRESH_INTERVAL', 1.0))
+
+# Sampling profiler (catalog.middleware.ProfilingMiddleware, see catalog.profiling), off unless CATALOG_PROFILING=True:
+# profiles CATALOG_PROFILE_SAMPLE_RATE of the requests (0 to 1) and the staff requests with an "X-Profile: 1" header.
+CATALOG_PROFILING = os.environ.get('CATALOG_PROFILING', '') == 'True'
+CATALOG_PROFILE_SAMPLE_RATE = float(os.environ.get('CATALOG_PROFILE_SAMPLE_RATE', 0))
+CATALOG_PROFILE_ROOT = os.environ.get('CATALOG_PROFILE_ROOT', os.path.join(BASE_DIR, 'var', 'profiles'))
+CATALOG_PROFILE_KEEP = int(os.environ.get('CATALOG_PROFILE_KEEP', 50))
+
+# Slow-query log (catalog.middleware.SlowQueryMiddleware, see catalog.slowqueries): queries of a request taking more
+# than CATALOG_SLOW_QUERY_MS milliseconds (0 disables it) are stored with their plan. python manage.py slow_queries
+# lists them.
+CATALOG_SLOW_QUERY_MS = int(os.environ.get('CATALOG_SLOW_QUERY_MS', 0 if DEBUG else 100))
@@ -20,6 +20,8 @@ from django.views.generic import RedirectView
 from django.conf import settings
 from django.conf.urls.static import static
 
+from catalog.views import sitemap_file
+
 urlpatterns = [
     path("admin/", admin.site.urls),
 ]
@@ -34,6 +36,12 @@ urlpatterns += [
     path('', RedirectView.as_view(url='catalog/', permanent=True))
 ]
 
+# Sitemaps, generated offline by: python manage.py build_sitemaps
+urlpatterns += [
+    path('sitemap.xml', sitemap_file, {'name': 'sitemap.xml'}, name='sitemap-index'),
+    path('sitemaps/<str:name>', sitemap_file, name='sitemap-file'),
+]
+
 # Add static files
 urlpatterns += static(settings.STATIC_URL)
 